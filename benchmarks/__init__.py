@@ -0,0 +1,7 @@
+"""
+Benchmark suite for mkdocs-dataview.
+
+Run it from the repository root:
+
+    python -m benchmarks.run --sizes 1000 10000 --output bench.json
+"""
@@ -0,0 +1,179 @@
+"""
+Runs benchmarks on synthetic vaults and prints machine-readable results (JSON).
+
+Usage:
+
+    python -m benchmarks.run --sizes 1000 10000 --repeat 3 --output bench.json
+
+Every benchmark reports the minimum and the median wall time of `--repeat` runs, so
+results of different commits can be compared with any JSON tool.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex
+from mkdocs_dataview.markdown_db.projection import extract_queries
+from mkdocs_dataview.markdown_db.sharding import build_sharded_index
+from mkdocs_dataview.plugin import DataViewPlugin
+from mkdocs_dataview.query.solvers import QueryService
+
+from .vault import generate_vault
+
+QUERY_PARSE_ITERATIONS = 20
+
+
+def measure(func, repeat: int) -> list[float]:
+    """Calls func `repeat` times and returns wall times"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def result(size: int, name: str, timings: list[float], **extra) -> dict:
+    """Formats a single benchmark result"""
+    return {
+        "size": size,
+        "benchmark": name,
+        "seconds_min": min(timings),
+        "seconds_median": statistics.median(timings),
+        "repeat": len(timings),
+        **extra,
+    }
+
+
+def build_plugin_index(docs_dir: str, paths: list[str]) -> DataViewPlugin:
+    """Builds the index the same way the mkdocs plugin does in `on_files`"""
+    plugin = DataViewPlugin()
+    plugin.load_config({})
+    for path in paths:
+        src_uri = os.path.relpath(path, docs_dir).replace(os.sep, "/")
+        plugin._on_file(path, src_uri[:-3] + "/index.html", src_uri)  # pylint: disable=protected-access
+    return plugin
+
+
+def run_size(size: int, repeat: int, with_cli: bool) -> list[dict]:  # pylint: disable=too-many-locals
+    """Runs all benchmarks on a vault with `size` notes"""
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        docs_dir = os.path.join(root, "docs")
+        paths = generate_vault(docs_dir, size)
+        catalog_path = os.path.join(docs_dir, "catalog.md")
+
+        plugin = None
+
+        def index_build():
+            nonlocal plugin
+            plugin = build_plugin_index(docs_dir, paths + [catalog_path])
+
+        results.append(result(size, "index_build", measure(index_build, repeat), rows=len(paths)))
+
+        entries = [(path, path, os.path.relpath(path, docs_dir)) for path in paths]
+
+        def index_build_sharded():
+            build_sharded_index(SimpleMemoryIndex(), entries, workers=0)
+
+        results.append(result(size, "index_build_sharded", measure(index_build_sharded, repeat),
+                              rows=len(paths), workers=os.cpu_count()))
+
+        with open(catalog_path, encoding="utf-8") as file:
+            catalog = file.read()
+        queries, _ = extract_queries(catalog)
+
+        def query_parse():
+            for _ in range(QUERY_PARSE_ITERATIONS):
+                for query in queries:
+                    QueryService(query)
+
+        timings = [t / (QUERY_PARSE_ITERATIONS * len(queries))
+                   for t in measure(query_parse, repeat)]
+        results.append(result(size, "query_parse", timings))
+
+        this_metadata = plugin.sources[catalog_path]
+        qs = QueryService(queries[0])
+        qs.optimize(this_metadata)
+        rows = [
+            {"metadata": v["metadata"], "file": v["file"], "this": this_metadata}
+            for v in plugin.sources.values()
+        ]
+
+        def where_eval():
+            for identifiers in rows:
+                qs.where(identifiers, {})
+
+        results.append(result(size, "where_eval", measure(where_eval, repeat), rows=len(rows)))
+
+        renderer = RendererWithContext(plugin.sources)
+
+        def page_render():
+            renderer.render_str(io.StringIO(catalog), io.StringIO(), this_metadata, "catalog/")
+
+        results.append(result(size, "page_render", measure(page_render, repeat)))
+
+        if with_cli:
+            def cli():
+                subprocess.run(
+                    [sys.executable, "-m", "mkdocs_dataview"],
+                    cwd=root, check=True, stdout=subprocess.DEVNULL,
+                )
+
+            results.append(result(size, "cli_end_to_end", measure(cli, repeat)))
+
+    return results
+
+
+def git_commit() -> str | None:
+    """Returns current commit of the repository if available"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="number of notes in generated vaults (1k..1M)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--no-cli", action="store_true", help="skip CLI end-to-end benchmark")
+    parser.add_argument("--output", help="file to write JSON results to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+        "results": [],
+    }
+    for size in args.sizes:
+        report["results"].extend(run_size(size, args.repeat, not args.no_cli))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
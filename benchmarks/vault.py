@@ -0,0 +1,108 @@
+"""
+Deterministic generator of synthetic vaults shaped like `docs/examples/library`.
+
+Every note has a title, author, genre, publishing date, tags and awards and lives
+in nested folders (`shelf_XX/section_Y/`). Catalog pages with dataview queries are
+generated in the root of the vault both as `.md` and `.mdtmpl` (for the CLI).
+"""
+import datetime
+import os
+import random
+
+GENRES = ["Detective", "Fantasy", "Science Fiction", "Horror", "Romance", "Thriller"]
+AWARDS = ["Edgar Award", "Hugo Award", "Nebula Award", "Locus Award", "Booker Prize"]
+TAGS = ["book", "classic", "series", "translated", "bestseller", "short"]
+AUTHORS = [f"Author {i}" for i in range(200)]
+
+NOTES_PER_SECTION = 100
+SECTIONS_PER_SHELF = 10
+
+CATALOG_MD = """---
+title: Catalog
+---
+
+# Catalog
+
+Total notes: `= this.metadata.notes`
+
+```dataview
+TABLE file.link as "Title", metadata.author as "Author", metadata.publishing_date as "Date"
+FROM "shelf_00"
+WHERE metadata.awards contains "Edgar Award" AND metadata.genre == "Detective"
+```
+
+```dataview
+LIST metadata.title
+FROM #classic
+WHERE metadata.genre == "Fantasy"
+```
+"""
+
+
+def note_path(i: int) -> str:
+    """Returns the path of the i-th note relative to the vault root"""
+    section = i // NOTES_PER_SECTION
+    shelf = section // SECTIONS_PER_SHELF
+    return os.path.join(f"shelf_{shelf:02d}", f"section_{section % SECTIONS_PER_SHELF}",
+                        f"book_{i}.md")
+
+
+def note_metadata(rnd: random.Random, i: int) -> dict:
+    """Returns frontmatter of the i-th note"""
+    date = datetime.date(1900, 1, 1) + datetime.timedelta(days=rnd.randrange(45000))
+    return {
+        "title": f"Book {i}",
+        "type": "book",
+        "genre": rnd.choice(GENRES),
+        "author": rnd.choice(AUTHORS),
+        "publishing_date": date.isoformat(),
+        "rating": rnd.randint(1, 5),
+        "tags": rnd.sample(TAGS, rnd.randint(0, 3)),
+        "awards": rnd.sample(AWARDS, rnd.choice([0, 0, 0, 1, 2])),
+    }
+
+
+def render_note(metadata: dict) -> str:
+    """Renders a note as markdown with frontmatter"""
+    lines = ["---"]
+    for key, value in metadata.items():
+        if isinstance(value, list):
+            lines.append(f"{key}:")
+            lines.extend(f"  - {item}" for item in value)
+            if not value:
+                lines[-1] = f"{key}: []"
+        else:
+            lines.append(f"{key}: {value}")
+    lines.append("---")
+    lines.append("")
+    lines.append(f"# {metadata['title']}")
+    lines.append("")
+    lines.append(f"**Author**: {metadata['author']}")
+    lines.append("")
+    lines.append(
+        f"A placeholder summary of **{metadata['title']}**, a {metadata['genre'].lower()} novel."
+    )
+    lines.append("")
+    return "\n".join(lines)
+
+
+def generate_vault(root: str, notes: int, seed: int = 0) -> list[str]:
+    """Writes `notes` notes and catalog pages into `root`, returns paths of the notes.
+
+    The same `notes` and `seed` always produce the same vault.
+    """
+    rnd = random.Random(seed)
+    paths = []
+    for i in range(notes):
+        path = os.path.join(root, note_path(i))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(render_note(note_metadata(rnd, i)))
+        paths.append(path)
+
+    catalog = CATALOG_MD.replace("title: Catalog", f"title: Catalog\nnotes: {notes}")
+    for name in ("catalog.md", "catalog.mdtmpl"):
+        with open(os.path.join(root, name), "w", encoding="utf-8") as file:
+            file.write(catalog)
+
+    return paths
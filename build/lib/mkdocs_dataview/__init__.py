@@ -0,0 +1,5 @@
+"""
+__init__ module for dataview package
+"""
+
+__version__ = "0.0.0.dev"
@@ -0,0 +1,73 @@
+// Pages through rows of `TABLE JSON` queries, see markdown_db/datasets.py
+(function () {
+  "use strict";
+
+  function button(text) {
+    var element = document.createElement("button");
+    element.type = "button";
+    element.textContent = text;
+    return element;
+  }
+
+  function setup(container) {
+    if (container.dataset.ready) {
+      return;
+    }
+    container.dataset.ready = "1";
+
+    var pageSize = parseInt(container.dataset.pageSize, 10) || 50;
+    var tbody = container.querySelector("tbody");
+    var prev = button("‹");
+    var next = button("›");
+    var status = document.createElement("span");
+    var pager = document.createElement("div");
+    pager.className = "dataview-pager";
+    pager.append(prev, " ", status, " ", next);
+    pager.hidden = true;
+    container.appendChild(pager);
+
+    var rows = [];
+    var page = 0;
+
+    function show() {
+      var start = page * pageSize;
+      var end = Math.min(start + pageSize, rows.length);
+      var html = "";
+      for (var i = start; i < end; i++) {
+        html += "<tr><td>" + rows[i].join("</td><td>") + "</td></tr>";
+      }
+      // cells are escaped when the dataset is written
+      tbody.innerHTML = html;
+      status.textContent = (start + 1) + "–" + end + " / " + rows.length;
+      prev.disabled = page === 0;
+      next.disabled = end >= rows.length;
+      pager.hidden = rows.length <= pageSize;
+    }
+
+    prev.addEventListener("click", function () { page -= 1; show(); });
+    next.addEventListener("click", function () { page += 1; show(); });
+
+    fetch(container.dataset.dataset)
+      .then(function (response) { return response.json(); })
+      .then(function (data) { rows = data; show(); });
+  }
+
+  function setupAll() {
+    document.querySelectorAll(".dataview-dataset").forEach(setup);
+  }
+
+  if (window.dataviewPager) {
+    setupAll();
+    return;
+  }
+  window.dataviewPager = true;
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", setupAll);
+  } else {
+    setupAll();
+  }
+  // instant navigation of mkdocs-material replaces the page without reloading scripts
+  if (window.document$) {
+    window.document$.subscribe(setupAll);
+  }
+})();
@@ -0,0 +1,222 @@
+"""
+This module implements an on-disk cache of rendered pages that survives between builds.
+
+A cache entry is keyed by a hash of the page source, the page metadata (`this`),
+its url and a fingerprint of every index slice its queries can read (records that
+pass the FROM clause and the fields the query references, also in linked notes).
+If none of them changed, the rendered markdown is the same as in the previous build.
+Pages that call impure functions (see query/functions.py) are never cached, their
+output can change with the same inputs.
+
+Fingerprints are memoized by the query text and hashes of whole records by their
+key, so every query and record is hashed once per build however many pages use them.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from lark.exceptions import LarkError
+
+from mkdocs_dataview import __version__
+from mkdocs_dataview.query.accessors import dereference_position, parse_path
+from mkdocs_dataview.query.functions import is_pure
+from mkdocs_dataview.query.solvers import ExpressionSolverService, IdentifiersCollector
+from mkdocs_dataview.query.solvers import QueryService, lookup_value_in_dict
+
+from .md_renderer import match_sources
+from .projection import extract_queries
+
+# bump it when the rendered output changes for the same inputs
+CACHE_FORMAT_VERSION = "1"
+
+# fields that can change the output of any query (file.link title, FROM #tag)
+ALWAYS_FINGERPRINTED = ("file.path", "metadata.title", "metadata.tags")
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def calls_impure_function(tree) -> bool:
+    """Checks if an expression or query tree calls functions that are not pure (or unknown)"""
+    return any(not is_pure(str(call.children[0])) for call in tree.find_data("function_call"))
+
+
+def query_fingerprint(query: str, sources: dict, resolve=None, record_hashes=None) -> str:
+    """Returns a hash of all index data that can affect the result of the query,
+    `resolve` dereferences links to other notes (see accessors.py). `record_hashes`
+    memoizes hashes of whole records by their key."""
+    qs = QueryService(query)
+    from_sources = qs.get_sources()
+
+    identifiers = qs.get_identifiers()
+    whole_record = bool({"file", "metadata"} & identifiers)
+    paths = sorted(
+        {i for i in identifiers if i.startswith(("file.", "metadata."))}
+        | set(ALWAYS_FINGERPRINTED)
+    )
+    if record_hashes is None:
+        record_hashes = {}
+
+    digest = hashlib.sha256()
+    for key, v in sources.items():
+        if not match_sources(from_sources, v):
+            continue
+
+        if whole_record:
+            if key not in record_hashes:
+                record_hashes[key] = hashlib.sha256(_dumps(v).encode()).digest()
+            digest.update(record_hashes[key])
+        else:
+            digest.update(_dumps([
+                lookup_value_in_dict(v, path, resolve) for path in paths
+            ]).encode())
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+def linked_this_fingerprint(identifiers, this_metadata, resolve) -> str:
+    """Returns a hash of fields of notes linked from `this` that queries and inline
+    expressions read (e.g. `this.metadata.series.metadata.title`)"""
+    values = [
+        lookup_value_in_dict({"this": this_metadata}, identifier, resolve)
+        for identifier in sorted(identifiers)
+        if identifier.startswith("this.")
+        and dereference_position(parse_path(identifier)) is not None
+    ]
+    return hashlib.sha256(_dumps(values).encode()).hexdigest()
+
+
+class RenderCache:
+    """Rendered pages stored as files in `cache_dir`.
+
+    Fingerprints of the index are memoized until `start_build`, which must be called
+    whenever the index changes.
+
+    Typical usage::
+        cache = RenderCache(".cache/plugin/dataview")
+        cache.start_build()  # once the index is built
+        key = cache.key(markdown, this_metadata, page_url, sources)
+        result = cache.get(key) if key is not None else None
+        if result is None:
+            result = render(...)
+            if key is not None:
+                cache.set(key, result)
+        ...
+        cache.prune()  # removes entries that were not used by this build
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.used_keys = set()
+        # query -> fingerprint of the index data it reads, None if it's not cacheable
+        self._fingerprints = {}
+        # query or expression -> (identifiers, calls impure functions), independent of
+        # the index
+        self._parsed = {}
+        # key of a record -> hash of the whole record
+        self._record_hashes = {}
+
+    def start_build(self) -> None:
+        """Forgets fingerprints of the index, call it after the index changes"""
+        self._fingerprints.clear()
+        self._record_hashes.clear()
+
+    def _parse(self, text: str, is_query: bool):
+        if text not in self._parsed:
+            if is_query:
+                qs = QueryService(text)
+                self._parsed[text] = (qs.get_identifiers(), calls_impure_function(qs.tree))
+            else:
+                try:
+                    tree = ExpressionSolverService(text).tree
+                except LarkError:
+                    # rendered as is
+                    self._parsed[text] = (set(), False)
+                    return self._parsed[text]
+                collector = IdentifiersCollector()
+                collector.visit(tree)
+                self._parsed[text] = (collector.identifiers, calls_impure_function(tree))
+        return self._parsed[text]
+
+    def _identifiers(self, queries, expressions) -> set | None:
+        """Returns identifiers of queries and inline expressions, None if they call
+        impure functions"""
+        identifiers = set()
+        for text, is_query in [(q, True) for q in queries] + [(e, False) for e in expressions]:
+            text_identifiers, impure = self._parse(text, is_query)
+            if impure:
+                return None
+            identifiers.update(text_identifiers)
+        return identifiers
+
+    def _query_fingerprint(self, query: str, sources: dict, resolve) -> str:
+        if query not in self._fingerprints:
+            self._fingerprints[query] = query_fingerprint(
+                query, sources, resolve, self._record_hashes
+            )
+        return self._fingerprints[query]
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def key(
+            self, markdown: str, this_metadata, path: str, sources: dict, extra: str = "",
+            resolve=None,
+            ) -> str | None:
+        """Returns the cache key of a page, queries of the page are parsed to fingerprint
+        the index slices they depend on. `extra` is a fingerprint of other data the page
+        depends on (e.g. links.LinkGraph.fingerprint), `resolve` dereferences links to
+        other notes (see RendererWithContext.resolve_link).
+
+        Returns None if the page must not be cached (it calls impure functions)."""
+        digest = hashlib.sha256()
+        parts = (CACHE_FORMAT_VERSION, __version__, path, _dumps(this_metadata), markdown, extra)
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b"\0")
+
+        queries, expressions = extract_queries(markdown)
+        identifiers = self._identifiers(queries, expressions)
+        if identifiers is None:
+            return None
+
+        for query in queries:
+            digest.update(self._query_fingerprint(query, sources, resolve).encode())
+        if resolve is not None and "this." in markdown:
+            digest.update(linked_this_fingerprint(identifiers, this_metadata, resolve).encode())
+
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".md")
+
+    def get(self, key: str) -> str | None:
+        """Returns cached rendered markdown or None"""
+        self.used_keys.add(key)
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Stores rendered markdown (atomically, so parallel builds don't see partial files)"""
+        self.used_keys.add(key)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(value)
+        os.replace(tmp_path, path)
+
+    def prune(self) -> None:
+        """Removes entries that were not used since the cache was created"""
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                key, _ = os.path.splitext(file)
+                if key not in self.used_keys:
+                    os.remove(os.path.join(root, file))
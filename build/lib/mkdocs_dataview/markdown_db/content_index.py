@@ -0,0 +1,116 @@
+"""
+This module implements a trigram index of page contents for `file.content` queries.
+
+Every indexed text is split into its distinct trigrams (3 character substrings)
+and the file is appended to the posting list of every trigram. Posting lists are
+arrays of file numbers, so the index takes a few bytes per distinct trigram of a
+page. A substring can only occur in files that have all of its trigrams, so
+`file.content CONTAINS "deprecated"` conditions of a WHERE clause preselect files
+by intersecting posting lists. The renderer still evaluates the whole WHERE clause
+on the preselected files (see `RendererWithContext._candidates`).
+
+Typical usage::
+    index = ContentIndex()
+    index.add("docs/a.md", "page text")
+    ...
+    qs = QueryService('TABLE file.link WHERE file.content CONTAINS "text"')
+    qs.optimize(this)
+    keys = index.candidates(qs.where_tree)  # None if any file may match
+"""
+from array import array
+
+from lark import Tree
+
+# substrings shorter than that can't be looked up
+TRIGRAM = 3
+
+
+def trigrams(text: str) -> set[str]:
+    """Returns distinct trigrams of the text"""
+    return {text[i:i + TRIGRAM] for i in range(len(text) - TRIGRAM + 1)}
+
+
+class ContentIndex:
+    """Trigram index of texts of files, files are numbered in the order they are added"""
+    def __init__(self):
+        self.keys = []
+        self.postings = {}  # trigram -> array of file numbers
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key: str, text: str) -> None:
+        """Indexes text of the file `key`"""
+        number = len(self.keys)
+        self.keys.append(key)
+        for trigram in trigrams(text):
+            postings = self.postings.get(trigram)
+            if postings is None:
+                postings = self.postings[trigram] = array("I")
+            postings.append(number)
+
+    def merge(self, partial: "ContentIndex") -> None:
+        """Adds files of another index (e.g. built by another process) after the files
+        of this one"""
+        offset = len(self.keys)
+        self.keys.extend(partial.keys)
+        for trigram, partial_postings in partial.postings.items():
+            postings = self.postings.get(trigram)
+            if postings is None:
+                postings = self.postings[trigram] = array("I")
+            postings.extend(number + offset for number in partial_postings)
+
+    def search(self, substring: str) -> set[str] | None:
+        """Returns keys of files that may contain the substring, None if it's too short"""
+        needed = trigrams(substring)
+        if not needed:
+            return None
+
+        postings = sorted((self.postings.get(t, ()) for t in needed), key=len)
+        numbers = set(postings[0])
+        for other in postings[1:]:
+            if not numbers:
+                break
+            numbers.intersection_update(other)
+        return {self.keys[number] for number in numbers}
+
+    def candidates(self, where_tree) -> set[str] | None:
+        """Returns keys of files that may match an optimized WHERE tree (see
+        QueryService.optimize), None if any file may match"""
+        result = None
+        for substring in content_substrings(where_tree):
+            keys = self.search(substring)
+            if keys is not None:
+                result = keys if result is None else result & keys
+        return result
+
+
+def content_substrings(tree) -> list[str]:
+    """Returns substrings of `file.content CONTAINS "..."` (or `"..." IN file.content`)
+    conditions that must hold for the whole tree to be true"""
+    if not isinstance(tree, Tree):
+        return []
+    if tree.data in ("where_clause", "shared"):
+        return content_substrings(tree.children[-1])
+    if tree.data == "and_op":
+        return content_substrings(tree.children[0]) + content_substrings(tree.children[1])
+
+    if tree.data in ("contains_op", "in_op"):
+        haystack, needle = tree.children
+        if tree.data == "in_op":
+            needle, haystack = haystack, needle
+        if _is_content(haystack) and _is_constant_str(needle):
+            return [needle.children[0]]
+    return []
+
+
+def _is_content(tree) -> bool:
+    if isinstance(tree, Tree) and tree.data == "shared":
+        tree = tree.children[1]
+    return (isinstance(tree, Tree) and tree.data == "identifier"
+            and tree.children[0].value.strip('`') == "file.content")
+
+
+def _is_constant_str(tree) -> bool:
+    return (isinstance(tree, Tree) and tree.data == "constant"
+            and isinstance(tree.children[0], str))
@@ -0,0 +1,93 @@
+"""
+This module implements JSON datasets of big query results (`TABLE JSON ...`).
+
+Rows of such a query are written to a JSON file instead of the page: the page
+gets an empty table shell and a small script (`assets/dataview-pager.js`) that
+loads the rows and pages through them in the browser. Datasets are named by a
+hash of their contents, so pages with the same results share one file.
+
+Datasets are written to a store directory while pages are rendered (also by
+worker processes), the plugin copies the datasets that rendered pages refer to
+into `site_dir` after the build.
+
+Typical usage::
+    name = write_dataset(store_dir, rows)
+    render_dataset_table(columns, name, len(rows), page_dir, out)
+    ...
+    publish_datasets(store_dir, referenced_datasets(html), site_dir)
+"""
+from html import escape
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+# url of datasets and of the pager script in the site
+DATASET_URL = "assets/dataview"
+PAGER_SCRIPT = "dataview-pager.js"
+# rows shown by the pager at once
+PAGE_SIZE = 50
+
+DATASET_REF_RE = re.compile(r'data-dataset="[^"]*?([0-9a-f]{64})\.json"')
+
+
+def write_dataset(store_dir: str, rows: list) -> str:
+    """Writes rows (lists of HTML cells) to the store, returns the name of the dataset"""
+    data = json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode()
+    name = hashlib.sha256(data).hexdigest()
+    path = os.path.join(store_dir, f"{name}.json")
+    if not os.path.exists(path):
+        os.makedirs(store_dir, exist_ok=True)
+        # other processes may write the same dataset
+        fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    return name
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def render_dataset_table(columns, name: str, row_count: int, page_dir: str, out) -> None:
+    """Renders the table shell of a dataset for a page in `page_dir`"""
+    dataset = os.path.relpath(f"{DATASET_URL}/{name}.json", page_dir)
+    script = os.path.relpath(f"{DATASET_URL}/{PAGER_SCRIPT}", page_dir)
+    out.write(
+        f'<div class="dataview-dataset" data-dataset="{escape(dataset)}" '
+        f'data-rows="{row_count}" data-page-size="{PAGE_SIZE}">\n<table>\n<thead>\n<tr>'
+    )
+    for column in columns:
+        out.write(f"<th>{escape(column, quote=False)}</th>")
+    out.write(
+        "</tr>\n</thead>\n<tbody></tbody>\n</table>\n</div>\n"
+        f'<script src="{escape(script)}" defer></script>\n'
+    )
+
+
+def referenced_datasets(html: str) -> set[str]:
+    """Returns names of datasets that a rendered page refers to"""
+    if "dataview-dataset" not in html:
+        return set()
+    return set(DATASET_REF_RE.findall(html))
+
+
+def publish_datasets(store_dir: str, names, site_dir: str) -> list[str]:
+    """Copies datasets and the pager script to the site, returns names of datasets that
+    are missing in the store"""
+    target_dir = os.path.join(site_dir, DATASET_URL)
+    os.makedirs(target_dir, exist_ok=True)
+    shutil.copyfile(
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets", PAGER_SCRIPT),
+        os.path.join(target_dir, PAGER_SCRIPT),
+    )
+
+    missing = []
+    for name in names:
+        try:
+            shutil.copyfile(
+                os.path.join(store_dir, f"{name}.json"), os.path.join(target_dir, f"{name}.json")
+            )
+        except FileNotFoundError:
+            missing.append(name)
+    return missing
@@ -0,0 +1,95 @@
+"""
+This module contains the FilePlugin class for rendering files in a standalone mode.
+"""
+import io
+import logging
+import os
+import frontmatter
+
+from .md_renderer import RendererWithContext
+from .index import build_index, SimpleMemoryIndex
+from .. import utils
+from ..tracing import Tracer
+
+log = logging.getLogger(__name__)
+
+
+class FilePlugin():
+    """Plugin for handling file-based rendering and data collection."""
+    def __init__(self, tracer: Tracer | None = None, daemon=None):
+        self.index = SimpleMemoryIndex()
+        self.sources = self.index.sources
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.renderer = RendererWithContext(self.sources, tracer=self.tracer)
+        # daemon.DaemonClient to load files with, they are loaded here if it's None
+        self.daemon = daemon
+        self._preloaded = {}
+
+    def render_file(self, path, out):
+        """renders file"""
+        obj = self.load_file(path)
+        # cause obj.metadata doesn't have metadata, we had to render it first here
+        out.write("---\n")
+        out.write("generated_ignore: true\n")
+        out.write(frontmatter.YAMLHandler().export(obj.metadata))
+        out.write("\n---\n")
+        self.renderer.render_str(
+            io.StringIO(obj.content), out, self.sources[path], path, self.tracer.page(path)
+        )
+
+    def render_all_templates(self, path: str):
+        """renders all files in cli mode"""
+        for full_path_file in utils.enumerate_files_by_ext(path, ['.mdtmpl']):
+            new_file_path, _ = os.path.splitext(full_path_file)
+            new_file_path += ".md"
+
+            with open(new_file_path, 'w', encoding="utf-8-sig") as file_out:
+                self.render_file(full_path_file, file_out)
+
+    def load_file(self, path: str):
+        """
+        Helper method to load a file with correct encoding and return it's metadata.
+        """
+        post = self._preloaded.get(os.path.abspath(path))
+        if post is not None:
+            return post
+
+        with open(path, 'r', encoding="utf-8-sig") as file:
+            return frontmatter.load(file)
+
+    def _on_file(self, file_path: str, target_url: str, src_uri: str | None = None):
+        """common method to scan file to build index"""
+
+        trace = self.tracer.page(file_path)
+        trace("load file %s", file_path)
+
+        data = self.load_file(file_path)
+        trace("metadata: %s", data.metadata)
+
+        build_index(data, file_path, target_url, self.index, src_uri)
+
+    def collect_data(self, root_path: str):
+        """searches for all .md, .mdtmpl files (used in cli mode)"""
+        file_paths = list(utils.enumerate_files_by_ext(root_path, ['.md', '.mdtmpl']))
+        if self.daemon is not None:
+            self._preload(root_path, file_paths)
+
+        for file_path in file_paths:
+            target_url = file_path
+            path_without_extension, extension = os.path.splitext(file_path)
+            if extension == '.mdtmpl':
+                target_url = path_without_extension + '.md'
+            self._on_file(file_path, target_url, os.path.relpath(file_path, root_path))
+
+    def _preload(self, root_path: str, file_paths: list[str]):
+        """loads files by the daemon, they are loaded here if it fails"""
+        # pylint: disable=import-outside-toplevel
+        from ..daemon import DaemonError
+
+        try:
+            self._preloaded = self.daemon.load(
+                os.path.abspath(root_path), [os.path.abspath(p) for p in file_paths]
+            )
+        except (OSError, DaemonError) as exc:
+            log.warning("dataview daemon failed, loading files in-process: %s", exc)
+            self.daemon = None
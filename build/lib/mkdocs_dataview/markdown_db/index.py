@@ -0,0 +1,227 @@
+"""
+This module defines abstract interface for building an index and a simple in-memory
+implementation of it.
+"""
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+import datetime
+import os
+
+import frontmatter
+
+from .content_index import ContentIndex
+from .inline_fields import extract_inline_fields, merge_inline_fields
+from .links import LINK_ATTRIBUTES, LinkGraph
+
+
+class IndexBuilder(ABC):
+    """Interface for building an Index"""
+    @abstractmethod
+    def add_tag(self, tag: str, metadata: dict) -> None:  # pylint: disable=missing-function-docstring
+        pass
+
+    @abstractmethod
+    def add_file(self, file_path: str, metadata: dict) -> None:  # pylint: disable=missing-function-docstring
+        pass
+
+    def add_content(self, file_path: str, content: str) -> None:
+        """Called with the markdown of every indexed file (without frontmatter), builders
+        that index contents (see content_index.py) override it"""
+
+    def merge(self, partial: "SimpleMemoryIndex") -> None:
+        """Adds files and tags of a partial index (e.g. built by another process).
+
+        Partial indexes must be merged in the order of their shards, so the result
+        is the same as if all files were added to this builder one by one.
+        """
+        for file_path, record in partial.sources.items():
+            self.add_file(file_path, record)
+        for tag, records in partial.tags.items():
+            for record in records:
+                self.add_tag(tag, record)
+
+
+class FileAttributes(dict):
+    """`file.*` attributes of an indexed file.
+
+    Only `path` and `name` are stored eagerly. The attributes listed in
+    `LAZY_ATTRIBUTES` are computed on access, so e.g. `os.stat` is called only for
+    files whose `file.mtime` is actually queried. The record never stores them
+    (records are shared by concurrent renders): they are memoized by the per-row
+    view (see `for_page`) and dropped with it, so e.g. file bodies are not kept
+    for the whole build. `file.link` depends on the page that renders it and is
+    computed on every call (see `link`).
+    """
+    LAZY_ATTRIBUTES = ('mtime', 'ctime', 'size', 'folder', 'ext', 'content')
+
+    def __init__(self, src_path: str, path: str, src_uri: str | None = None, metadata=None):
+        super().__init__(path=path, name=os.path.basename(src_path))
+        self.src_path = src_path
+        self.src_uri = src_uri if src_uri is not None else src_path
+        self.metadata = metadata if metadata is not None else {}
+
+    def __missing__(self, key):
+        return self.lazy_values(key)[key]
+
+    def lazy_values(self, key) -> dict:
+        """Computes the lazy attribute `key`, returns it with the attributes that were
+        computed along (e.g. all stat values)"""
+        if key in ('mtime', 'ctime', 'size'):
+            return self._load_stats()
+        if key == 'folder':
+            return {'folder': os.path.dirname(self.src_uri)}
+        if key == 'ext':
+            return {'ext': os.path.splitext(self['name'])[1]}
+        if key == 'content':
+            return {'content': self.read_content()}
+        raise KeyError(key)
+
+    def read_content(self) -> str:
+        """Returns markdown of the file without frontmatter (read on every call)"""
+        with open(self.src_path, 'r', encoding="utf-8-sig") as file:
+            return frontmatter.load(file).content
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def _load_stats(self) -> dict:
+        file_stats = os.stat(self.src_path)
+        return {
+            'ctime': datetime.datetime.fromtimestamp(file_stats.st_ctime),
+            'mtime': datetime.datetime.fromtimestamp(file_stats.st_mtime),
+            'size': file_stats.st_size,
+        }
+
+    def link(self, page_dir: str) -> str:
+        """Returns markdown link to this file relative to `page_dir`."""
+        title = self.metadata.get('title', os.path.basename(self['path']))
+        return f"[{title}]({os.path.relpath(self['path'], page_dir)})"
+
+    def for_page(self, page_dir: str, links: LinkGraph | None = None) -> "PageFileAttributes":
+        """Returns a view of the attributes that also resolves `link` for `page_dir`
+        and `inlinks`/`outlinks` with the link graph if it's given, lazy attributes
+        are computed once per view."""
+        return PageFileAttributes(self, page_dir, links)
+
+
+class PageFileAttributes:
+    """Read-only view of `FileAttributes` bound to the directory of a rendered page.
+
+    Views are created for every rendered row (and `this` of every query), lazy
+    attributes computed through a view are memoized by it and dropped with it.
+    """
+    __slots__ = ('attributes', 'page_dir', 'links', 'values')
+
+    def __init__(self, attributes: FileAttributes, page_dir: str, links: LinkGraph | None = None):
+        self.attributes = attributes
+        self.page_dir = page_dir
+        self.links = links
+        self.values = {}
+
+    def __getitem__(self, key):
+        if key == 'link':
+            return self.attributes.link(self.page_dir)
+        if key in LINK_ATTRIBUTES and self.links is not None:
+            return self.links.get(key, self.attributes.src_path)
+        if key in FileAttributes.LAZY_ATTRIBUTES:
+            if key not in self.values:
+                self.values.update(self.attributes.lazy_values(key))
+            return self.values[key]
+        return self.attributes[key]
+
+    def get(self, key, default=None):  # pylint: disable=missing-function-docstring
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return repr(self.attributes)
+
+
+def build_index(
+        data: frontmatter.Post,
+        file_path: str,
+        target_url: str,
+        builder: IndexBuilder,
+        src_uri: str | None = None,
+        ) -> None:
+    """Builds metadata and links based on paths, frontmatter and inline fields of the
+    content (see inline_fields.py)
+
+    Does some checks:
+     - ignores file from index if it has attribute `generated_ignore`
+     - does checks that frontmatter doesn't override any "system" attributes like `file`, `ctime`
+
+    Arguments:
+    data -- full frontmatter.Post object
+    file_path -- path to the file (added to metadata)
+    target_url -- url to the file (added to metadata)
+    builder -- IndexBuilder implementation
+    src_uri -- path to the file relative to the docs root (used for `file.folder`)
+    """
+    if data.metadata.get("generated_ignore"):
+        return
+
+    if data.metadata.get('file') is not None:
+        raise Exception("unexpected `file` parameter in frontmatter ", file_path)  # pylint: disable=broad-exception-raised
+
+    metadata = merge_inline_fields(data.metadata, extract_inline_fields(data.content))
+
+    # stat data and other derived attributes are resolved lazily by FileAttributes
+    result_dataview_metadata = {
+        "metadata": metadata,
+        "file": FileAttributes(file_path, target_url, src_uri, metadata),
+    }
+
+    builder.add_file(file_path, result_dataview_metadata)
+    builder.add_content(file_path, data.content)
+
+    if 'tags' in data.metadata:
+        for tag in data.metadata['tags']:
+            builder.add_tag(tag, result_dataview_metadata)
+
+
+class SimpleMemoryIndex(IndexBuilder):
+    """A simple in-memory implementation of the IndexBuilder interface.
+
+    It's also the format of partial indexes: it can be pickled and sent to another
+    process, where it is merged into the main index (see `IndexBuilder.merge`).
+    `field_stats` counts files per top-level metadata field. Contents of files are
+    indexed in `content_index` if `content` is set and links between files in
+    `link_graph` if `links` is set.
+    """
+    def __init__(self, content: bool = False, links: bool = False):
+        self.sources = {}
+        self.tags = defaultdict(list)
+        self.field_stats = Counter()
+        self.content_index = ContentIndex() if content else None
+        self.link_graph = LinkGraph() if links else None
+
+    def add_tag(self, tag: str, metadata: dict) -> None:
+        self.tags[tag].append(metadata)
+
+    def add_file(self, file_path: str, metadata: dict) -> None:
+        self.sources[file_path] = metadata
+        self.field_stats.update(metadata['metadata'].keys())
+        if self.link_graph is not None:
+            self.link_graph.add_page(file_path, metadata['file']['path'])
+
+    def add_content(self, file_path: str, content: str) -> None:
+        if self.content_index is not None:
+            self.content_index.add(file_path, content)
+        if self.link_graph is not None:
+            self.link_graph.add_content(file_path, content)
+
+    def merge(self, partial: "SimpleMemoryIndex") -> None:
+        self.sources.update(partial.sources)
+        for tag, records in partial.tags.items():
+            self.tags[tag].extend(records)
+        self.field_stats.update(partial.field_stats)
+        if self.content_index is not None and partial.content_index is not None:
+            self.content_index.merge(partial.content_index)
+        if self.link_graph is not None and partial.link_graph is not None:
+            self.link_graph.merge(partial.link_graph)
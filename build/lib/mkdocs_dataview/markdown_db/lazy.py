@@ -0,0 +1,77 @@
+"""
+This module implements a `sources` mapping that indexes files on first use.
+
+Most pages of a site have no dataview queries, so building the whole index up
+front costs more than rendering the few pages that need it. `LazySources` only
+records the list of files: looking up a key (e.g. `this` of a page) indexes that
+file, and queries index the files that can pass their FROM path sources (paths
+are known without reading files). Anything else, like iterating over all
+sources, indexes the rest of the files.
+"""
+from collections.abc import Mapping
+import time
+
+from .index import SimpleMemoryIndex
+
+
+class LazySources(Mapping):
+    """Read-only `sources` mapping of the files [(file_path, target_url, src_uri), ...].
+
+    `load(file_path, target_url, src_uri)` must add the file to `index` (see
+    `build_index`). Files are iterated in the order of `files`, no matter in which
+    order they were indexed.
+    """
+    def __init__(self, files, load, index: SimpleMemoryIndex):
+        self.files = {file_path: (target_url, src_uri) for file_path, target_url, src_uri in files}
+        self.index = index
+        self._load = load
+        self._pending = dict(self.files)
+        # number of indexed files and total time spent on it (see report.BuildReport)
+        self.loaded = 0
+        self.load_time = 0.0
+
+    def _load_file(self, file_path: str) -> None:
+        target_url, src_uri = self._pending.pop(file_path)
+        started = time.perf_counter()
+        try:
+            self._load(file_path, target_url, src_uri)
+        finally:
+            self.loaded += 1
+            self.load_time += time.perf_counter() - started
+
+    def load_all(self) -> None:
+        """Indexes all files that are not indexed yet"""
+        for file_path in list(self._pending):
+            self._load_file(file_path)
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            self._load_file(key)
+        return self.index.sources[key]
+
+    def __iter__(self):
+        self.load_all()
+        return (key for key in self.files if key in self.index.sources)
+
+    def __len__(self):
+        self.load_all()
+        return len(self.index.sources)
+
+    def select(self, qs, use_from=True):
+        """Returns (key, record) of files that may match the optimized query.
+
+        Only files whose path starts with all FROM path sources are indexed, the
+        rest of the FROM clause is checked by the renderer as usual.
+        """
+        prefixes = []
+        if use_from:
+            prefixes = [s["value"] for s in qs.get_sources() if s["type"] == "path"]
+
+        for key, (target_url, _) in self.files.items():
+            if not all(target_url.startswith(prefix) for prefix in prefixes):
+                continue
+            if key in self._pending:
+                self._load_file(key)
+            record = self.index.sources.get(key)
+            if record is not None:
+                yield key, record
@@ -0,0 +1,466 @@
+"""
+This module provides the RendererWithContext class for rendering dataview queries in markdown.
+"""
+import functools
+from html import escape
+import io
+import os
+import re
+
+from lark.exceptions import LarkError
+
+from mkdocs_dataview.query.solvers import ExpressionSolverService
+from mkdocs_dataview.query.solvers import QueryService
+
+from .datasets import render_dataset_table, write_dataset
+from .index import FileAttributes
+from .links import LINK_ATTRIBUTES
+from .report import SKIPPED_BY_FROM
+from ..tracing import NO_TRACE, Lazy, Tracer
+
+# `dataview` fences and inline code spans (only spans starting with `= are rendered)
+DATAVIEW_RE = re.compile(
+    r"^```dataview\n(?P<query>.*?)^```[^\S\n]*(?:\n|\Z)|`(?P<inline>[^`\n]*)`",
+    re.MULTILINE | re.DOTALL,
+)
+# values rendered as links in HTML tables, like `file.link`
+MARKDOWN_LINK_RE = re.compile(r"\[([^\]\n]*)\]\(([^()\s]*)\)")
+
+TABLE_FORMATS = ("markdown", "html", "json")
+
+
+class RenderError(Exception):
+    """Root exception for all render errors."""
+
+
+class RendererWithContext:  # pylint: disable=too-many-instance-attributes
+    """Class for rendering dataview queries in markdownas TABLE or LIST"""
+
+    def __init__(self, sources, report=None, tracer=None):
+        self.sources = sources
+        # report.BuildReport, queries are not instrumented if it's None
+        self.report = report
+        self.tracer = tracer if tracer is not None else Tracer()
+        # {(out_path, query): rendered markdown} executed ahead of time, see parallel.py
+        self.precomputed = {}
+        # content_index.ContentIndex of the sources, preselects rows by `file.content`
+        self.content_index = None
+        # links.LinkGraph of the sources, resolves `file.inlinks` and `file.outlinks`
+        self.link_graph = None
+        # output of tables that don't set it in the query (`TABLE HTML ...`)
+        self.table_format = "markdown"
+        # where rows of `TABLE JSON` queries are written, see datasets.py
+        self.dataset_dir = None
+        # path_index.PathIndex of the sources, dereferences links to other notes
+        self.path_index = None
+
+    def _candidates(self, qs, use_from=True):
+        """returns (key, record) of the sources that may match the optimized query,
+        indexes that can preselect rows (e.g. SQLiteIndex) implement `select`"""
+        select = getattr(self.sources, "select", None)
+        candidates = self.sources.items() if select is None else select(qs, use_from)
+
+        if self.content_index is not None and not qs.flatten_clauses:
+            keys = self.content_index.candidates(qs.where_tree)
+            if keys is not None:
+                return ((k, v) for k, v in candidates if k in keys)
+        return candidates
+
+    def _row_identifiers(self, v, this_metadata, page_dir, bind_link):
+        """builds identifiers for where/select clauses of a single file"""
+        identifiers = {}
+        identifiers['metadata'] = v['metadata']
+        identifiers['this'] = this_metadata
+        identifiers['file'] = v['file']
+        if bind_link:
+            identifiers['file'] = _file_attributes_for_page(v, page_dir, self.link_graph)
+        return identifiers
+
+    def resolve_link(self, path, page_dir=None):
+        """returns the record of the note at `path` (see path_index.py) or None, its
+        `file.link` is resolved for `page_dir` if it's given"""
+        key = self.path_index.get(path)
+        if key is None:
+            return None
+        record = self.sources.get(key)
+        if record is None or page_dir is None:
+            return record
+        return {**record, 'file': _file_attributes_for_page(record, page_dir, self.link_graph)}
+
+    def _resolver(self, page_dir=None):
+        """returns the function that dereferences links in queries (see accessors.py)"""
+        if self.path_index is None:
+            return None
+        return functools.partial(self.resolve_link, page_dir=page_dir)
+
+    def _bind_this(self, this_metadata, page_dir):
+        """resolves `this.file.link` and links of `this` for the rendered page"""
+        attributes = this_metadata.get('file') if isinstance(this_metadata, dict) else None
+        if isinstance(attributes, FileAttributes):
+            return {**this_metadata, 'file': attributes.for_page(page_dir, self.link_graph)}
+        return this_metadata
+
+    def _matching_rows(self, qs, identifiers, path, trace=NO_TRACE):
+        """yields (identifiers, shared) of rows of a file (see QueryService.flatten) that
+        pass the WHERE clause, `shared` is passed to render_columns"""
+        try:
+            for row in qs.flatten(identifiers):
+                shared = {}
+                match = qs.where(row, shared)
+                if trace.enabled:
+                    trace("check file: %s, match: %s, identifiers: %s", path, match, row)
+                if match:
+                    yield row, shared
+        except Exception as exc:
+            raise RenderError(f"Error in executing where clause: {identifiers}") from exc
+
+    # pylint: disable=too-many-positional-arguments,too-many-arguments,too-many-locals
+    def _render_table_source(
+            self, qs, this_metadata, out, out_path, v, bind_link=True, trace=NO_TRACE,
+            write_row=None, seen=None,
+            ):
+        """renders table rows for the record `v`, returns (matched rows, rendered rows) or
+        report.SKIPPED_BY_FROM.
+
+        `seen` is a set of keys of rendered rows for DISTINCT queries."""
+        try:
+            sources = qs.get_sources()
+        except Exception as exc:
+            raise RenderError("Error in getting sources") from exc
+
+        identifiers = self._row_identifiers(v, this_metadata, os.path.dirname(out_path), bind_link)
+        try:
+            if not match_sources(sources, v):
+                if trace.enabled:
+                    trace("skip file due to FROM clause: %s", v['file']['path'])
+                return SKIPPED_BY_FROM
+        except Exception as exc:
+            raise RenderError(f"Error in executing where clause: {identifiers}") from exc
+
+        matched = rendered = 0
+        for row, shared in self._matching_rows(qs, identifiers, v['file']['path'], trace):
+            matched += 1
+            try:
+                row_list = qs.render_columns(row, shared)
+                if seen is None or is_new_row(seen, row_list):
+                    (write_row or write_markdown_row)(row_list, out)
+                    rendered += 1
+            except Exception as exc:
+                raise RenderError(f"Error in rendering columns: {v}") from exc
+
+        return matched, rendered
+
+    # pylint: disable=too-many-positional-arguments,too-many-arguments
+    def render_table(self, qs, this_metadata, out, out_path, stats=None, trace=NO_TRACE):
+        """renders markdown (HTML or dataset) table, rows are counted in `stats`
+        (report.QueryStats) if given"""
+        table_format = (qs.get_view_format() or self.table_format).lower()
+        if table_format == "html":
+            render_html_table_header(qs.columns(), out)
+            write_row = write_html_row
+        elif table_format == "json":
+            if self.dataset_dir is None:
+                raise RenderError("JSON tables need a dataset directory")
+            rows = []
+            write_row = functools.partial(append_html_row, rows)
+        else:
+            render_table_header(qs.columns(), out)
+            write_row = write_markdown_row
+
+        bind_link = _binds_page(qs.get_file_attributes())
+        seen = set() if qs.is_distinct() else None
+        if stats is None:
+            for _, v in self._candidates(qs):
+                self._render_table_source(
+                    qs, this_metadata, out, out_path, v, bind_link, trace, write_row, seen
+                )
+        else:
+            for _, v in self._candidates(qs):
+                stats.count(self._render_table_source(
+                    qs, this_metadata, out, out_path, v, bind_link, trace, write_row, seen
+                ))
+
+        if table_format == "html":
+            out.write(HTML_TABLE_FOOTER)
+        elif table_format == "json":
+            name = write_dataset(self.dataset_dir, rows)
+            render_dataset_table(qs.columns(), name, len(rows), os.path.dirname(out_path), out)
+
+    # pylint: disable=too-many-positional-arguments,too-many-arguments
+    def _render_list_source(self, qs, this_metadata, out, page_dir, v, trace=NO_TRACE, seen=None):
+        """renders list items for the record `v`, returns (matched rows, rendered rows).
+
+        `seen` is a set of keys of rendered items for DISTINCT queries."""
+        # file.link is always needed as a default list item
+        identifiers = self._row_identifiers(v, this_metadata, page_dir, True)
+
+        matched = rendered = 0
+        try:
+            # Check FROM clause first
+            # if not execute_from_clause(where_query, v):
+            #     continue
+
+            for row, shared in self._matching_rows(qs, identifiers, v['file']['path'], trace):
+                matched += 1
+                row_list = qs.render_columns(row, shared)
+                if len(row_list) == 0:
+                    row_list = [row['file']['link']]
+                if seen is None or is_new_row(seen, row_list):
+                    row_value = ', '.join(row_list)
+                    out.write(f"- {row_value}\n")
+                    rendered += 1
+
+        except Exception as exc:
+            raise RenderError() from exc
+
+        return matched, rendered
+
+    # pylint: disable=too-many-positional-arguments,too-many-arguments
+    def render_list(self, qs, this_metadata, out, out_path, stats=None, trace=NO_TRACE):
+        """renders markdown list, rows are counted in `stats` (report.QueryStats) if given"""
+        page_dir = os.path.dirname(out_path)
+        seen = set() if qs.is_distinct() else None
+        # LIST doesn't apply FROM clause yet
+        if stats is None:
+            for _, v in self._candidates(qs, use_from=False):
+                self._render_list_source(qs, this_metadata, out, page_dir, v, trace, seen)
+        else:
+            for _, v in self._candidates(qs, use_from=False):
+                stats.count(self._render_list_source(
+                    qs, this_metadata, out, page_dir, v, trace, seen
+                ))
+
+    # pylint: disable=too-many-positional-arguments,too-many-arguments
+    def render_query(self, query, this_metadata, out, out_path='', trace=NO_TRACE):
+        """replaces context variable in where clause and then renders markdown table
+
+        `trace` is the trace of the page, see tracing.Tracer.
+        """
+        trace = self.tracer.query(query, trace)
+        trace("render query on %s: %s", out_path, query)
+
+        result = self.precomputed.pop((out_path, query), None)
+        if result is not None:
+            trace("result is precomputed")
+            out.write(result)
+            return
+
+        stats = None
+        if self.report is not None:
+            stats = self.report.start_query(out_path, query)
+
+        try:
+            qs = QueryService(query)
+        except Exception as exc:
+            raise RenderError(f"Error parsing query: {query}") from exc
+
+        page_dir = os.path.dirname(out_path)
+        this_metadata = self._bind_this(this_metadata, page_dir)
+        qs.optimize(this_metadata, self._resolver(page_dir))
+        if stats is not None:
+            stats.parsed()
+        if trace.enabled:
+            trace("optimized where: %s", Lazy(qs.get_where_expression))
+
+        if qs.get_render_type() == "TABLE":
+            self.render_table(
+                qs,
+                this_metadata,
+                out,
+                out_path,
+                stats,
+                trace,
+            )
+        elif qs.get_render_type() == "LIST":
+            self.render_list(
+                qs,
+                this_metadata,
+                out,
+                out_path,
+                stats,
+                trace,
+            )
+
+        if stats is not None:
+            stats.finished()
+
+    # pylint: disable=too-many-positional-arguments,too-many-arguments
+    def render_str(self, line_stream, out, this_metadata, path, trace=NO_TRACE):
+        """renders from line_stream to out"""
+        markdown = line_stream.read()
+
+        first_line_end = markdown.find("\n") + 1 or len(markdown)
+        if markdown[:first_line_end].strip() == "---":
+            out.write(markdown[:first_line_end])
+            out.write("generated_ignore: true\n")
+            markdown = markdown[first_line_end:]
+
+        out.write(self.render_markdown(markdown, this_metadata, path, trace))
+
+    def render_markdown(self, markdown, this_metadata, path, trace=NO_TRACE) -> str:
+        """renders all dataview fences and inline queries of the markdown document
+
+        Documents without them are returned as is. Otherwise all fences and inline
+        queries are found in a single regex pass and their results are spliced in.
+        """
+        if not has_dataview_content(markdown):
+            return markdown
+
+        this_metadata = self._bind_this(this_metadata, os.path.dirname(path))
+        out = io.StringIO()
+        pos = 0
+        for match in DATAVIEW_RE.finditer(markdown):
+            query = match.group("query")
+            if query is None and not match.group("inline").startswith("= "):
+                continue
+
+            out.write(markdown[pos:match.start()])
+            if query is not None:
+                self.render_query(query, this_metadata, out, path, trace)
+            else:
+                self.render_inline(match.group(0), this_metadata, out, path)
+            pos = match.end()
+
+        out.write(markdown[pos:])
+        return out.getvalue()
+
+    def render_line(self, line, this_metadata, out) -> str:
+        """allows to render inplace datavew queries"""
+
+        for line_part in split_inline_query(line):
+            if line_part.startswith("`= "):
+                self.render_inline(line_part, this_metadata, out)
+                continue
+            out.write(line_part)
+
+    def render_inline(self, line_part, this_metadata, out, path='') -> None:
+        """renders inline query like `= this.metadata.title` (with ticks) of the page
+        at `path`"""
+        try:
+            identifiers = {}
+            identifiers['this'] = this_metadata
+            expression = line_part[3:-1]
+            resolve = self._resolver(os.path.dirname(path))
+            result = ExpressionSolverService(expression).solve(identifiers, resolve)
+            out.write(str(result))
+        except LarkError:
+            out.write(line_part)
+        except Exception as exc:
+            raise RenderError(f"Error in executing expression: {expression}") from exc
+
+
+def has_dataview_content(markdown: str) -> bool:
+    """fast check if the markdown may have dataview fences or inline queries"""
+    return "```dataview" in markdown or "`= " in markdown
+
+
+def match_sources(sources, v) -> bool:
+    """checks that the record `v` satisfies all sources of FROM clause (see QueryService)"""
+    for source in sources:
+        if source["type"] == "tag":
+            if source["value"] not in v['metadata'].get("tags", []):
+                return False
+        elif source["type"] == "path":
+            if not v['file']['path'].startswith(source["value"]):
+                return False
+
+    return True
+
+
+def _binds_page(file_attributes) -> bool:
+    """checks if referenced `file.*` attributes need a view per row: they depend on the
+    rendered page or are memoized for the row only (lazy attributes)"""
+    return bool(file_attributes & {"link", "*", *LINK_ATTRIBUTES, *FileAttributes.LAZY_ATTRIBUTES})
+
+
+def _file_attributes_for_page(v, page_dir, links=None):
+    """returns `file` attributes of the record `v` with `link` resolved for `page_dir`
+    (and links resolved by the links.LinkGraph `links`)"""
+    file_attributes = v['file']
+    if isinstance(file_attributes, FileAttributes):
+        return file_attributes.for_page(page_dir, links)
+
+    # records that were not built by `build_index`
+    file_title = v['metadata'].get('title', os.path.basename(file_attributes['path']))
+    file_link = os.path.relpath(file_attributes['path'], page_dir)
+    return {**file_attributes, 'link': f"[{file_title}]({file_link})"}
+
+
+def render_table_header(select_list, out):
+    """renders markdown table header"""
+    out.write("|")
+    out.write("|".join(select_list))
+    out.write("|\n")
+    out.write("|")
+    out.write("--|"*len(select_list))
+    out.write("\n")
+
+
+def is_new_row(seen: set, row_list) -> bool:
+    """checks if a row with the same rendered values wasn't rendered yet and records it,
+    `seen` keeps only keys of distinct rows"""
+    key = tuple(map(str, row_list))
+    if key in seen:
+        return False
+    seen.add(key)
+    return True
+
+
+def write_markdown_row(row_list, out):
+    """renders markdown table row"""
+    out.write("|")
+    out.write("|".join([str(i) for i in row_list]))
+    out.write("|\n")
+
+
+def render_html_table_header(select_list, out):
+    """renders header of HTML table, the table is a raw HTML block that Markdown
+    doesn't parse"""
+    out.write("<table>\n<thead>\n<tr>")
+    for column in select_list:
+        out.write(f"<th>{escape(column, quote=False)}</th>")
+    out.write("</tr>\n</thead>\n<tbody>\n")
+
+
+HTML_TABLE_FOOTER = "</tbody>\n</table>\n"
+
+
+def write_html_row(row_list, out):
+    """renders HTML table row, values are escaped (so `|` needs no care) and markdown
+    links (e.g. `file.link`) become anchors"""
+    out.write("<tr><td>" + "</td><td>".join([html_cell(i) for i in row_list]) + "</td></tr>\n")
+
+
+def append_html_row(rows, row_list, _out):
+    """collects HTML cells of a row of a dataset (see datasets.py)"""
+    rows.append([html_cell(i) for i in row_list])
+
+
+def html_cell(value) -> str:
+    """returns escaped content of a HTML table cell"""
+    text = str(value)
+    if text.startswith("["):
+        match = MARKDOWN_LINK_RE.fullmatch(text)
+        if match is not None:
+            return f'<a href="{escape(match[2])}">{escape(match[1], quote=False)}</a>'
+    return escape(text, quote=False)
+
+
+def split_inline_query(line):
+    """splits linke into text and ticks part"""
+    i = 0
+
+    while i <= len(line):
+        next_l = line.find("`", i)
+        if next_l == -1:
+            yield line[i:]
+            return
+
+        next_r = line.find("`", next_l + 1)
+        if next_r == -1:
+            yield line[i:]
+            return
+
+        yield line[i:next_l]
+        yield line[next_l:next_r+1]
+        i = next_r+1
@@ -0,0 +1,55 @@
+"""
+This module implements the lookup of notes by paths and urls, used to dereference
+link-valued fields (`series: library/series_a.md`) in queries like
+`TABLE metadata.series.metadata.title`.
+
+Keys of the index (`sources`) are found by a normalized form of the source path of
+a note (relative to the docs directory) or of its destination url, so every
+dereference is a dict lookup instead of a scan of the sources. The index is built
+from the list of files, before (or without) indexing them, so it works with lazily
+loaded sources too.
+
+Typical usage::
+    paths = PathIndex([(file_path, dest_uri, src_uri), ...])
+    key = paths.get("library/series_a.md")  # or "library/series_a/", "/library/series_a/"
+    record = sources.get(key)
+"""
+from posixpath import basename, dirname, normpath, splitext
+from urllib.parse import unquote
+
+# extensions of source files and pages that are not part of the lookup key
+PATH_EXTENSIONS = (".md", ".html")
+
+
+def normalize_path(path: str) -> str:
+    """Returns the lookup key of a path or url of a note, e.g. "library/series_a" for
+    "library/series_a.md", "./library/series_a/" and "/library/series_a/index.html"
+    """
+    path = unquote(path.strip().split("#", 1)[0]).replace("\\", "/")
+    # also drops leading slashes and `..` above the docs directory
+    path = normpath("/" + path.lstrip("/"))[1:]
+    stem, ext = splitext(path)
+    if ext in PATH_EXTENSIONS:
+        path = stem
+    if basename(path) == "index":
+        path = dirname(path)
+    return path
+
+
+class PathIndex:
+    """Keys of indexed notes by normalized source paths and destination urls"""
+    def __init__(self, entries=()):
+        self.keys = {}
+        for key, dest_uri, src_uri in entries:
+            self.add(key, dest_uri, src_uri)
+
+    def add(self, key: str, dest_uri: str, src_uri: str) -> None:
+        """Adds a note, the first note wins if paths of notes collide"""
+        for path in (src_uri, dest_uri):
+            self.keys.setdefault(normalize_path(path), key)
+
+    def get(self, path) -> str | None:
+        """Returns the key of the note at the path or url, None if there is no such note"""
+        if not isinstance(path, str) or not path:
+            return None
+        return self.keys.get(normalize_path(path))
@@ -0,0 +1,109 @@
+"""
+This module collects per-query timings and row counts for the build report.
+
+Collecting is optional: the renderer and the plugin only call into it when
+a BuildReport is configured.
+"""
+import json
+import time
+
+# returned by RendererWithContext file renderers for files that don't pass the FROM
+# clause, otherwise they return (matched rows, rendered rows) of the file
+SKIPPED_BY_FROM = None
+
+
+class QueryStats:  # pylint: disable=too-many-instance-attributes
+    """Timings and row counts of a single query execution.
+
+    `candidate_rows` counts files checked by the WHERE clause, `matched_rows` rows
+    that passed it (a file has a row per FLATTENed item) and `rendered_rows` rows
+    that were written (DISTINCT skips repeated ones).
+    """
+    __slots__ = (
+        "page", "query", "started", "parse_time", "wall_time",
+        "candidate_rows", "matched_rows", "rendered_rows",
+    )
+
+    def __init__(self, page: str, query: str):
+        self.page = page
+        self.query = query
+        self.started = time.perf_counter()
+        self.parse_time = 0.0
+        self.wall_time = 0.0
+        self.candidate_rows = 0
+        self.matched_rows = 0
+        self.rendered_rows = 0
+
+    def parsed(self) -> None:
+        """Marks the end of the query parsing"""
+        self.parse_time = time.perf_counter() - self.started
+
+    def finished(self) -> None:
+        """Marks the end of the query execution"""
+        self.wall_time = time.perf_counter() - self.started
+
+    def count(self, rows: tuple[int, int] | None) -> None:
+        """Counts rows of a file, `rows` is (matched, rendered) or SKIPPED_BY_FROM"""
+        if rows is SKIPPED_BY_FROM:
+            return
+        self.candidate_rows += 1
+        self.matched_rows += rows[0]
+        self.rendered_rows += rows[1]
+
+    def as_dict(self) -> dict:
+        """Returns stats as a JSON serializable dict"""
+        return {
+            "page": self.page,
+            "query": self.query,
+            "parse_time": self.parse_time,
+            "wall_time": self.wall_time,
+            "candidate_rows": self.candidate_rows,
+            "matched_rows": self.matched_rows,
+            "rendered_rows": self.rendered_rows,
+        }
+
+
+class BuildReport:
+    """Collects stats of the index build and of all executed queries"""
+    def __init__(self):
+        self.queries = []
+        self.index_files = 0
+        self.index_time = 0.0
+
+    def start_query(self, page: str, query: str) -> QueryStats:
+        """Starts collecting stats of a query, see QueryStats"""
+        stats = QueryStats(page, query)
+        self.queries.append(stats)
+        return stats
+
+    def top(self, n: int) -> list[QueryStats]:
+        """Returns n slowest queries"""
+        return sorted(self.queries, key=lambda stats: stats.wall_time, reverse=True)[:n]
+
+    def summary(self, n: int) -> str:
+        """Returns human readable summary with n slowest queries"""
+        total = sum(stats.wall_time for stats in self.queries)
+        lines = [
+            f"indexed {self.index_files} files in {self.index_time:.3f}s, "
+            f"executed {len(self.queries)} queries in {total:.3f}s",
+        ]
+        for stats in self.top(n):
+            query = " ".join(stats.query.split())
+            lines.append(
+                f"  {stats.wall_time:8.3f}s  parse {stats.parse_time:.3f}s  "
+                f"rows {stats.candidate_rows}/{stats.matched_rows}/{stats.rendered_rows}  "
+                f"{stats.page}: {query[:80]}"
+            )
+        return "\n".join(lines)
+
+    def as_dict(self) -> dict:
+        """Returns the report as a JSON serializable dict"""
+        return {
+            "index": {"files": self.index_files, "time": self.index_time},
+            "queries": [stats.as_dict() for stats in self.queries],
+        }
+
+    def write(self, path: str) -> None:
+        """Writes the report as JSON"""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.as_dict(), file, indent=2)
@@ -0,0 +1,474 @@
+"""
+This module allows to render 'dataview' fences based on collected data in metadata in .md files.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+import frontmatter
+
+from mkdocs.config import base, config_options
+from mkdocs.config.defaults import MkDocsConfig
+from mkdocs.exceptions import PluginError
+from mkdocs.plugins import BasePlugin, get_plugin_logger
+from mkdocs.structure.files import Files, File
+from mkdocs.structure.pages import Page
+
+from .daemon import DaemonClient, DaemonError
+from .markdown_db.cache import RenderCache
+from .markdown_db.content_index import ContentIndex
+from .markdown_db.datasets import publish_datasets, referenced_datasets
+from .markdown_db.links import LinkGraph
+from .markdown_db.md_renderer import TABLE_FORMATS, RendererWithContext, has_dataview_content
+from .markdown_db.index import IndexBuilder, SimpleMemoryIndex, build_index
+from .markdown_db.lazy import LazySources
+from .markdown_db.parallel import pre_execute
+from .markdown_db.path_index import PathIndex
+from .markdown_db.sharding import build_sharded_index
+from .markdown_db.sqlite_index import SQLiteIndex
+from .markdown_db.projection import apply_projection, collect_field_paths, extract_queries
+from .markdown_db.report import BuildReport
+from .query import functions
+from .tracing import Tracer
+
+log = get_plugin_logger(__name__)
+
+
+class DataViewPluginConfig(base.Config):
+    """Config file for the mkdocs plugin."""
+
+    # keep in the index only metadata fields that are referenced by queries of the site
+    prune_metadata = config_options.Type(bool, default=False)
+
+    # reuse rendered pages from previous builds if their sources and queried data didn't change
+    cache = config_options.Type(bool, default=False)
+    cache_dir = config_options.Type(str, default=".cache/plugin/dataview")
+
+    # collect per-query timings and row counts, show the slowest queries after the build
+    report = config_options.Type(bool, default=False)
+    report_top = config_options.Type(int, default=10)
+    # path relative to site_dir to write the full report as JSON to
+    report_file = config_options.Optional(config_options.Type(str))
+
+    # trace index building and query execution of pages matching glob patterns (relative
+    # to docs_dir) and of queries containing any of given substrings
+    trace_pages = config_options.ListOfItems(config_options.Type(str), default=[])
+    trace_queries = config_options.ListOfItems(config_options.Type(str), default=[])
+
+    # execute queries of all pages in that many processes before pages are rendered,
+    # 1 disables it and 0 uses all CPUs
+    workers = config_options.Type(int, default=1)
+    # run the workers as processes or as threads of the build, threads share the index
+    # without a snapshot file and scale on free-threaded python
+    executor = config_options.Choice(("process", "thread"), default="process")
+    # build the index in that many processes, 1 disables it and 0 uses all CPUs
+    index_workers = config_options.Type(int, default=1)
+
+    # store the index in SQLite database (path relative to mkdocs.yml or ":memory:")
+    # instead of python dicts, WHERE/FROM clauses preselect rows with SQL
+    index_db = config_options.Optional(config_options.Type(str))
+
+    # build a trigram index of page contents for `file.content CONTAINS "..."` queries
+    content_index = config_options.Type(bool, default=False)
+
+    # extract links between pages for `file.outlinks` and `file.inlinks`
+    link_graph = config_options.Type(bool, default=False)
+
+    # index files on first use (by a query or as `this` of a page) instead of in on_files,
+    # ignored if any of the options above that need the whole index up front is set
+    lazy_index = config_options.Type(bool, default=True)
+
+    # output of tables that don't set it in the query (`TABLE HTML ...`): markdown or
+    # html, HTML tables are not parsed by Markdown
+    table_format = config_options.Choice(TABLE_FORMATS, default="markdown")
+
+    # functions callable in queries, name -> "package.module:function" (see query/functions.py)
+    functions = config_options.DictOfItems(config_options.Type(str), default={})
+
+    # load files and execute queries with a running index daemon (see daemon.py)
+    daemon = config_options.Type(bool, default=False)
+    daemon_socket = config_options.Optional(config_options.Type(str))
+
+
+# pylint: disable=too-many-instance-attributes
+class DataViewPlugin(BasePlugin[DataViewPluginConfig], IndexBuilder):
+    """Data View plugin main class."""
+    def __init__(self):
+        self.index = SimpleMemoryIndex()
+        self.sources = self.index.sources
+        self.tags = self.index.tags
+        self.renderer = RendererWithContext(self.sources)
+        self.tracer = Tracer()
+        self._queries = set()
+        self._expressions = set()
+        self._cache = None
+        self._dirty = False
+        self._daemon = None
+        self._preloaded = {}
+        self._entries = []
+        self._docs_dir = ''
+        self.content_index = None
+        self.link_graph = None
+        # store of datasets of `TABLE JSON` queries and names of the ones pages refer to
+        self._dataset_dir = None
+        self._datasets = set()
+
+    def add_tag(self, tag: str, metadata: dict) -> None:
+        self.index.add_tag(tag, metadata)
+
+    def add_file(self, file_path: str, metadata: dict) -> None:
+        self.index.add_file(file_path, metadata)
+        if self.link_graph is not None:
+            self.link_graph.add_page(file_path, metadata['file']['path'])
+
+    def add_content(self, file_path: str, content: str) -> None:
+        self.index.add_content(file_path, content)
+        if self.link_graph is not None:
+            self.link_graph.add_content(file_path, content)
+        if self.content_index is not None:
+            self.content_index.add(file_path, content)
+
+    def merge(self, partial) -> None:
+        self.index.merge(partial)
+        if self.content_index is not None and partial.content_index is not None:
+            self.content_index.merge(partial.content_index)
+        if self.link_graph is not None and partial.link_graph is not None:
+            self.link_graph.merge(partial.link_graph)
+
+    def _use_index(self, index) -> None:
+        """replaces the index the plugin builds and renders from"""
+        self.index = index
+        self.sources = index.sources if isinstance(index, SimpleMemoryIndex) else index
+        self.tags = index.tags
+        self.renderer.sources = self.sources
+
+    def on_startup(self, *, command: str, dirty: bool) -> None:
+        self._dirty = dirty
+
+    def on_config(self, config: MkDocsConfig) -> MkDocsConfig | None:
+        self._cache = None
+        if self.config.cache:
+            cache_dir = os.path.join(
+                os.path.dirname(config.config_file_path or ""), self.config.cache_dir
+            )
+            self._cache = RenderCache(cache_dir)
+
+        # datasets are kept with the cache, so cached pages can still refer to them
+        if self._cache is not None:
+            self._dataset_dir = os.path.join(self._cache.cache_dir, "datasets")
+        else:
+            self._dataset_dir = tempfile.mkdtemp(prefix="dataview-datasets-")
+        self._datasets = set()
+        self.renderer.dataset_dir = self._dataset_dir
+
+        if self.config.index_db:
+            path = self.config.index_db
+            if path != ":memory:":
+                path = os.path.join(os.path.dirname(config.config_file_path or ""), path)
+            self._use_index(SQLiteIndex(path))
+
+        self.content_index = ContentIndex() if self.config.content_index else None
+        self.renderer.content_index = self.content_index
+        # the graph is kept between builds of `mkdocs serve`, links of changed pages
+        # are replaced as they are indexed again
+        if not self.config.link_graph:
+            self.link_graph = None
+        elif self.link_graph is None:
+            self.link_graph = LinkGraph()
+        self.renderer.link_graph = self.link_graph
+        self.renderer.table_format = self.config.table_format
+
+        self._daemon = None
+        if self.config.daemon:
+            self._daemon = DaemonClient.connect(self.config.daemon_socket)
+            if self._daemon is None:
+                log.info("dataview daemon is not running, indexing in-process")
+
+        self._register_functions()
+
+        self.renderer.report = BuildReport() if self.config.report else None
+        self.tracer = Tracer(self.config.trace_pages, self.config.trace_queries)
+        self.renderer.tracer = self.tracer
+        return config
+
+    def _register_functions(self) -> None:
+        """registers functions from the config and entry points, forgets memoized calls"""
+        for name, spec in self.config.functions.items():
+            try:
+                functions.register_function(name, functions.import_function(spec))
+            except (ImportError, AttributeError, ValueError) as exc:
+                raise PluginError(f"can't import dataview function {name!r}: {exc}") from exc
+        functions.load_entry_points()
+        functions.clear_caches()
+
+    def on_files(self, files: Files, /, *, config: MkDocsConfig) -> Files | None:
+        genderated_files_list = []
+        for f in files:
+            path_without_extension, extension = os.path.splitext(f.src_uri)
+            if extension in ['.mdtmpl']:
+                genderated_files_list.append(path_without_extension)
+
+        for f in genderated_files_list:
+            rf = files.src_uris.get(f + '.md')
+            if rf:
+                files.remove(rf)
+            tplf = files.src_uris[f + '.mdtmpl']
+
+            # maybe this logic should be more complicated (check for .md modificaiton with
+            # existing .mdtmpl)
+            # copy .mdtmpl to .md only if it's need. Otherwise mkdocs will enter in infinite loop
+            # in serve mode
+            abs_target_path = tplf.abs_src_path[:-4]
+            if os.path.exists(abs_target_path):
+                if os.path.getmtime(abs_target_path) < os.path.getmtime(tplf.abs_src_path):
+                    shutil.copyfile(tplf.abs_src_path, tplf.abs_src_path[:-4])
+
+            files.append(File(
+                    tplf.src_path[:-4],
+                    config['docs_dir'],
+                    config['site_dir'],
+                    config['use_directory_urls'],
+                ))
+
+        index_started = time.perf_counter()
+        pages = self._index_files(files, config)
+        if self.link_graph is not None:
+            # forget deleted pages
+            self.link_graph.retain(file_path for file_path, _, _ in self._entries)
+
+        report = self.renderer.report
+        if report is not None and not isinstance(self.sources, LazySources):
+            report.index_files = len(self.sources)
+            report.index_time = time.perf_counter() - index_started
+
+        if self.config.prune_metadata and isinstance(self.index, SQLiteIndex):
+            log.warning("prune_metadata is not supported with index_db, ignoring it")
+        elif self.config.prune_metadata:
+            apply_projection(self.sources, collect_field_paths(self._queries, self._expressions))
+            self._queries.clear()
+            self._expressions.clear()
+
+        if self._cache is not None:
+            self._cache.start_build()
+        self.renderer.precomputed.clear()
+        if pages:
+            self._pre_execute(pages)
+
+        return files
+
+    def _index_files(self, files: Files, config: MkDocsConfig) -> list:
+        """builds the index of all .md files, returns pages to pre-execute (see _pre_execute)"""
+        md_files = [f for f in files if os.path.splitext(f.src_uri)[1] in ['.md']]
+        self._docs_dir = config.docs_dir
+        self._entries = [(os.path.join(config.docs_dir, f.src_uri), f.dest_uri, f.src_uri)
+                         for f in md_files]
+        self.renderer.path_index = PathIndex(self._entries)
+        if self._daemon is not None:
+            self._preloaded = self._daemon_request(
+                self._daemon.load, config.docs_dir, [file_path for file_path, _, _ in self._entries]
+            ) or {}
+        elif self._can_index_lazily():
+            index = SimpleMemoryIndex()
+            self._use_index(index)
+            self.sources = self.renderer.sources = LazySources(self._entries, self._on_file, index)
+            return []
+
+        collect_pages = self.config.workers != 1 or self._daemon is not None
+        pages = []
+        reused = self._reuse_indexed_files()
+        if reused:
+            for f, (file_path, _, _) in zip(md_files, self._entries):
+                if collect_pages and reused.get(file_path):
+                    pages.append((f.url, file_path, self.tracer.page(f.src_uri), reused[file_path]))
+            md_files = [f for f, entry in zip(md_files, self._entries) if entry[0] not in reused]
+
+        if self._daemon is None and self.config.index_workers != 1:
+            return pages + self._index_files_sharded(md_files)
+
+        for f in md_files:
+            file_path = os.path.join(config.docs_dir, f.src_uri)
+            data = self._on_file(file_path, f.dest_uri, f.src_uri)
+            if collect_pages and has_dataview_content(data.content):
+                queries, _ = extract_queries(data.content)
+                if queries:
+                    pages.append((f.url, file_path, self.tracer.page(f.src_uri), queries))
+        self._preloaded = {}
+        return pages
+
+    def _reuse_indexed_files(self) -> dict:
+        """returns {file_path: queries} of files that `index_db` has from the previous
+        build and that didn't change, they are not indexed again"""
+        if not isinstance(self.index, SQLiteIndex):
+            return {}
+        # contents of files are indexed only as they are read
+        reuse = self.content_index is None and self.link_graph is None
+        return self.index.start_build(self._entries, reuse)
+
+    def _can_index_lazily(self) -> bool:
+        """checks that nothing needs the whole index before pages are rendered"""
+        return self.config.lazy_index and not (
+            self.config.prune_metadata
+            or self.config.workers != 1
+            or self.config.index_workers != 1
+            or self.config.index_db
+            or self.config.content_index
+            or self.config.link_graph
+        )
+
+    def _index_files_sharded(self, md_files: list[File]) -> list:
+        """same as _index_files, but files are indexed in several processes"""
+        entries = [(os.path.join(self._docs_dir, f.src_uri), f.dest_uri, f.src_uri)
+                   for f in md_files]
+        page_queries = build_sharded_index(
+            self, entries, self.config.index_workers, self.tracer,
+            self.content_index is not None, self.link_graph is not None,
+        )
+
+        pages = []
+        for f, (file_path, _, _) in zip(md_files, entries):
+            if file_path not in page_queries:
+                continue
+            queries, expressions = page_queries[file_path]
+            if isinstance(self.index, SQLiteIndex):
+                # partial indexes don't pass contents, see SQLiteIndex.start_build
+                self.index.set_queries(file_path, queries)
+            if self.config.prune_metadata:
+                self._queries.update(queries)
+                self._expressions.update(expressions)
+            if self.config.workers != 1 and queries:
+                pages.append((f.url, file_path, self.tracer.page(f.src_uri), queries))
+        return pages
+
+    def _daemon_request(self, func, *args):
+        """calls the daemon client, switches to in-process mode if it fails"""
+        try:
+            return func(*args)
+        except (OSError, DaemonError) as exc:
+            log.warning("dataview daemon failed, switching to in-process mode: %s", exc)
+            self._daemon = None
+            return None
+
+    def _pre_execute(self, pages):
+        """executes queries of `pages` in parallel, see parallel.pre_execute"""
+        started = time.perf_counter()
+        if self._daemon is not None:
+            results = self._daemon_request(
+                self._daemon.execute, self._docs_dir, self._entries,
+                [(out_path, file_path, queries) for out_path, file_path, _, queries in pages],
+                self.config.table_format, {
+                    "link_graph": self.config.link_graph,
+                    "content_index": self.config.content_index,
+                    "prune_metadata": self.config.prune_metadata,
+                    "functions": dict(self.config.functions),
+                },
+            )
+            if results is not None:
+                self.renderer.precomputed.update(results)
+                log.debug("executed %d queries of %d pages by the daemon in %.2fs",
+                          len(results), len(pages), time.perf_counter() - started)
+                return
+
+        if self.config.workers == 1:
+            return
+
+        report = self.renderer.report
+        results, stats = pre_execute(
+            self.sources, pages, self.config.workers, report is not None, self.tracer,
+            self.link_graph, self.config.table_format, self._dataset_dir,
+            self.config.executor == "thread", self.renderer.path_index,
+            dict(self.config.functions),
+        )
+        self.renderer.precomputed.update(results)
+        if report is not None:
+            report.queries.extend(stats)
+        log.debug("pre-executed %d queries of %d pages in %.2fs",
+                  len(results), len(pages), time.perf_counter() - started)
+
+    def on_page_markdown(
+        self, markdown: str, /, *, page: Page, config: MkDocsConfig, files: Files
+    ) -> str | None:
+        """
+        Find all dataview fences and replace them with the rendered markdown table
+        """
+
+        if not has_dataview_content(markdown):
+            return markdown
+
+        trace = self.tracer.page(page.file.src_uri)
+        this_metadata = self.sources[os.path.join(config.docs_dir, page.file.src_uri)]
+
+        if self._cache is not None:
+            extra = self.config.table_format
+            if self.link_graph is not None and ("inlinks" in markdown or "outlinks" in markdown):
+                extra += self.link_graph.fingerprint()
+            cache_key = self._cache.key(
+                markdown, this_metadata, page.url, self.sources, extra, self.renderer.resolve_link
+            )
+            result = self._cache.get(cache_key) if cache_key is not None else None
+            if result is not None:
+                trace("rendered page is taken from the cache")
+                self._datasets.update(referenced_datasets(result))
+                return result
+
+        result = self.renderer.render_markdown(markdown, this_metadata, page.url, trace)
+        self._datasets.update(referenced_datasets(result))
+
+        if self._cache is not None and cache_key is not None:
+            self._cache.set(cache_key, result)
+        return result
+
+    def on_post_build(self, *, config: MkDocsConfig) -> None:
+        if isinstance(self.index, SQLiteIndex):
+            self.index.commit()
+
+        if self._datasets:
+            for name in publish_datasets(self._dataset_dir, self._datasets, config.site_dir):
+                log.warning("dataset %s is missing, clear the cache to render it again", name)
+            if self._cache is not None:
+                self._cache.used_keys.update(self._datasets)
+        if self._cache is None:
+            shutil.rmtree(self._dataset_dir, ignore_errors=True)
+
+        # in dirty mode not all pages are rendered, so unused entries may be still valid
+        if self._cache is not None and not self._dirty:
+            self._cache.prune()
+
+        report = self.renderer.report
+        if report is not None:
+            if isinstance(self.sources, LazySources):
+                report.index_files = self.sources.loaded
+                report.index_time = self.sources.load_time
+            log.info("build report\n%s", report.summary(self.config.report_top))
+            if self.config.report_file:
+                report.write(os.path.join(config.site_dir, self.config.report_file))
+            self.renderer.report = BuildReport()
+
+    def load_file(self, path: str):
+        """
+        Loads a file and processes it with the appropriate processor.
+        """
+        if path in self._preloaded:
+            return self._preloaded[path]
+
+        with open(path, 'r', encoding="utf-8-sig") as file:
+            return frontmatter.load(file)
+
+    def _on_file(self, file_path: str, target_url: str, src_uri: str | None = None):
+        """common method to scan file to build index, returns the loaded file"""
+
+        trace = self.tracer.page(src_uri if src_uri is not None else file_path)
+        trace("load file %s", file_path)
+
+        data = self.load_file(file_path)
+        trace("metadata: %s", data.metadata)
+
+        build_index(data, file_path, target_url, self, src_uri)
+
+        if self.config.prune_metadata:
+            queries, expressions = extract_queries(data.content)
+            self._queries.update(queries)
+            self._expressions.update(expressions)
+
+        return data
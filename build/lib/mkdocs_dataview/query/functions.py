@@ -0,0 +1,219 @@
+"""
+Registry of functions that can be called in queries.
+
+Builtin functions are registered here. Projects add their own with the plugin's
+`functions` option or with an entry point of the `mkdocs_dataview.functions` group::
+
+    # pyproject.toml of a project
+    [project.entry-points."mkdocs_dataview.functions"]
+    slug = "my_package.dataview:slug"
+
+Functions get evaluated arguments and return a value. Functions marked as pure
+(see `dataview_function`) are memoized in bounded LRU caches if their arguments
+are hashable, and calls of them with constant arguments are folded by the optimizer.
+Cached results are shared between calls, so they must not be modified. Caches are
+cleared at the start of every build (see `clear_caches`).
+"""
+import functools
+import importlib
+from importlib.metadata import entry_points
+import logging
+
+from .values import parse_date
+
+log = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "mkdocs_dataview.functions"
+DEFAULT_CACHE_SIZE = 4096
+
+
+class DataviewFunction:
+    """A function callable in queries, calls of pure functions are memoized"""
+    __slots__ = ("name", "func", "pure", "_cached")
+
+    def __init__(self, name: str, func, pure: bool = False, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.name = name
+        self.func = func
+        self.pure = pure
+        self._cached = None
+        if pure and cache_size:
+            self._cached = functools.lru_cache(maxsize=cache_size, typed=True)(func)
+
+    def __call__(self, *args):
+        if self._cached is None:
+            return self.func(*args)
+        try:
+            hash(args)
+        except TypeError:
+            return self.func(*args)
+        return self._cached(*args)
+
+    def cache_clear(self) -> None:
+        """Forgets memoized results"""
+        if self._cached is not None:
+            self._cached.cache_clear()
+
+    def cache_info(self):
+        """Returns functools cache statistics, or None if calls are not memoized"""
+        if self._cached is None:
+            return None
+        return self._cached.cache_info()
+
+
+# name -> DataviewFunction
+FUNCTIONS = {}
+_entry_points_loaded = False  # pylint: disable=invalid-name
+
+
+def dataview_function(pure: bool = False, cache_size: int = DEFAULT_CACHE_SIZE):
+    """Decorator that declares purity of a function for `register_function`
+
+    Typical usage::
+        @dataview_function(pure=True)
+        def slug(value):
+            return ...
+    """
+    def decorate(func):
+        func.dataview_pure = pure
+        func.dataview_cache_size = cache_size
+        return func
+    return decorate
+
+
+def register_function(name: str, func, pure: bool | None = None,
+                      cache_size: int | None = None) -> DataviewFunction:
+    """Registers a function (or replaces a registered one) under `name`
+
+    `pure` and `cache_size` default to the values given to `dataview_function`.
+    """
+    if pure is None:
+        pure = getattr(func, "dataview_pure", False)
+    if cache_size is None:
+        cache_size = getattr(func, "dataview_cache_size", DEFAULT_CACHE_SIZE)
+    function = FUNCTIONS[name] = DataviewFunction(name, func, pure, cache_size)
+    return function
+
+
+def import_function(spec: str):
+    """Imports a function by "package.module:function" spec"""
+    module_name, _, attribute = spec.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"expected 'module:function', got {spec!r}")
+    return functools.reduce(getattr, attribute.split("."), importlib.import_module(module_name))
+
+
+def load_entry_points() -> None:
+    """Registers functions of installed entry points, they don't replace functions
+    that are already registered (builtins and functions from the plugin config)"""
+    global _entry_points_loaded  # pylint: disable=global-statement,invalid-name
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name in FUNCTIONS:
+            continue
+        try:
+            register_function(entry_point.name, entry_point.load())
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            log.warning("can't load dataview function %s: %s", entry_point.name, exc)
+
+
+def register_functions(specs) -> None:
+    """Registers functions of a name -> "package.module:function" mapping (the plugin's
+    `functions` option) and of installed entry points, forgets memoized calls"""
+    for name, spec in specs.items():
+        register_function(name, import_function(spec))
+    load_entry_points()
+    clear_caches()
+
+
+def get_function(name: str) -> DataviewFunction | None:
+    """Returns a registered function, or None if there is no such function"""
+    function = FUNCTIONS.get(name)
+    if function is None and not _entry_points_loaded:
+        load_entry_points()
+        function = FUNCTIONS.get(name)
+    return function
+
+
+def is_pure(name: str) -> bool:
+    """Checks that calls of the function can be memoized and folded"""
+    function = get_function(name)
+    return function is not None and function.pure
+
+
+def clear_caches() -> None:
+    """Forgets memoized results of all functions"""
+    for function in FUNCTIONS.values():
+        function.cache_clear()
+
+
+# Builtin functions. Most of them are cheaper to compute than to look up in a cache.
+
+@dataview_function(pure=True, cache_size=0)
+def dataview_sum(*args):
+    """Sum function for dataview queries"""
+    return sum(args)
+
+
+@dataview_function(pure=True, cache_size=0)
+def dataview_econtains(data, value):
+    """econtain function for dataview queries"""
+    return value in data
+
+
+@dataview_function(pure=True, cache_size=0)
+def dataview_length(value):
+    """length function"""
+    if value is None:
+        return 0
+    return len(value)
+
+
+@dataview_function(pure=True)
+def dataview_date(value):
+    """date function, parses ISO 8601 strings (values that are not dates are returned
+    as strings)"""
+    date = parse_date(value)
+    if date is None:
+        return str(value)
+    return date
+
+
+@dataview_function(pure=True, cache_size=0)
+def dataview_link(path, display=None):
+    """link function"""
+    if display:
+        return f"[{display}]({path})"
+    return f"[{path}]({path})"
+
+
+@dataview_function(pure=True, cache_size=0)
+def dataview_choice(condition, if_true, if_false):
+    """choice function"""
+    if condition:
+        return if_true
+    return if_false
+
+
+@dataview_function(pure=True, cache_size=0)
+def dataview_default(value, default_val):
+    """default function"""
+    if value is None or value == "null":
+        return default_val
+    return value
+
+
+BUILTIN_FUNCTIONS = {
+    "sum": dataview_sum,
+    "econtains": dataview_econtains,
+    "length": dataview_length,
+    "date": dataview_date,
+    "link": dataview_link,
+    "choice": dataview_choice,
+    "default": dataview_default,
+}
+
+for _name, _func in BUILTIN_FUNCTIONS.items():
+    register_function(_name, _func)
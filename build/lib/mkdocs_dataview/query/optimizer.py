@@ -0,0 +1,230 @@
+"""
+Optimizer passes that run on parsed query trees before they are executed.
+
+- constant folding (including `this.*` subtrees, which are constant for a page)
+- dropping trivially true WHERE clauses
+- reordering AND/OR operands by estimated evaluation cost
+- sharing common subexpressions between SELECT and WHERE clauses
+
+Optimized trees may contain two extra node types that are understood by
+ExpressionSolver/ExpressionEvaluator:
+
+- `constant` with a single already computed python value as a child
+- `shared` with a slot number and a subtree, its value is computed once per row
+"""
+from lark import Token, Transformer, Tree
+
+from .functions import is_pure
+
+
+# nodes that give structure to a query but are not values by themselves
+STRUCTURAL_NODES = frozenset([
+    "select_clause",
+    "where_clause",
+    "select_expression",
+    "aliased_select_expression",
+])
+
+# nodes that can't be shared between clauses since they are cheaper to compute again
+TRIVIAL_NODES = frozenset(["constant", "literal", "identifier"])
+
+# nodes that always evaluate to bool
+BOOLEAN_NODES = frozenset([
+    "and_op", "or_op", "not_op",
+    "eq_op", "neq_op", "lt_op", "gt_op", "lte_op", "gte_op", "in_op", "contains_op",
+])
+
+COST_FUNCTION_CALL = 5
+COST_MEMBERSHIP = 3
+
+
+def is_constant(tree) -> bool:
+    """Checks if the tree is a folded constant"""
+    return isinstance(tree, Tree) and tree.data == "constant"
+
+
+def constant_value(tree):
+    """Returns the value of a folded constant"""
+    return tree.children[0]
+
+
+def _identifier_name(tree) -> str:
+    name = tree.children[0].value
+    if name.startswith('`'):
+        name = name[1:-1]
+    return name
+
+
+# pylint: disable=missing-function-docstring
+class ConstantFolder(Transformer):
+    """
+    Replaces subtrees that don't depend on the current row with `constant` nodes.
+
+    `solver` is an ExpressionSolver with identifiers that are constant for all rows.
+    If `fold_this` is set, `this.*` identifiers are treated as constants too. Calls
+    of functions that are not pure (see functions.py) are never folded.
+    Subtrees that fail to evaluate are left as is, so the error is reported when
+    the query is executed.
+    """
+    def __init__(self, solver, fold_this=False):
+        super().__init__()
+        self.solver = solver
+        self.fold_this = fold_this
+
+    def _solve(self, tree):
+        try:
+            value = self.solver.transform(tree)
+        except Exception:  # pylint: disable=broad-exception-caught
+            return tree
+        return Tree("constant", [value])
+
+    def constant(self, children):
+        return Tree("constant", children)
+
+    def identifier(self, children):
+        tree = Tree("identifier", children)
+        name = _identifier_name(tree)
+        if self.fold_this and (name == "this" or name.startswith("this.")):
+            return self._solve(tree)
+        return tree
+
+    def __default__(self, data, children, meta):
+        tree = Tree(data, children, meta)
+        if data in STRUCTURAL_NODES:
+            return tree
+        if data == "function_call" and not is_pure(str(children[0])):
+            return tree
+
+        if all(is_constant(c) for c in children if isinstance(c, Tree)):
+            return self._solve(tree)
+
+        return tree
+
+
+def estimate_cost(tree) -> int:
+    """Rough estimation of the cost of evaluating the tree for a single row"""
+    if not isinstance(tree, Tree) or tree.data in ("constant", "literal"):
+        return 0
+    if tree.data == "identifier":
+        return 1
+
+    cost = sum(estimate_cost(c) for c in tree.children)
+    if tree.data == "function_call":
+        return cost + COST_FUNCTION_CALL
+    if tree.data in ("in_op", "contains_op"):
+        return cost + COST_MEMBERSHIP
+    return cost + 1
+
+
+def _flatten(tree, op):
+    if isinstance(tree, Tree) and tree.data == op:
+        return _flatten(tree.children[0], op) + _flatten(tree.children[1], op)
+    return [tree]
+
+
+# pylint: disable=missing-function-docstring
+class BooleanReorderer(Transformer):
+    """
+    Reorders operands of AND/OR chains, so the cheapest ones are evaluated first.
+
+    It only makes sense with short-circuit evaluation (see ExpressionEvaluator).
+    A constant operand that decides the result of the whole chain (false for AND,
+    true for OR) replaces the chain, other constant operands are dropped.
+    """
+    def _reorder(self, op, children):
+        neutral = op == "and_op"
+        operands = []
+        for operand in _flatten(children[0], op) + _flatten(children[1], op):
+            if not is_constant(operand):
+                operands.append(operand)
+            elif bool(constant_value(operand)) != neutral:
+                return Tree("constant", [not neutral])
+
+        if not operands:
+            return Tree("constant", [neutral])
+        if len(operands) == 1:
+            if operands[0].data in BOOLEAN_NODES:
+                return operands[0]
+            # keep the operator, so the result is still converted to bool
+            operands.append(Tree("constant", [neutral]))
+
+        operands.sort(key=estimate_cost)
+
+        tree = operands[0]
+        for operand in operands[1:]:
+            tree = Tree(op, [tree, operand])
+        return tree
+
+    def and_op(self, children):
+        return self._reorder("and_op", children)
+
+    def or_op(self, children):
+        return self._reorder("or_op", children)
+
+
+def tree_key(tree):
+    """Returns hashable structural key of the tree"""
+    if isinstance(tree, Tree):
+        return (tree.data, tuple(tree_key(c) for c in tree.children))
+    if isinstance(tree, Token):
+        return (tree.type, tree.value)
+    return (type(tree).__name__, repr(tree))
+
+
+def _collect_candidates(tree, keys):
+    if not isinstance(tree, Tree):
+        return
+    if tree.data not in TRIVIAL_NODES and tree.data not in STRUCTURAL_NODES:
+        keys.setdefault(tree_key(tree), len(keys))
+    for child in tree.children:
+        _collect_candidates(child, keys)
+
+
+def _wrap_shared(tree, slots, matched):
+    """Wraps subtrees with keys from `slots` into `shared` nodes (top-down, largest first)"""
+    if not isinstance(tree, Tree) or tree.data in TRIVIAL_NODES:
+        return tree
+
+    if tree.data not in STRUCTURAL_NODES:
+        key = tree_key(tree)
+        if key in slots:
+            matched.add(key)
+            return Tree("shared", [slots[key], tree])
+
+    return Tree(tree.data, [_wrap_shared(c, slots, matched) for c in tree.children], tree.meta)
+
+
+def share_common_subexpressions(where_tree, select_tree):
+    """Marks subexpressions of SELECT that are also computed in WHERE as `shared`"""
+    if where_tree is None:
+        return where_tree, select_tree
+
+    slots = {}
+    _collect_candidates(where_tree, slots)
+
+    matched = set()
+    select_tree = _wrap_shared(select_tree, slots, matched)
+
+    slots = {key: slot for key, slot in slots.items() if key in matched}
+    where_tree = _wrap_shared(where_tree, slots, set())
+    return where_tree, select_tree
+
+
+def optimize_query(where_tree, select_tree, solver, fold_this=True):
+    """Runs all optimizer passes over `where_clause` and `select_clause` trees.
+
+    `solver` is an ExpressionSolver used for constant folding, see ConstantFolder.
+
+    Returns optimized (where_tree, select_tree). `where_tree` is None if there is no
+    WHERE clause or it is always true.
+    """
+    folder = ConstantFolder(solver, fold_this)
+    select_tree = folder.transform(select_tree)
+
+    if where_tree is not None:
+        where_tree = BooleanReorderer().transform(folder.transform(where_tree))
+        condition = where_tree.children[0]
+        if is_constant(condition) and constant_value(condition):
+            where_tree = None
+
+    return share_common_subexpressions(where_tree, select_tree)
@@ -0,0 +1,687 @@
+"""
+Contains solvers that used for where and expression lists
+"""
+
+import logging
+import operator
+import threading
+
+from lark import Transformer, Lark
+from lark.visitors import Interpreter, Visitor
+from .grammar import LARK_GRAMMAR
+from .accessors import compile_path, parse_path
+from .functions import get_function
+from .optimizer import optimize_query
+from .values import compare
+
+log = logging.getLogger(__name__)
+
+# building a parser takes much longer than parsing a query, so parsers are built once
+# per start rule and thread (a parser is not shared between threads)
+_PARSERS = threading.local()
+
+
+def get_parser(start: str) -> Lark:
+    """Returns the parser of the dataview grammar for the `start` rule"""
+    parsers = getattr(_PARSERS, "parsers", None)
+    if parsers is None:
+        parsers = _PARSERS.parsers = {}
+    parser = parsers.get(start)
+    if parser is None:
+        parser = parsers[start] = Lark(LARK_GRAMMAR, start=start)
+    return parser
+
+
+class QueryError(Exception):
+    """Base class for errors in dataview queries."""
+
+
+class FuncitonCallError(QueryError, NameError):
+    """Error raised when a function is unknown."""
+
+
+class TransformationError(QueryError):
+    """Error raised during lark tree transformation."""
+
+
+class QueryService():  # pylint: disable=too-many-instance-attributes
+    """Service for parsing and executing dataview queries.
+
+    Typical usage::
+        query = QueryService("TABLE file.link FROM #tag WHERE metadata.a + metadata.b > 10")
+
+        # You must implement your own filter of files based on FROM clause
+        # Simple example:
+
+        sources = query.get_sources()
+        if sources[0]["type"] == "tag" and sources[0]["value"] in my_file_tags:
+            # include this file for further processing
+        ...
+        # retrieve file attributes
+        file_attributes = {
+            "file": {
+                "link": ...
+            },
+            "metadata": {
+                "a": 1,
+                "b": 2,
+            }
+        }
+        if query.where(file_attributes):
+            # include this file for further processing
+
+    """
+    def __init__(self, query):
+        self.query = query
+        self.lark = get_parser('full_clause')
+        self.tree = self.lark.parse(query)
+        parsed_data = FullClauseInterpreter().visit(self.tree)
+        self.data = {}
+        # [(expression tree, path of the bound name), ...], see `flatten`
+        self.flatten_clauses = []
+
+        for v in parsed_data:
+            if v is None:
+                # @TODO: it must be optional "from_clause" or where_clause??
+                continue
+            if v["type"] == "flatten_clause":
+                self.flatten_clauses.append(v["value"])
+                continue
+            self.data[v["type"]] = None
+            if "value" in v:
+                self.data[v["type"]] = v["value"]
+
+        # trees that are executed, see `optimize`
+        self.where_tree = self.data.get("where_clause")
+        self.select_tree = self.data["select_clause"]
+        self.optimized = False
+        # returns the record of a linked note, see accessors.py
+        self.resolve = None
+
+    def optimize(self, this_metadata=None, resolve=None):
+        """Optimizes the query for execution on a page described by `this_metadata`.
+
+        Folds constants (`this.*` identifiers too), drops trivially true WHERE clause,
+        reorders AND/OR operands by cost and shares common subexpressions between
+        SELECT and WHERE. After that `where` and `render_columns` evaluate expressions
+        with short-circuit AND/OR. `resolve` dereferences links to other notes, e.g.
+        `metadata.series.metadata.title` (see accessors.py).
+        """
+        self.resolve = resolve
+        self.where_tree, self.select_tree = optimize_query(
+            self.data.get("where_clause"),
+            self.data["select_clause"],
+            ExpressionSolver({"this": this_metadata}, resolve),
+        )
+        self.optimized = True
+
+    def get_render_type(self):
+        """Returns the view type of the query (e.g., TABLE, LIST)."""
+        return self.data["view_type"]
+
+    def get_view_format(self):
+        """Returns the output format of the query (HTML, JSON or MARKDOWN), None if it's
+        not set."""
+        return self.data.get("view_format")
+
+    def is_distinct(self):
+        """Returns True if rows with the same rendered values are rendered once (DISTINCT)."""
+        return "distinct" in self.data
+
+    def flatten(self, identifiers):
+        """Returns identifiers of the rows of a file after FLATTEN clauses.
+
+        Every clause evaluates its expression for each row and yields a row per item of
+        a list (none for an empty list) or a single row for other values. The item is
+        bound to the name after AS, or replaces the flattened identifier. Rows are
+        generated lazily, one by one.
+        """
+        rows = (identifiers,)
+        for expression, steps in self.flatten_clauses:
+            rows = _flatten_rows(rows, expression, steps, self.resolve)
+        return rows
+
+    def get_sources(self):
+        """Returns the sources defined in the FROM clause.
+
+        Supportes types now:
+         - tag
+         - path
+
+        Expect the following format:
+        [
+            {
+                "type": "tag",
+                "value": "tag"
+            },
+            ...
+        ]
+        """
+        if self.data.get("from_clause"):
+            return SourcesInterpreter().visit(self.data["from_clause"])
+
+        return []
+
+    def columns(self):
+        """Returns the names of the columns to be selected.
+
+        Expect the following format:
+        [
+            "file.link",
+            "metadata.a + metadata.b",
+            ...
+        ]
+        """
+        return SelectClauseColumnNamesTransformer().visit(self.data["select_clause"])
+
+    def render_columns(self, identifiers, shared=None):
+        """Renders the column values for a given set of identifiers.
+
+        `shared` is a dict with values of subexpressions common with the WHERE clause,
+        pass the same dict to `where` and `render_columns` for the same row.
+
+        Expect the following format:
+        [
+            <rendered value1>,
+            <rendered value2>,
+            ...
+        ]
+        """
+        if self.optimized:
+            return ExpressionEvaluator(identifiers, shared, self.resolve).visit(self.select_tree)
+
+        return ExpressionSolver(identifiers, self.resolve).transform(self.select_tree)
+
+    def get_identifiers(self):
+        """Returns the set of identifiers referenced in SELECT and WHERE clauses.
+
+        Backticks are stripped, e.g. {"file.link", "metadata.a", "this.metadata.b"}.
+        """
+        collector = IdentifiersCollector()
+        for clause in ("select_clause", "where_clause"):
+            if self.data.get(clause):
+                collector.visit(self.data[clause])
+        for expression, _ in self.flatten_clauses:
+            collector.visit(expression)
+
+        return collector.identifiers
+
+    def get_file_attributes(self):
+        """Returns names of `file.*` attributes of the queried files that are referenced.
+
+        A reference to the whole `file` object is reported as "*".
+
+        Example: {"link", "mtime"}
+        """
+        result = set()
+        for identifier in self.get_identifiers():
+            if identifier == "file":
+                result.add("*")
+            elif identifier.startswith("file."):
+                result.add(identifier.split(".")[1])
+
+        return result
+
+    def get_where_expression(self):
+        """Returns a internal tree representation of the WHERE clause.
+
+        It's main purpose is for debugging / error creation. Maybe we change it in the future.
+        """
+        if self.data.get("where_clause"):
+            return self.data["where_clause"].pretty()
+
+        return ""
+
+    def where(self, identifiers, shared=None):
+        """Evaluates the WHERE clause for a given set of identifiers.
+
+        Args:
+            identifiers (dict): A dictionary of identifiers to be used in the WHERE clause.
+            shared (dict): Values of subexpressions common with SELECT clause (see `optimize`).
+
+        Returns:
+            bool: True if the WHERE clause evaluates to True, False otherwise.
+        """
+        if self.where_tree is None:
+            return True
+
+        if self.optimized:
+            return ExpressionEvaluator(identifiers, shared, self.resolve).visit(self.where_tree)
+
+        return ExpressionSolver(identifiers, self.resolve).transform(self.where_tree)
+
+
+def _flatten_rows(rows, expression, steps, resolve=None):
+    for identifiers in rows:
+        value = ExpressionSolver(identifiers, resolve).transform(expression)
+        for item in value if isinstance(value, (list, tuple)) else (value,):
+            yield _bind_path(identifiers, steps, item)
+
+
+def _bind_path(data, steps, value):
+    """Returns a copy of dicts on the path with the value set at its end"""
+    if type(data) is not dict:  # pylint: disable=unidiomatic-typecheck
+        # e.g. file attributes, which are computed lazily
+        raise TransformationError(f"can't FLATTEN `{'.'.join(steps)}` in place, use AS name")
+    head = steps[0]
+    if len(steps) > 1:
+        value = _bind_path(data.get(head, {}), steps[1:], value)
+    return {**data, head: value}
+
+
+# pylint: disable=missing-function-docstring
+class FullClauseInterpreter(Interpreter):
+    """
+    Interpreter that returns list of query parts.
+
+    Example output:
+
+        [
+            {
+                "type": "view_type",
+                "value": "TABLE",
+            },
+            {
+                "type": "select_clause",
+                "value": ['featureID', 'file.link', 'metadata.a + metadata.b'],
+            },
+            {
+                "type": "from_clause",
+                "value": [{'type': 'tag', 'value': 'tag'}],
+            },
+        ]
+
+    Example usage:
+
+    sources = FullClauseInterpreter().visit(tree)
+    """
+    def tag_source(self, tree):
+        """Processes a tag source in a query."""
+        identifier_node = tree.children[0]
+        tag_name = identifier_node.children[0].value
+        if tag_name.startswith('`'):
+            tag_name = tag_name[1:-1]
+
+        return {'type': 'tag', 'value': tag_name}
+
+    def view_type(self, tree):
+        return {'type': 'view_type', 'value': tree.children[0].value}
+
+    def distinct(self, _):
+        return {'type': 'distinct'}
+
+    def flatten_clause(self, tree):
+        expression, name = tree.children
+        if name is None:
+            if expression.data != "identifier":
+                raise TransformationError("FLATTEN of an expression needs AS name")
+            steps = parse_path(expression.children[0].value)
+            if not all(isinstance(step, str) for step in steps):
+                raise TransformationError("FLATTEN of a list item needs AS name")
+        else:
+            steps = (name.value,)
+        return {'type': 'flatten_clause', 'value': (expression, steps)}
+
+    def view_format(self, tree):
+        return {'type': 'view_format', 'value': tree.children[0].value.upper()}
+
+    def select_clause(self, tree):
+        return {'type': 'select_clause', 'value': tree}
+
+    def from_clause(self, tree):
+        return {'type': 'from_clause', 'value': tree}
+
+    def where_clause(self, tree):
+        return {'type': 'where_clause', 'value': tree}
+
+
+# pylint: disable=missing-function-docstring
+class SelectClauseColumnNamesTransformer(Interpreter):
+    """Transformer for extracting column names from a SELECT clause."""
+
+    def aliased_select_expression(self, tree):
+        v = self.visit_children(tree)
+        return v[1].value[1:-1]
+
+    def select_expression(self, tree):
+        v = self.visit_children(tree)
+        vv = []
+        for i in v:
+            for ii in i:
+                vv.append(ii)
+        v = ''.join([str(i) for i in vv])
+        return v
+
+    def add_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " + " + v[1]
+
+    def identifier(self, tree):
+        v = self.visit_children(tree)
+        return v[0].value
+
+    def literal(self, tree):
+        v = self.visit_children(tree)
+        return v[0].value
+
+    def sub_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " - " + v[1]
+
+    def mul_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + "  * " + v[1]
+
+    def div_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " / " + v[1]
+
+    def and_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " AND " + v[1]
+
+    def or_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " OR " + v[1]
+
+    def eq_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + "  == " + v[1]
+
+    def neq_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " + != " + v[1]
+
+    def lt_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " < " + v[1]
+
+    def gt_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " > " + v[1]
+
+    def lte_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " <= " + v[1]
+
+    def gte_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " >= " + v[1]
+
+    def in_op(self, tree):
+        v = self.visit_children(tree)
+        return v[0] + " in " + v[1]
+
+    def contains_op(self, tree):
+        v = self.visit_children(tree)
+        return v[1] + " in " + v[0]
+
+    def not_op(self, tree):
+        v = self.visit_children(tree)
+        return "not " + v[0]
+
+
+class IdentifiersCollector(Visitor):
+    """
+    Visitor that collects all identifiers of an expression tree.
+
+    Example usage:
+
+    collector = IdentifiersCollector()
+    collector.visit(tree)
+    collector.identifiers  # {"metadata.a", "file.link"}
+    """
+    def __init__(self):
+        super().__init__()
+        self.identifiers = set()
+
+    def identifier(self, tree):
+        """Processes an identifier."""
+        name = tree.children[0].value
+        if name.startswith('`'):
+            name = name[1:-1]
+        self.identifiers.add(name)
+
+
+# pylint: disable=missing-function-docstring
+class SourcesInterpreter(Interpreter):
+    """
+    Interpreter that collects all sources from the FROM clause.
+
+    Example usage:
+
+    sources = SourcesInterpreter().visit(tree)
+    """
+    def tag_source(self, tree):
+        """Processes a tag source in the FROM clause."""
+        identifier_node = tree.children[0]
+        tag_name = identifier_node.children[0].value
+        # Remove backticks if present (handled in identifier rule usually but
+        # here we access token directly)
+        if tag_name.startswith('`'):
+            tag_name = tag_name[1:-1]
+
+        return {'type': 'tag', 'value': tag_name}
+
+    def path_source(self, tree):
+        path_node = tree.children[0]
+        path_parts = [t.value for t in path_node.children]
+        path_value = "/".join(path_parts)
+
+        return {'type': 'path', 'value': path_value}
+
+    def from_clause(self, tree):
+        return self.visit_children(tree)
+
+    def from_expression(self, tree):
+        return self.visit_children(tree)
+
+    def or_from_expression(self, tree):
+        return self.visit_children(tree)
+
+    def and_from_expression(self, tree):
+        return self.visit_children(tree)
+
+    def not_from_expression(self, tree):
+        return self.visit_children(tree)
+
+    def from_atom(self, tree):
+        return self.visit_children(tree)
+
+
+def lookup_value_in_dict(data, key, resolve=None):
+    """Get value from dict by path in key.
+
+    Parameters:
+        data: dict
+        key: str like "key.inner_key.and_other_key" or "key.list_key[0]"
+        resolve: function that dereferences links to notes (see accessors.py)
+
+    Returns None if there is no such key (see accessors.compile_path).
+    """
+    return compile_path(key)(data, resolve)
+
+
+# pylint: disable=too-few-public-methods
+class ExpressionSolverService():
+    """Helper service for solving individual expressions with Lark."""
+    def __init__(self, expression):
+        lark = get_parser('expression')
+        try:
+            self.tree = lark.parse(expression)
+        except:
+            log.debug("failed to parse expression: %s", expression)
+            raise
+
+    def solve(self, identifiers=None, resolve=None):
+        """Solves the expression using the provided identifiers, `resolve` dereferences
+        links to notes (see accessors.py)."""
+        return ExpressionSolver(identifiers, resolve).transform(self.tree)
+
+
+# pylint: disable=too-many-public-methods
+# pylint: disable=missing-function-docstring
+class ExpressionSolver(Transformer):
+    """
+    This class is not intended to be used directly. Use ExpersionSolverService instead.
+    Solves the expression grammar tree by reducing complex terms into simple ones.
+
+    Example:
+            tree = lark.parse("a + 2")
+
+
+            res_transform = ExpressionSolver({"a": 1}).transform(tree)
+            res_transform should be 3
+
+
+    """
+
+    def __init__(self, identifiers, resolve=None):
+        super().__init__()
+        self.__identifiers = identifiers
+        self.__resolve = resolve
+
+    def select_clause(self, toks):
+        return toks
+
+    def constant(self, toks):
+        return toks[0]
+
+    def where_clause(self, toks):
+        if len(toks) != 1:
+            raise TransformationError("unexpected where tokens size")
+
+        return toks[0]
+
+    def aliased_select_expression(self, toks):
+        return toks[0]
+
+    def select_expression(self, toks):
+        return toks[0]
+
+    def identifier(self, toks):
+        """resolves identifiers to their values"""
+        # accessors are compiled once per identifier, backticks are stripped by them
+        v = compile_path(toks[0].value)(self.__identifiers, self.__resolve)
+
+        if v is None:
+            v = ''
+        return v
+
+    # pylint: disable=too-many-return-statements
+    def literal(self, toks):
+        tok = toks[0]
+        if tok.type == 'STRING_CONSTANT':
+            return tok.value[1:-1]
+        if tok.type == 'SIGNED_INT':
+            return int(tok)
+        if tok.type == 'SIGNED_FLOAT':
+            return float(tok)
+        if tok.type == 'BOOLEAN_TRUE':
+            return True
+        if tok.type == 'BOOLEAN_FALSE':
+            return False
+        if tok.type == 'NULL':
+            return None
+        return tok.value
+
+    def add_op(self, toks):
+        return toks[0] + toks[1]
+
+    def sub_op(self, toks):
+        return toks[0] - toks[1]
+
+    def mul_op(self, toks):
+        return toks[0] * toks[1]
+
+    def div_op(self, toks):
+        return toks[0] / toks[1]
+
+    def and_op(self, toks):
+        return bool(toks[0] and toks[1])
+
+    def or_op(self, toks):
+        return bool(toks[0] or toks[1])
+
+    def eq_op(self, toks):
+        return toks[0] == toks[1]
+
+    def neq_op(self, toks):
+        return toks[0] != toks[1]
+
+    # values of different types are ordered by type, see values.py
+    def lt_op(self, toks):
+        return compare(operator.lt, toks[0], toks[1])
+
+    def gt_op(self, toks):
+        return compare(operator.gt, toks[0], toks[1])
+
+    def lte_op(self, toks):
+        return compare(operator.le, toks[0], toks[1])
+
+    def gte_op(self, toks):
+        return compare(operator.ge, toks[0], toks[1])
+
+    def in_op(self, toks):
+        return toks[0] in toks[1]
+
+    def contains_op(self, toks):
+        return toks[1] in toks[0]
+
+    def not_op(self, toks):
+        return not toks[0]
+
+    def list(self, toks):
+        return toks
+
+    def object(self, toks):
+        return dict(toks)
+
+    def object_item(self, toks):
+        return (toks[0].value, toks[1])
+
+    def function_call(self, toks):
+        func_token = toks[0]
+        args = toks[1:]
+
+        # functions are registered in functions.py
+        function = get_function(func_token.value)
+        if function is None:
+            raise FuncitonCallError("Unknown function", name = func_token.value)
+
+        return function(*args)
+
+
+# pylint: disable=missing-function-docstring
+class ExpressionEvaluator(Interpreter):
+    """
+    Evaluates optimized query trees (see `QueryService.optimize`) top-down.
+
+    Unlike ExpressionSolver it stops evaluating AND/OR as soon as the result is known
+    and computes `shared` subexpressions once per row. All other nodes are delegated
+    to ExpressionSolver.
+
+    Example:
+            ExpressionEvaluator({"a": 1}, shared={}).visit(tree)
+    """
+    def __init__(self, identifiers, shared=None, resolve=None):
+        self.solver = ExpressionSolver(identifiers, resolve)
+        self.shared_values = shared if shared is not None else {}
+
+    def __default__(self, tree):
+        return getattr(self.solver, tree.data)(self.visit_children(tree))
+
+    def constant(self, tree):
+        return tree.children[0]
+
+    def and_op(self, tree):
+        return bool(self.visit(tree.children[0]) and self.visit(tree.children[1]))
+
+    def or_op(self, tree):
+        return bool(self.visit(tree.children[0]) or self.visit(tree.children[1]))
+
+    def shared(self, tree):
+        slot, subtree = tree.children
+        if slot not in self.shared_values:
+            self.shared_values[slot] = self.visit(subtree)
+        return self.shared_values[slot]
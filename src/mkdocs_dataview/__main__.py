@@ -1,10 +1,22 @@
 """
 Main module for running this module as external script on mkdocs.
 """
+import argparse
+import logging
 
+from .daemon import DaemonClient
 from .markdown_db import FilePlugin
 
 if __name__ == "__main__":
-    sut = FilePlugin()
+    parser = argparse.ArgumentParser(description="renders dataview templates of ./docs")
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help="load files and execute queries with a running index daemon",
+    )
+    parser.add_argument("--daemon-socket", help="path of the daemon's Unix socket")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    sut = FilePlugin(daemon=DaemonClient.connect(args.daemon_socket) if args.daemon else None)
     sut.collect_data("./docs")
     sut.render_all_templates("./docs")
@@ -0,0 +1,436 @@
+"""
+Local daemon that keeps parsed metadata of docs in memory between builds.
+
+Several `mkdocs build` runs and the CLI would otherwise read and parse all files of
+the same docs directory again. The daemon owns parsed files (kept fresh by watching
+the docs directories), builds indexes of them and executes queries with cached
+results. Clients talk to it over a Unix socket and fall back to in-process mode if
+it isn't running.
+
+Start it with::
+
+    python -m mkdocs_dataview.daemon [--socket PATH]
+
+The socket is created in a per-user directory that only its owner can access
+(`runtime_dir`), and clients check the owner of the directory and of the socket
+before connecting, so other users can neither talk to the daemon nor pose as it.
+
+Protocol: a client sends one JSON object per connection and receives a frame with
+8-byte big-endian length of the JSON response ({"ok": True, "result": ...} or
+{"ok": False, "error": "..."}). Values that JSON can't represent (dates, dicts
+with keys other than strings, tuples, parsed files) are sent as tagged objects,
+see markdown_db/tagged_json.py. Nothing received over the socket is ever unpickled.
+"""
+import argparse
+import getpass
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+
+import frontmatter
+
+from . import __version__
+from .markdown_db.cache import calls_impure_function
+from .markdown_db.index import SimpleMemoryIndex, build_index
+from .markdown_db.md_renderer import RendererWithContext
+from .markdown_db.path_index import PathIndex
+from .markdown_db.tagged_json import from_json, to_json
+from .markdown_db.projection import apply_projection, collect_field_paths
+from .query import functions
+from .query.solvers import QueryService
+
+log = logging.getLogger(__name__)
+
+FRAME = struct.Struct(">Q")
+
+# number of cached query results per index
+MAX_CACHED_RESULTS = 10000
+# number of cached indexes (e.g. of different sites or configs)
+MAX_CACHED_INDEXES = 8
+
+# plugin options that change indexes or results, sent with `execute` requests
+DEFAULT_SETTINGS = {
+    "link_graph": False, "content_index": False, "prune_metadata": False, "functions": {},
+}
+
+
+def runtime_dir() -> str:
+    """Returns the directory of the daemon socket of the current user"""
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if base:
+        return os.path.join(base, "mkdocs-dataview")
+    user = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f"mkdocs-dataview-{user}")
+
+
+def default_socket_path() -> str:
+    """Returns path of the daemon socket of the current user"""
+    return os.path.join(runtime_dir(), "daemon.sock")
+
+
+class DaemonError(Exception):
+    """Raised if the daemon failed to process a request or its socket is not safe to use"""
+
+
+def check_owner(path: str, directory: bool = False) -> None:
+    """Raises DaemonError unless `path` is a socket (or a directory that no one else can
+    access) owned by the current user, OSError if it doesn't exist"""
+    if not hasattr(os, "getuid"):
+        return
+    path_stat = os.lstat(path)
+    if path_stat.st_uid != os.getuid():
+        raise DaemonError(f"{path} is owned by another user")
+    if directory:
+        if not stat.S_ISDIR(path_stat.st_mode) or path_stat.st_mode & 0o077:
+            raise DaemonError(f"{path} must be a directory accessible only by its owner")
+    elif not stat.S_ISSOCK(path_stat.st_mode):
+        raise DaemonError(f"{path} is not a socket")
+
+
+def load_post(path: str) -> frontmatter.Post:
+    """Loads a markdown file with its frontmatter"""
+    with open(path, 'r', encoding="utf-8-sig") as file:
+        return frontmatter.load(file)
+
+
+class _CachedIndex:  # pylint: disable=too-few-public-methods
+    """Index built from a list of files and results of queries executed on it.
+
+    `settings` are DEFAULT_SETTINGS of the client, `field_paths` are kept by
+    `prune_metadata` (see projection.py).
+    """
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, files, posts, versions, settings, field_paths=None):
+        self.versions = versions
+        self.index = SimpleMemoryIndex(
+            content=settings["content_index"], links=settings["link_graph"]
+        )
+        for file_path, target_url, src_uri in files:
+            build_index(posts[file_path], file_path, target_url, self.index, src_uri)
+        if settings["prune_metadata"]:
+            apply_projection(self.index.sources, field_paths)
+        self.renderer = RendererWithContext(self.index.sources)
+        self.renderer.link_graph = self.index.link_graph
+        self.renderer.content_index = self.index.content_index
+        self.renderer.path_index = PathIndex(files)
+        self.results = {}
+
+    def execute(self, pages, options_key: tuple) -> dict:
+        """Renders queries of pages, see IndexDaemon.execute. Results are cached by the
+        page, the query and `options_key` of everything else they depend on."""
+        results = {}
+        for out_path, this_key, queries in pages:
+            this_metadata = self.index.sources.get(this_key)
+            for query in queries:
+                result_key = (out_path, query)
+                cache_key = (out_path, this_key, query, options_key)
+                if cache_key in self.results:
+                    results[result_key] = self.results[cache_key]
+                    continue
+
+                out = io.StringIO()
+                try:
+                    self.renderer.render_query(query, this_metadata, out, out_path)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    continue
+                results[result_key] = out.getvalue()
+                # results of impure functions can change with the same index
+                if not calls_impure_function(QueryService(query).tree):
+                    if len(self.results) >= MAX_CACHED_RESULTS:
+                        self.results.clear()
+                    self.results[cache_key] = results[result_key]
+        return results
+
+
+class IndexDaemon:  # pylint: disable=too-many-instance-attributes
+    """State of the daemon: parsed files and indexes built from them.
+
+    Files are always validated by mtime and size before they are used. Watched docs
+    directories are also reparsed in background as soon as their files change, so
+    the next build finds them parsed.
+    """
+    def __init__(self, watch: bool = True):
+        self.posts = {}  # path -> (version, stat key, frontmatter.Post)
+        self.indexes = {}  # key of the files list -> _CachedIndex
+        self.version = 0
+        self.watched_roots = set()
+        # functions of the daemon itself, clients' `functions` are registered on top
+        functions.load_entry_points()
+        self._functions = dict(functions.FUNCTIONS)
+        self._function_specs = {}
+        self._lock = threading.RLock()
+        self._observer = None
+        self._handler = None
+        if watch:
+            self._start_observer()
+
+    def _start_observer(self) -> None:
+        try:
+            # pylint: disable=import-outside-toplevel
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            log.info("watchdog is not available, files are reparsed on requests only")
+            return
+
+        daemon = self
+
+        class Handler(FileSystemEventHandler):  # pylint: disable=too-few-public-methods
+            """Reparses changed files"""
+            def on_any_event(self, event):
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        daemon.refresh(os.fsdecode(path), event.is_directory)
+
+        self._observer = Observer()
+        self._observer.daemon = True
+        self._handler = Handler()
+        self._observer.start()
+
+    def close(self) -> None:
+        """Stops watching files"""
+        if self._observer is not None:
+            self._observer.stop()
+
+    def refresh(self, path: str, is_directory: bool = False) -> None:
+        """Reparses a changed file, forgets files under a changed directory"""
+        with self._lock:
+            if is_directory:
+                prefix = os.path.join(path, "")
+                for cached_path in [p for p in self.posts if p.startswith(prefix)]:
+                    del self.posts[cached_path]
+            elif path in self.posts:
+                try:
+                    self.load([path])
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    log.debug("can't reparse %s: %s", path, exc)
+                    del self.posts[path]
+
+    def watch(self, root: str) -> None:
+        """Starts watching a docs directory"""
+        root = os.path.abspath(root)
+        if self._observer is None or root in self.watched_roots:
+            return
+        try:
+            self._observer.schedule(self._handler, root, recursive=True)
+        except OSError as exc:
+            log.warning("can't watch %s: %s", root, exc)
+            return
+        self.watched_roots.add(root)
+
+    def load(self, paths) -> dict:
+        """Returns {path: frontmatter.Post} of fresh parsed files"""
+        result = {}
+        with self._lock:
+            for path in paths:
+                file_stat = os.stat(path)
+                stat_key = (file_stat.st_mtime_ns, file_stat.st_size)
+                cached = self.posts.get(path)
+                if cached is None or cached[1] != stat_key:
+                    self.version += 1
+                    cached = self.posts[path] = (self.version, stat_key, load_post(path))
+                result[path] = cached[2]
+        return result
+
+    def index(self, files, settings=None, field_paths=None) -> _CachedIndex:
+        """Returns the index of `files` [(file_path, target_url, src_uri), ...] built with
+        `settings` (see DEFAULT_SETTINGS), `field_paths` are kept by `prune_metadata`"""
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        with self._lock:
+            posts = self.load([file_path for file_path, _, _ in files])
+            versions = tuple(self.posts[file_path][0] for file_path, _, _ in files)
+
+        if not settings["prune_metadata"]:
+            field_paths = None
+        key = json.dumps([files, settings, field_paths], sort_keys=True)
+        cached = self.indexes.get(key)
+        if cached is None or cached.versions != versions:
+            if len(self.indexes) >= MAX_CACHED_INDEXES:
+                del self.indexes[next(iter(self.indexes))]
+            cached = self.indexes[key] = _CachedIndex(
+                files, posts, versions, settings, field_paths
+            )
+        return cached
+
+    def _use_functions(self, specs: dict) -> None:
+        """Registers functions of a client (see functions.register_functions) instead of
+        functions of the previous one"""
+        if specs == self._function_specs:
+            return
+        functions.FUNCTIONS.clear()
+        functions.FUNCTIONS.update(self._functions)
+        self._function_specs = {}
+        functions.register_functions(specs)
+        self._function_specs = specs
+
+    def execute(self, files, pages, table_format="markdown", settings=None) -> dict:
+        """Renders queries of pages [(out_path, this_key, queries), ...] on the index of
+        `files`, returns {(out_path, query): rendered markdown}. Failed queries are
+        skipped, so clients render them again and report errors as usual.
+        `table_format` is the default output of tables (see
+        RendererWithContext.table_format), `settings` are options of the client that
+        change the index or results (see DEFAULT_SETTINGS)."""
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self._use_functions(settings["functions"])
+        field_paths = None
+        if settings["prune_metadata"]:
+            field_paths = collect_field_paths(
+                [query for _, _, queries in pages for query in queries], []
+            )
+        cached = self.index(files, settings, field_paths)
+        cached.renderer.table_format = table_format
+        return cached.execute(pages, (table_format, json.dumps(settings, sort_keys=True)))
+
+    def handle(self, request: dict):
+        """Processes a request, returns its result"""
+        op = request.get("op")
+        if op == "ping":
+            return {"version": __version__}
+        if op == "load":
+            self.watch(request["root"])
+            return self.load(request["paths"])
+        if op == "execute":
+            self.watch(request["root"])
+            files = [tuple(f) for f in request["files"]]
+            return self.execute(
+                files, request["pages"], request.get("table_format", "markdown"),
+                request.get("settings"),
+            )
+        raise ValueError(f"unknown operation: {op}")
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = {"ok": True, "result": self.server.daemon.handle(request)}
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            log.exception("failed to process request")
+            response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+
+        try:
+            data = json.dumps(to_json(response)).encode()
+        except TypeError as exc:
+            data = json.dumps({"ok": False, "error": f"TypeError: {exc}"}).encode()
+        self.wfile.write(FRAME.pack(len(data)))
+        self.wfile.write(data)
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """Unix socket server of IndexDaemon, requests are processed one by one.
+
+    The directory of the socket is created accessible only by the current user (an
+    existing one must be), and the socket is created with 0600 permissions.
+    """
+    def __init__(self, socket_path: str, daemon: IndexDaemon):
+        self.daemon = daemon
+        directory = os.path.dirname(os.path.abspath(socket_path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        check_owner(directory, directory=True)
+        if os.path.lexists(socket_path):
+            check_owner(socket_path)
+            os.remove(socket_path)
+
+        # no moment when the socket is accessible by others
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class DaemonClient:
+    """Client of the daemon.
+
+    Typical usage::
+        client = DaemonClient.connect()
+        if client is not None:
+            posts = client.load(docs_dir, paths)
+    """
+    def __init__(self, socket_path: str | None = None, timeout: float = 600):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    @classmethod
+    def connect(cls, socket_path: str | None = None) -> "DaemonClient | None":
+        """Returns a client if the daemon is running (and its socket is safe to use)"""
+        client = cls(socket_path)
+        try:
+            client.request({"op": "ping"})
+        except OSError:
+            return None
+        except DaemonError as exc:
+            log.warning("can't use dataview daemon: %s", exc)
+            return None
+        return client
+
+    def request(self, request: dict):
+        """Sends a request and returns its result"""
+        family = getattr(socket, "AF_UNIX", None)
+        if family is None:
+            raise DaemonError("Unix sockets are not supported on this platform")
+
+        check_owner(os.path.dirname(os.path.abspath(self.socket_path)), directory=True)
+        check_owner(self.socket_path)
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            with sock.makefile("rb") as file:
+                header = file.read(FRAME.size)
+                if len(header) != FRAME.size:
+                    raise DaemonError("connection closed by the daemon")
+                response = from_json(file.read(FRAME.unpack(header)[0]))
+
+        if not response["ok"]:
+            raise DaemonError(response["error"])
+        return response["result"]
+
+    def load(self, root: str, paths: list[str]) -> dict:
+        """Returns {path: frontmatter.Post} of files under the docs directory `root`"""
+        return self.request({"op": "load", "root": root, "paths": paths})
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def execute(
+            self, root: str, files: list, pages: list, table_format: str = "markdown",
+            settings: dict | None = None,
+            ) -> dict:
+        """Executes queries of `pages` on the index of `files`, see IndexDaemon.execute"""
+        return self.request({
+            "op": "execute", "root": root, "files": files, "pages": pages,
+            "table_format": table_format, "settings": settings,
+        })
+
+
+def main(argv=None):
+    """Entry point"""
+    parser = argparse.ArgumentParser(description="mkdocs-dataview index daemon")
+    parser.add_argument("--socket", default=default_socket_path(), help="path of Unix socket")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    daemon = IndexDaemon()
+    with DaemonServer(args.socket, daemon) as server:
+        log.info("listening on %s", args.socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.close()
+
+
+if __name__ == "__main__":
+    main()
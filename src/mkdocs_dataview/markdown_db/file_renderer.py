@@ -2,33 +2,32 @@
 This module contains the FilePlugin class for rendering files in a standalone mode.
 """
 import io
+import logging
 import os
 import frontmatter
 
 from .md_renderer import RendererWithContext
 from .index import build_index, SimpleMemoryIndex
+from .projection import extract_queries
 from .. import utils
+from ..tracing import Tracer
 
-
-__debug_log_file__ = None
+log = logging.getLogger(__name__)
 
 
 class FilePlugin():
     """Plugin for handling file-based rendering and data collection."""
-    def __init__(self):
+    def __init__(self, tracer: Tracer | None = None, daemon=None):
         self.index = SimpleMemoryIndex()
-        self.sources = {}
-        self.renderer = RendererWithContext(self.sources)
-        self.log_toggle = False
-
-    def toggle_log(self, v: bool) -> None:
-        """turns on/off debug logging"""
-        self.log_toggle = v
-
-    def _log(self, *args, **kwargs) -> None:
-        """internal method to use for debugging"""
-        if self.log_toggle:
-            print(*args, **kwargs)
+        self.sources = self.index.sources
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.renderer = RendererWithContext(self.sources, tracer=self.tracer)
+        # daemon.DaemonClient to load files and execute queries with, everything is
+        # done here if it's None
+        self.daemon = daemon
+        self._preloaded = {}
+        # indexed files [(file_path, target_url, src_uri), ...]
+        self._files = []
 
     def render_file(self, path, out):
         """renders file"""
@@ -38,42 +37,97 @@ class FilePlugin():
         out.write("generated_ignore: true\n")
         out.write(frontmatter.YAMLHandler().export(obj.metadata))
         out.write("\n---\n")
-        self.renderer.render_str(io.StringIO(obj.content), out, self.sources[path], path)
+        self.renderer.render_str(
+            io.StringIO(obj.content), out, self.sources[path], path, self.tracer.page(path)
+        )
 
     def render_all_templates(self, path: str):
         """renders all files in cli mode"""
-        for full_path_file in utils.enumerate_files_by_ext(path, ['.mdtmpl']):
+        templates = list(utils.enumerate_files_by_ext(path, ['.mdtmpl']))
+        if self.daemon is not None:
+            self._pre_execute(path, templates)
+
+        for full_path_file in templates:
             new_file_path, _ = os.path.splitext(full_path_file)
             new_file_path += ".md"
 
-            if os.path.basename(new_file_path) == __debug_log_file__:
-                self.renderer.toggle_log(True)
-
             with open(new_file_path, 'w', encoding="utf-8-sig") as file_out:
                 self.render_file(full_path_file, file_out)
 
-            self.renderer.toggle_log(False)
-
     def load_file(self, path: str):
         """
         Helper method to load a file with correct encoding and return it's metadata.
         """
+        post = self._preloaded.get(os.path.abspath(path))
+        if post is not None:
+            return post
+
         with open(path, 'r', encoding="utf-8-sig") as file:
             return frontmatter.load(file)
 
-    def _on_file(self, file_path: str, target_url: str):
+    def _on_file(self, file_path: str, target_url: str, src_uri: str | None = None):
         """common method to scan file to build index"""
 
+        trace = self.tracer.page(file_path)
+        trace("load file %s", file_path)
+
         data = self.load_file(file_path)
+        trace("metadata: %s", data.metadata)
 
-        build_index(data, file_path, target_url, self.index)
-        self.log_toggle = False
+        build_index(data, file_path, target_url, self.index, src_uri)
 
     def collect_data(self, root_path: str):
         """searches for all .md, .mdtmpl files (used in cli mode)"""
-        for file_path in utils.enumerate_files_by_ext(root_path, ['.md', '.mdtmpl']):
+        file_paths = list(utils.enumerate_files_by_ext(root_path, ['.md', '.mdtmpl']))
+        if self.daemon is not None:
+            self._preload(root_path, file_paths)
+
+        for file_path in file_paths:
             target_url = file_path
             path_without_extension, extension = os.path.splitext(file_path)
             if extension == '.mdtmpl':
                 target_url = path_without_extension + '.md'
-            self._on_file(file_path, target_url)
+            src_uri = os.path.relpath(file_path, root_path)
+            self._files.append((file_path, target_url, src_uri))
+            self._on_file(file_path, target_url, src_uri)
+
+    def _daemon_request(self, func, *args):
+        """calls the daemon client, switches to in-process mode if it fails"""
+        # pylint: disable=import-outside-toplevel
+        from ..daemon import DaemonError
+
+        try:
+            return func(*args)
+        except (OSError, DaemonError) as exc:
+            log.warning("dataview daemon failed, switching to in-process mode: %s", exc)
+            self.daemon = None
+            return None
+
+    def _preload(self, root_path: str, file_paths: list[str]):
+        """loads files by the daemon, they are loaded here if it fails"""
+        preloaded = self._daemon_request(
+            self.daemon.load, os.path.abspath(root_path), [os.path.abspath(p) for p in file_paths]
+        )
+        self._preloaded = preloaded or {}
+
+    def _pre_execute(self, root_path: str, templates: list[str]):
+        """executes queries of templates by the daemon (on its index of the same files),
+        queries it doesn't return are rendered here as usual"""
+        pages = []
+        for path in templates:
+            queries = extract_queries(self.load_file(path).content)[0]
+            if queries:
+                pages.append((path, os.path.abspath(path), queries))
+        if not pages:
+            return
+
+        files = [
+            (os.path.abspath(file_path), target_url, src_uri)
+            for file_path, target_url, src_uri in self._files
+        ]
+        results = self._daemon_request(
+            self.daemon.execute, os.path.abspath(root_path), files, pages,
+            self.renderer.table_format,
+        )
+        if results is not None:
+            self.renderer.precomputed.update(results)
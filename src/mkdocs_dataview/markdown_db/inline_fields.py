@@ -0,0 +1,102 @@
+"""
+This module extracts inline fields (`key:: value`) from the markdown of a page.
+
+Fields are written on their own line (also as a list item or in a quote) or
+inside a line in brackets: `[key:: value]` or `(key:: value)`. The body is
+scanned line by line in a single pass while the file is indexed, code fences,
+indented code blocks and inline code are skipped. Values are converted with
+`utils.deduce_value_type`, a key that occurs several times gets the list of its
+values.
+
+Typical usage::
+    fields = extract_inline_fields("rating:: 5\\n")  # {"rating": 5}
+    metadata = merge_inline_fields(post.metadata, fields)
+"""
+import io
+import re
+
+from ..utils import deduce_value_type
+
+FENCE_RE = re.compile(r"^\s*(`{3,}|~{3,})")
+# an indented code block starts after a blank line, unless it continues a list item
+INDENTED_RE = re.compile(r"^(?: {4}|\t)")
+LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+\.)\s")
+CODE_RE = re.compile(r"`[^`\n]*`")
+# key:: value on its own line, optionally in a list item or a quote
+LINE_FIELD_RE = re.compile(r"^\s*(?:(?:[-*+]|\d+\.)\s+|>\s*)*([A-Za-z_][\w-]*)::(.*)$")
+# [key:: value] or (key:: value) inside a line
+BRACKET_FIELD_RE = re.compile(r"[\[(]([A-Za-z_][\w-]*)::([^\])\n]*)[\])]")
+
+# keys that can't be set by inline fields (see build_index)
+RESERVED_KEYS = ("file",)
+
+
+def extract_inline_fields(content: str) -> dict:
+    """Returns inline fields of the markdown (without frontmatter)"""
+    fields = {}
+    if "::" not in content:
+        return fields
+
+    for line in _text_lines(content):
+        if "::" not in line:
+            continue
+        line = CODE_RE.sub("", line)
+        matches = BRACKET_FIELD_RE.findall(line)
+        if not matches:
+            match = LINE_FIELD_RE.match(line)
+            matches = [match.groups()] if match is not None else []
+        for key, value in matches:
+            _add_field(fields, key, deduce_value_type(value.strip()))
+    return fields
+
+
+def _text_lines(content: str):
+    """Yields non-blank lines of the markdown outside code fences and indented code"""
+    fence = None
+    # indented code, after a blank line, in a list
+    indented_code, after_blank, in_list = False, True, False
+    for line in io.StringIO(content):
+        if not line.strip():
+            after_blank = True
+            continue
+        indented = INDENTED_RE.match(line) is not None
+        if fence is None:
+            if indented and (indented_code or after_blank and not in_list):
+                indented_code = True
+                continue
+            if LIST_ITEM_RE.match(line):
+                in_list = True
+            elif not indented and after_blank:
+                in_list = False
+        indented_code = after_blank = False
+
+        match = FENCE_RE.match(line)
+        if fence is not None:
+            if match is not None and match.group(1)[0] == fence[0] \
+                    and len(match.group(1)) >= len(fence):
+                fence = None
+        elif match is not None:
+            fence = match.group(1)
+        else:
+            yield line
+
+
+def _add_field(fields: dict, key: str, value) -> None:
+    if key in RESERVED_KEYS:
+        return
+    if key not in fields:
+        fields[key] = value
+    elif isinstance(fields[key], list):
+        fields[key].append(value)
+    else:
+        fields[key] = [fields[key], value]
+
+
+def merge_inline_fields(metadata: dict, fields: dict) -> dict:
+    """Returns metadata with inline fields added, frontmatter wins on conflicts"""
+    if not fields:
+        return metadata
+    merged = dict(metadata)
+    for key, value in fields.items():
+        merged.setdefault(key, value)
+    return merged
@@ -0,0 +1,123 @@
+"""
+This module implements the link graph of pages for `file.outlinks` and `file.inlinks`.
+
+Links to other markdown files are extracted from page contents while the index is
+built (inline `[text](page.md)` links and `[ref]: page.md` definitions, code is
+skipped) and resolved relative to the linking file. The graph keeps forward and
+reverse adjacency lists, so both attributes are lookups proportional to the
+number of links of a page. `set_links` replaces the links of a single page, so
+the graph is kept up to date when pages change without rebuilding it.
+
+Typical usage::
+    graph = LinkGraph()
+    graph.add_page("docs/a.md", "a/")
+    graph.add_content("docs/a.md", content)
+    graph.get("inlinks", "docs/b.md")  # ["a/"]
+"""
+import hashlib
+import os
+import re
+from urllib.parse import unquote
+
+FENCE_RE = re.compile(r"^(```|~~~).*?^\1", re.MULTILINE | re.DOTALL)
+CODE_RE = re.compile(r"`[^`\n]*`")
+# [text](target "title"), but not images ![alt](src)
+INLINE_LINK_RE = re.compile(r"(?<!!)\[[^\]\n]*\]\(\s*<?([^)\s>]+)>?[^)\n]*\)")
+# [ref]: target
+REFERENCE_LINK_RE = re.compile(r"^ {0,3}\[[^\]\n]+\]:\s*<?([^\s>]+)>?", re.MULTILINE)
+SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+# file attributes resolved by the graph
+LINK_ATTRIBUTES = ("inlinks", "outlinks")
+
+
+def extract_links(content: str, file_path: str) -> tuple[str, ...]:
+    """Returns paths of markdown files linked from the content of `file_path`, in the
+    order of the first link to each of them"""
+    text = CODE_RE.sub("", FENCE_RE.sub("", content))
+    page_dir = os.path.dirname(file_path)
+
+    targets = {}
+    for regex in (INLINE_LINK_RE, REFERENCE_LINK_RE):
+        for match in regex.finditer(text):
+            target = match.group(1)
+            if SCHEME_RE.match(target) or target.startswith(("#", "/")):
+                continue
+            target = unquote(target.split("#", 1)[0].split("?", 1)[0])
+            if target.endswith(".md"):
+                targets[os.path.normpath(os.path.join(page_dir, target))] = None
+    return tuple(targets)
+
+
+class LinkGraph:
+    """Forward and reverse links between indexed pages.
+
+    Pages are identified by their index keys (file paths), attributes return
+    `file.path` of linked pages. Links to files that are not indexed are kept, so
+    they are resolved as soon as the files are added.
+    """
+    def __init__(self):
+        self.paths = {}  # key -> file.path
+        self.outlinks = {}  # key -> (linked keys, ...)
+        self.inlinks = {}  # key -> {linking key: None}
+        self.version = 0
+        self._fingerprint = (-1, "")
+
+    def add_page(self, key: str, path: str) -> None:
+        """Adds an indexed page"""
+        self.paths[os.path.normpath(key)] = path
+        self.version += 1
+
+    def set_links(self, key: str, targets) -> None:
+        """Replaces links of the page `key` (see `extract_links`)"""
+        key = os.path.normpath(key)
+        for target in self.outlinks.pop(key, ()):
+            self.inlinks[target].pop(key, None)
+        if targets:
+            self.outlinks[key] = tuple(targets)
+            for target in targets:
+                self.inlinks.setdefault(target, {})[key] = None
+        self.version += 1
+
+    def add_content(self, key: str, content: str) -> None:
+        """Replaces links of the page `key` with the links in its markdown"""
+        self.set_links(key, extract_links(content, key))
+
+    def remove(self, key: str) -> None:
+        """Removes a page and its links"""
+        self.set_links(key, ())
+        self.paths.pop(os.path.normpath(key), None)
+
+    def retain(self, keys) -> None:
+        """Removes pages that are not in `keys` (e.g. deleted files)"""
+        keys = {os.path.normpath(key) for key in keys}
+        for key in [k for k in self.paths if k not in keys]:
+            self.remove(key)
+
+    def merge(self, partial: "LinkGraph") -> None:
+        """Adds pages and links of another graph (e.g. built by another process)"""
+        for key, path in partial.paths.items():
+            self.add_page(key, path)
+        for key, targets in partial.outlinks.items():
+            self.set_links(key, targets)
+
+    def get(self, attribute: str, key: str) -> list[str]:
+        """Returns `file.path` of pages linked from the page (`outlinks`) or linking to
+        it (`inlinks`)"""
+        key = os.path.normpath(key)
+        if attribute == "outlinks":
+            linked = self.outlinks.get(key, ())
+            return [self.paths[k] for k in linked if k in self.paths]
+        linking = self.inlinks.get(key, {})
+        return sorted(self.paths[k] for k in linking if k in self.paths)
+
+    def fingerprint(self) -> str:
+        """Returns a hash of all links, it changes when any link changes"""
+        version, digest = self._fingerprint
+        if version != self.version:
+            sha = hashlib.sha256()
+            for key in sorted(self.outlinks):
+                sha.update(repr((self.paths.get(key), self.get("outlinks", key))).encode())
+            digest = sha.hexdigest()
+            self._fingerprint = (self.version, digest)
+        return digest
@@ -0,0 +1,144 @@
+"""
+This module executes dataview queries of many pages in a process or thread pool.
+
+MkDocs renders pages one by one, so queries of all pages would run on a single core.
+Once the index is built, every query of the site is known, so they can be executed
+ahead of time. The index is written to a snapshot file once (see snapshot.py) and
+every worker maps it into memory, renders queries of the pages it's given and returns
+rendered markdown, which the renderer later splices in instead of executing the
+queries again (see RendererWithContext.precomputed).
+
+With `threads` the pages are rendered by a thread pool instead. Threads share a
+read-only view of the index and every page is rendered with its own renderer, so
+nothing is written to shared state. It scales on free-threaded Python builds.
+
+Typical usage::
+    pages = [("books/", "docs/books.md", NO_TRACE, ['TABLE file.name WHERE ...']), ...]
+    results, stats = pre_execute(sources, pages, workers=4)
+    renderer.precomputed.update(results)
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+import io
+import os
+import tempfile
+from types import MappingProxyType
+
+from ..query import functions
+from .md_renderer import RendererWithContext
+from .report import BuildReport
+from .snapshot import SnapshotIndex, write_snapshot
+
+# renderer of the worker process, see _init_worker
+_RENDERER = None
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def _make_renderer(sources, report, tracer, link_graph, table_format, dataset_dir, path_index):
+    renderer = RendererWithContext(sources, BuildReport() if report else None, tracer)
+    renderer.link_graph = link_graph
+    renderer.path_index = path_index
+    renderer.table_format = table_format
+    renderer.dataset_dir = dataset_dir
+    return renderer
+
+
+def _init_worker(snapshot_path, function_specs, *options):
+    global _RENDERER  # pylint: disable=global-statement
+    # spawned workers don't inherit functions registered by the plugin
+    functions.register_functions(function_specs)
+    _RENDERER = _make_renderer(SnapshotIndex(snapshot_path), *options)
+
+
+def _execute_page_in_thread(options, page):
+    # a renderer (and its report) per page, only the read-only sources are shared
+    return _execute_page(page, _make_renderer(*options))
+
+
+def _execute_page(page, renderer=None):
+    """Renders queries of a single page, failed queries are left for the serial rendering,
+    so their errors are reported as usual"""
+    out_path, source_key, trace, queries = page
+    if renderer is None:
+        renderer = _RENDERER
+    this_metadata = renderer.sources[source_key]
+
+    report = renderer.report if renderer.report is not None else BuildReport()
+    results = {}
+    for query in queries:
+        out = io.StringIO()
+        executed = len(report.queries)
+        try:
+            renderer.render_query(query, this_metadata, out, out_path, trace)
+        except Exception:  # pylint: disable=broad-exception-caught
+            del report.queries[executed:]
+            continue
+        results[(out_path, query)] = out.getvalue()
+
+    stats, report.queries = report.queries, []
+    return results, stats
+
+
+def snapshot_sources(sources) -> MappingProxyType:
+    """Returns a read-only view of the sources that threads can share, indexes that are
+    not dicts (e.g. loaded lazily or stored in SQLite) are loaded into memory first"""
+    if not isinstance(sources, dict):
+        sources = dict(sources.items())
+    return MappingProxyType(sources)
+
+
+def resolve_workers(workers: int) -> int:
+    """Returns number of worker processes, 0 means all CPUs"""
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+# pylint: disable=too-many-positional-arguments,too-many-arguments,too-many-locals
+def pre_execute(
+        sources, pages, workers, report=False, tracer=None, link_graph=None,
+        table_format="markdown", dataset_dir=None, threads=False, path_index=None,
+        function_specs=None,
+        ):
+    """Executes queries of all pages in `workers` processes (or threads if `threads` is
+    set).
+
+    `pages` is a list of (out_path, source_key, trace, queries), where `source_key` is
+    the key of the page in `sources` (its `this`) and `trace` is the trace of the page
+    (see tracing.Tracer). `link_graph` (see links.LinkGraph), `table_format`,
+    `dataset_dir` and `path_index` (see RendererWithContext) are sent to every worker.
+    `function_specs` (name -> "package.module:function", see query/functions.py) are
+    registered in every worker process along with functions of entry points.
+
+    Returns ({(out_path, query): rendered markdown}, [report.QueryStats]). Stats are
+    collected only if `report` is set.
+    """
+    results = {}
+    stats = []
+    if not pages:
+        return results, stats
+
+    workers = min(resolve_workers(workers), len(pages))
+    options = (report, tracer, link_graph, table_format, dataset_dir, path_index)
+    if threads:
+        execute = functools.partial(_execute_page_in_thread, (snapshot_sources(sources), *options))
+        with ThreadPoolExecutor(workers) as executor:
+            for page_results, page_stats in executor.map(execute, pages):
+                results.update(page_results)
+                stats.extend(page_stats)
+        return results, stats
+
+    with tempfile.TemporaryDirectory(prefix="dataview-") as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, "index.snapshot")
+        write_snapshot(snapshot_path, sources)
+
+        initargs = (snapshot_path, function_specs or {}, *options)
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            chunksize = max(1, len(pages) // (workers * 4))
+            for page_results, page_stats in executor.map(
+                    _execute_page, pages, chunksize=chunksize):
+                results.update(page_results)
+                stats.extend(page_stats)
+
+    return results, stats
@@ -0,0 +1,124 @@
+"""
+This module implements projection pushdown: it finds out which metadata fields
+can be referenced by the queries of a site, so the index keeps only those.
+"""
+import itertools
+
+from lark.exceptions import LarkError
+
+from mkdocs_dataview.query.accessors import dereference_position, parse_path
+from mkdocs_dataview.query.solvers import ExpressionSolverService, IdentifiersCollector
+from mkdocs_dataview.query.solvers import QueryService
+
+from .md_renderer import DATAVIEW_RE
+
+# fields that are used by the plugin itself (FROM #tag, default title of file.link)
+ALWAYS_KEPT_FIELDS = ("tags", "title")
+
+# identifiers that reference the whole metadata of a file
+WHOLE_METADATA_IDENTIFIERS = ("metadata", "this", "this.metadata")
+
+
+def extract_queries(markdown: str) -> tuple[list[str], list[str]]:
+    """Returns queries of `dataview` fences and inline expressions found in markdown"""
+    queries = []
+    expressions = []
+
+    for match in DATAVIEW_RE.finditer(markdown):
+        if match.group("query") is not None:
+            queries.append(match.group("query"))
+        elif match.group("inline").startswith("= "):
+            expressions.append(match.group("inline")[2:])
+
+    return queries, expressions
+
+
+def collect_field_paths(queries, expressions) -> list[tuple[str, ...]] | None:
+    """Returns paths of metadata fields that are referenced by queries and inline expressions.
+
+    Returns None if all fields can be referenced, e.g. when a query references the whole
+    `metadata` object or can't be parsed.
+
+    Example: [("tags",), ("title",), ("cprop", "nestedA")]
+    """
+    identifiers = set()
+    try:
+        for query in queries:
+            identifiers.update(QueryService(query).get_identifiers())
+
+        for expression in expressions:
+            collector = IdentifiersCollector()
+            collector.visit(ExpressionSolverService(expression).tree)
+            identifiers.update(collector.identifiers)
+    except LarkError:
+        return None
+
+    paths = [(field,) for field in ALWAYS_KEPT_FIELDS]
+    for identifier in identifiers:
+        if identifier in WHOLE_METADATA_IDENTIFIERS:
+            return None
+
+        for steps in _metadata_steps(parse_path(identifier)):
+            # lists are kept whole, e.g. `metadata.authors[0].name` keeps `authors`
+            keys = tuple(itertools.takewhile(lambda step: isinstance(step, str), steps))
+            if not keys:
+                return None
+            paths.append(keys)
+
+    return paths
+
+
+def _metadata_steps(steps):
+    """yields steps of the identifier in metadata of the queried file (or `this`) and
+    of linked notes, e.g. ("series", "metadata", "title") and ("title",) for
+    `metadata.series.metadata.title`"""
+    for prefix in (("metadata",), ("this", "metadata")):
+        if steps[:len(prefix)] == prefix:
+            yield steps[len(prefix):]
+
+    position = dereference_position(steps)
+    while position is not None:
+        steps = steps[position:]
+        if steps[0] == "metadata":
+            yield steps[1:]
+        position = dereference_position(steps)
+
+
+def build_projection(paths) -> dict:
+    """Builds a tree of projected fields, `True` marks the fields that are kept whole."""
+    projection = {}
+    for path in paths:
+        node = projection
+        for key in path[:-1]:
+            child = node.setdefault(key, {})
+            if child is True:
+                break
+            node = child
+        else:
+            node[path[-1]] = True
+
+    return projection
+
+
+def project_metadata(metadata, projection):
+    """Returns a copy of metadata that contains only fields from projection."""
+    if projection is True or not isinstance(metadata, dict):
+        return metadata
+
+    return {
+        key: project_metadata(metadata[key], sub_projection)
+        for key, sub_projection in projection.items()
+        if key in metadata
+    }
+
+
+def apply_projection(sources: dict, paths) -> None:
+    """Drops metadata fields that are not in paths from all records of sources (in place)."""
+    if paths is None:
+        return
+
+    projection = build_projection(paths)
+    for record in sources.values():
+        record["metadata"] = project_metadata(record["metadata"], projection)
+        if hasattr(record["file"], "metadata"):
+            record["file"].metadata = record["metadata"]
@@ -0,0 +1,85 @@
+"""
+This module builds the index in several processes (map-reduce).
+
+The list of files is split into contiguous shards. Every worker indexes its shard
+into a partial index (SimpleMemoryIndex) and the parent merges partial indexes in
+the order of shards, so the merged index is the same as one built serially.
+
+Typical usage::
+    files = [("docs/a.md", "a/index.html", "a.md"), ...]
+    page_queries = build_sharded_index(builder, files, workers=4)
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import frontmatter
+
+from .index import SimpleMemoryIndex, build_index
+from .md_renderer import has_dataview_content
+from .parallel import resolve_workers
+from .projection import extract_queries
+from ..tracing import Tracer
+
+
+def split_shards(items: list, shards: int) -> list[list]:
+    """Splits items into at most `shards` contiguous parts of almost equal size, no
+    parts for no items"""
+    if not items:
+        return []
+    shards = max(1, min(shards, len(items)))
+    size, rest = divmod(len(items), shards)
+    result = []
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < rest else 0)
+        result.append(items[start:end])
+        start = end
+    return result
+
+
+def index_shard(files, tracer=None, content=False, links=False):
+    """Indexes files of a single shard.
+
+    `files` is a list of (file_path, target_url, src_uri), see `build_index`.
+    Contents of files are indexed too if `content` is set (see content_index.py),
+    links between files if `links` is set (see links.py).
+    Returns (partial index, {file_path: (queries, expressions)}), the latter has
+    dataview queries of the files that have them (see projection.extract_queries).
+    """
+    tracer = tracer if tracer is not None else Tracer()
+    partial = SimpleMemoryIndex(content, links)
+    page_queries = {}
+    for file_path, target_url, src_uri in files:
+        trace = tracer.page(src_uri if src_uri is not None else file_path)
+        trace("load file %s", file_path)
+
+        with open(file_path, 'r', encoding="utf-8-sig") as file:
+            data = frontmatter.load(file)
+        trace("metadata: %s", data.metadata)
+
+        build_index(data, file_path, target_url, partial, src_uri)
+        if has_dataview_content(data.content):
+            page_queries[file_path] = extract_queries(data.content)
+
+    return partial, page_queries
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def build_sharded_index(builder, files, workers, tracer=None, content=False, links=False) -> dict:
+    """Indexes `files` in `workers` processes and merges results into `builder`.
+
+    Returns {file_path: (queries, expressions)} of all files, see `index_shard`.
+    """
+    shards = split_shards(files, resolve_workers(workers))
+    page_queries = {}
+    if not shards:
+        return page_queries
+    with ProcessPoolExecutor(len(shards)) as executor:
+        results = executor.map(
+            index_shard, shards, [tracer] * len(shards), [content] * len(shards),
+            [links] * len(shards),
+        )
+        for partial, shard_queries in results:
+            builder.merge(partial)
+            page_queries.update(shard_queries)
+
+    return page_queries
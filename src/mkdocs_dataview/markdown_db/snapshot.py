@@ -0,0 +1,499 @@
+"""
+This module implements a compact binary snapshot of the built index.
+
+The snapshot is written once by the parent process and opened with `mmap` by
+worker processes, so all of them share one copy of it in the page cache instead
+of unpickling the whole index each. Records are decoded on every access and not
+kept, queries decode only the rows they preselect with tag posting lists and
+sorted field arrays (see `SnapshotIndex.select`).
+
+File layout (little-endian)::
+
+    header      magic, version, section counts and offsets (HEADER)
+    strings     string table: (offset, length) entries followed by utf-8 data
+    rows        (key string id, data offset, data length) per record, in index order
+    tags        (tag string id, offset, count) entries into the postings array, the
+                entry of NO_STRING lists rows whose `tags` is not a list
+    fields      (field string id, offset, count) entries into the sorted array
+    postings    uint32 row numbers of tag posting lists
+    sorted      uint32 row numbers of every top-level field, ordered by value
+    data        encoded records (see _Encoder)
+
+Typical usage::
+    write_snapshot("index.snapshot", sources)
+
+    with SnapshotIndex("index.snapshot") as index:
+        record = index["docs/a.md"]
+        books = index.tags["book"]
+        for key, record in index.select(qs):  # qs is an optimized QueryService
+            ...
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+import datetime
+from itertools import accumulate
+import math
+import mmap
+import pickle
+import struct
+
+from lark import Tree
+
+from .index import FileAttributes
+from .sqlite_index import MIRRORED, folded_constant, indexed_identifier
+
+MAGIC = b"MDVSNAP\0"
+VERSION = 2
+# string id of the list of rows with `tags` that are not lists
+NO_STRING = 0xFFFFFFFF
+
+HEADER = struct.Struct("<8sIIIIIQQQQQQQ")
+STRING_ENTRY = struct.Struct("<QI")
+ROW_ENTRY = struct.Struct("<IQI")
+LIST_ENTRY = struct.Struct("<IQI")
+
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+# value tags of the record encoding
+T_NONE, T_TRUE, T_FALSE, T_INT, T_FLOAT, T_STR, T_LIST, T_DICT, T_DATE, T_DATETIME, \
+    T_FILE, T_PICKLE = b"NTFidslmDWAP"
+
+
+class SnapshotError(Exception):
+    """Raised on files that are not snapshots or are of unsupported version"""
+
+
+def _sort_key(value):
+    """Key of scalar values in sorted field arrays: numbers, strings, dates, datetimes"""
+    if isinstance(value, bool) or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, float)):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    if isinstance(value, datetime.datetime):
+        return (3, value.isoformat())
+    if isinstance(value, datetime.date):
+        return (2, value.toordinal())
+    return None
+
+
+class _Encoder:
+    """Encodes records into the data section and interns strings"""
+    def __init__(self):
+        self.strings = {}
+        self.data = bytearray()
+
+    def string_id(self, value: str) -> int:
+        """Returns id of the string in the string table"""
+        sid = self.strings.get(value)
+        if sid is None:
+            sid = self.strings[value] = len(self.strings)
+        return sid
+
+    def encode(self, value) -> None:  # pylint: disable=too-many-branches
+        """Appends encoded value to data"""
+        data = self.data
+        if value is None:
+            data.append(T_NONE)
+        elif value is True:
+            data.append(T_TRUE)
+        elif value is False:
+            data.append(T_FALSE)
+        elif isinstance(value, int) and -2**63 <= value < 2**63:
+            data.append(T_INT)
+            data += _I64.pack(value)
+        elif isinstance(value, float):
+            data.append(T_FLOAT)
+            data += _F64.pack(value)
+        elif isinstance(value, str):
+            data.append(T_STR)
+            data += _U32.pack(self.string_id(value))
+        elif isinstance(value, FileAttributes):
+            data.append(T_FILE)
+            for part in (value.src_path, value['path'], value.src_uri):
+                data += _U32.pack(self.string_id(part))
+        elif type(value) is list:  # pylint: disable=unidiomatic-typecheck
+            data.append(T_LIST)
+            data += _U32.pack(len(value))
+            for item in value:
+                self.encode(item)
+        elif type(value) is dict:  # pylint: disable=unidiomatic-typecheck
+            data.append(T_DICT)
+            data += _U32.pack(len(value))
+            for key, item in value.items():
+                self.encode(key)
+                self.encode(item)
+        elif isinstance(value, datetime.datetime):
+            data.append(T_DATETIME)
+            data += _U32.pack(self.string_id(value.isoformat()))
+        elif isinstance(value, datetime.date):
+            data.append(T_DATE)
+            data += _U32.pack(value.toordinal())
+        else:
+            encoded = pickle.dumps(value)
+            data.append(T_PICKLE)
+            data += _U32.pack(len(encoded))
+            data += encoded
+
+
+def _encode_rows(encoder: _Encoder, sources: dict):
+    """Encodes records, returns row entries, rows of tags and sortable field values"""
+    rows = []
+    tags = {}
+    fields = {}
+    for row, (key, record) in enumerate(sources.items()):
+        offset = len(encoder.data)
+        encoder.encode(record['file'])
+        encoder.encode(record['metadata'])
+        rows.append((encoder.string_id(key), offset, len(encoder.data) - offset))
+
+        for field, value in record['metadata'].items():
+            sort_key = _sort_key(value) if isinstance(field, str) else None
+            if sort_key is not None:
+                fields.setdefault(field, []).append((sort_key, row))
+
+        # the same records as md_renderer.match_sources finds by `tags`
+        if 'tags' not in record['metadata']:
+            continue
+        record_tags = record['metadata']['tags']
+        if not isinstance(record_tags, list):
+            tags.setdefault(None, []).append(row)
+            continue
+        for tag in record_tags:
+            tag_rows = tags.setdefault(tag, []) if isinstance(tag, str) else None
+            if tag_rows is not None and tag_rows[-1:] != [row]:
+                tag_rows.append(row)
+    return rows, tags, fields
+
+
+def _row_lists(encoder: _Encoder, lists) -> tuple[list, array]:
+    """Packs (name, row numbers) pairs into list entries and a single rows array"""
+    entries = []
+    rows = array("I")
+    for name, numbers in lists:
+        sid = NO_STRING if name is None else encoder.string_id(name)
+        entries.append((sid, len(rows), len(numbers)))
+        rows.extend(numbers)
+    return entries, rows
+
+
+def _string_table(encoder: _Encoder) -> bytes:
+    strings = [s.encode("utf-8") for s in encoder.strings]
+    entries = bytearray()
+    offset = 0
+    for value in strings:
+        entries += STRING_ENTRY.pack(offset, len(value))
+        offset += len(value)
+    return bytes(entries) + b"".join(strings)
+
+
+def write_snapshot(path: str, sources: dict) -> None:
+    """Writes `sources` with posting lists of their `tags` to `path`"""
+    encoder = _Encoder()
+    rows, tags, fields = _encode_rows(encoder, sources)
+
+    tag_entries, postings = _row_lists(encoder, tags.items())
+    field_entries, sorted_rows = _row_lists(encoder, (
+        (field, [row for _, row in sorted(values)]) for field, values in fields.items()
+    ))
+
+    # the string table is complete only when everything else is encoded
+    sections = [
+        b"".join(ROW_ENTRY.pack(*entry) for entry in rows),
+        b"".join(LIST_ENTRY.pack(*entry) for entry in tag_entries),
+        b"".join(LIST_ENTRY.pack(*entry) for entry in field_entries),
+        _little_endian(postings),
+        _little_endian(sorted_rows),
+        bytes(encoder.data),
+    ]
+    sections.insert(0, _string_table(encoder))
+
+    offsets = accumulate((len(section) for section in sections[:-1]), initial=HEADER.size)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(
+            MAGIC, VERSION, len(encoder.strings), len(rows), len(tag_entries),
+            len(field_entries), *offsets,
+        ))
+        for section in sections:
+            file.write(section)
+
+
+def _little_endian(values: array) -> bytes:
+    if struct.pack("=I", 1) != _U32.pack(1):
+        values = array("I", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class SnapshotIndex(Mapping):  # pylint: disable=too-many-instance-attributes
+    """Read-only `sources` mapping backed by a memory-mapped snapshot.
+
+    Records are decoded on every access and not memoized, so a process holds only
+    the records that are in use. Don't modify them, they are not written back.
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+
+        (magic, version, self._strings_count, self._rows_count, self._tags_count,
+         self._fields_count, self._strings_offset, self._rows_offset, self._tags_offset,
+         self._fields_offset, self._postings_offset, self._sorted_offset,
+         self._data_offset) = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"{path} is not an index snapshot of version {VERSION}")
+
+        self._strings = [None] * self._strings_count
+        self._keys = None
+        self._lists = {}
+        self.tags = _TagsView(self)
+
+    def close(self) -> None:
+        """Releases the memory map, decoded records stay valid"""
+        self._buffer.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, sid: int) -> str:
+        """Returns a string of the string table"""
+        value = self._strings[sid]
+        if value is None:
+            base = self._strings_offset
+            offset, length = STRING_ENTRY.unpack_from(self._buffer, base + sid * STRING_ENTRY.size)
+            start = base + self._strings_count * STRING_ENTRY.size + offset
+            value = self._strings[sid] = str(self._buffer[start:start + length], "utf-8")
+        return value
+
+    def key(self, row: int) -> str:
+        """Returns the key (file path) of the row"""
+        sid, _, _ = ROW_ENTRY.unpack_from(self._buffer, self._rows_offset + row * ROW_ENTRY.size)
+        return self.string(sid)
+
+    def _data_position(self, row: int) -> int:
+        _, offset, _ = ROW_ENTRY.unpack_from(self._buffer, self._rows_offset + row * ROW_ENTRY.size)
+        return self._data_offset + offset
+
+    def record(self, row: int) -> dict:
+        """Returns decoded record of the row (decoded again on every call)"""
+        file_attributes, pos = self._decode(self._data_position(row))
+        metadata, pos = self._decode(pos)
+        if isinstance(file_attributes, tuple):
+            file_attributes = FileAttributes(*file_attributes, metadata)
+        return {"metadata": metadata, "file": file_attributes}
+
+    def _file_path(self, row: int) -> str:
+        """Returns `file.path` of the row without decoding its metadata"""
+        file_attributes, _ = self._decode(self._data_position(row))
+        if isinstance(file_attributes, tuple):
+            return file_attributes[1]
+        return file_attributes['path']
+
+    def _field_key(self, row: int, field: str):
+        """Returns the sort key of a top-level metadata field of the row"""
+        _, pos = self._decode(self._data_position(row))
+        metadata, _ = self._decode(pos)
+        return _sort_key(metadata.get(field))
+
+    def _decode(self, pos: int):  # pylint: disable=too-many-return-statements
+        """Decodes a value at `pos`, returns it and position of the next value"""
+        buffer = self._buffer
+        tag = buffer[pos]
+        pos += 1
+        if tag == T_STR:
+            return self.string(_U32.unpack_from(buffer, pos)[0]), pos + 4
+        if tag == T_INT:
+            return _I64.unpack_from(buffer, pos)[0], pos + 8
+        if tag == T_DICT:
+            (count,) = _U32.unpack_from(buffer, pos)
+            pos += 4
+            value = {}
+            for _ in range(count):
+                key, pos = self._decode(pos)
+                value[key], pos = self._decode(pos)
+            return value, pos
+        if tag == T_LIST:
+            (count,) = _U32.unpack_from(buffer, pos)
+            pos += 4
+            value = []
+            for _ in range(count):
+                item, pos = self._decode(pos)
+                value.append(item)
+            return value, pos
+        if tag in (T_NONE, T_TRUE, T_FALSE):
+            return {T_NONE: None, T_TRUE: True, T_FALSE: False}[tag], pos
+        if tag == T_FLOAT:
+            return _F64.unpack_from(buffer, pos)[0], pos + 8
+        if tag == T_DATE:
+            return datetime.date.fromordinal(_U32.unpack_from(buffer, pos)[0]), pos + 4
+        if tag == T_DATETIME:
+            value = self.string(_U32.unpack_from(buffer, pos)[0])
+            return datetime.datetime.fromisoformat(value), pos + 4
+        if tag == T_FILE:
+            parts = struct.unpack_from("<III", buffer, pos)
+            return tuple(self.string(sid) for sid in parts), pos + 12
+        if tag == T_PICKLE:
+            (length,) = _U32.unpack_from(buffer, pos)
+            pos += 4
+            return pickle.loads(buffer[pos:pos + length]), pos + length
+        raise SnapshotError(f"unknown value tag {tag} at {pos - 1}")
+
+    def _list_entries(self, offset: int, count: int, array_offset: int) -> dict:
+        entries = {}
+        for i in range(count):
+            sid, start, length = LIST_ENTRY.unpack_from(self._buffer, offset + i * LIST_ENTRY.size)
+            name = None if sid == NO_STRING else self.string(sid)
+            entries[name] = (array_offset + start * 4, length)
+        return entries
+
+    def entries(self, kind: str) -> dict:
+        """Returns {name: (position, count)} of "tags" posting lists or "fields" arrays"""
+        if kind not in self._lists:
+            if kind == "tags":
+                self._lists[kind] = self._list_entries(
+                    self._tags_offset, self._tags_count, self._postings_offset
+                )
+            else:
+                self._lists[kind] = self._list_entries(
+                    self._fields_offset, self._fields_count, self._sorted_offset
+                )
+        return self._lists[kind]
+
+    def _rows_of(self, kind: str, name: str) -> list[int]:
+        entry = self.entries(kind).get(name)
+        if entry is None:
+            return []
+        start, length = entry
+        return list(struct.unpack_from(f"<{length}I", self._buffer, start))
+
+    def tag_rows(self, tag: str) -> list[int]:
+        """Returns row numbers of files with the tag"""
+        return self._rows_of("tags", tag)
+
+    def sorted_rows(self, field: str) -> list[int]:
+        """Returns row numbers of files with a scalar top-level metadata `field`, ordered
+        by its value (numbers, then strings, dates and datetimes)"""
+        return self._rows_of("fields", field)
+
+    def select(self, qs, use_from: bool = True):
+        """Returns (key, record) of rows that may match the optimized query `qs`
+        (see QueryService.optimize), in index order.
+
+        Rows are preselected by posting lists of FROM tags and by path sources, and
+        comparisons of top-level fields with constants that the WHERE clause requires
+        drop rows whose values of the same type fail them (with the sorted field
+        arrays). Anything else is left to the renderer.
+        """
+        rows = None
+        if use_from:
+            for source in qs.get_sources():
+                if source["type"] == "tag":
+                    tagged = set(self.tag_rows(source["value"])) | set(self.tag_rows(None))
+                    rows = tagged if rows is None else rows & tagged
+        rows = sorted(rows) if rows is not None else range(self._rows_count)
+
+        excluded = set()
+        # WHERE may reference values bound by FLATTEN, such rows are selected by FROM only
+        if not qs.flatten_clauses:
+            for field, op, value in _required_comparisons(qs.where_tree):
+                excluded.update(self._failing_rows(field, op, value))
+
+        prefixes = [s["value"] for s in qs.get_sources() if s["type"] == "path"] \
+            if use_from else []
+        for row in rows:
+            if row in excluded:
+                continue
+            if prefixes and not all(self._file_path(row).startswith(p) for p in prefixes):
+                continue
+            yield self.key(row), self.record(row)
+
+    def _failing_rows(self, field: str, op: str, value) -> list[int]:
+        """Returns rows whose `field` has a value of the same type as `value` (but not a
+        datetime, they are not ordered by time) that fails `field <op> value`"""
+        key = _sort_key(value)
+        if key is None or isinstance(value, datetime.datetime):
+            return []
+
+        rows = self.sorted_rows(field)
+        def row_key(row):
+            return self._field_key(row, field)
+        start = bisect_left(rows, (key[0],), key=row_key)
+        end = bisect_left(rows, (key[0] + 1,), lo=start, key=row_key)
+        lower = bisect_left(rows, key, lo=start, hi=end, key=row_key)
+        upper = bisect_right(rows, key, lo=lower, hi=end, key=row_key)
+
+        failing = {
+            "lt_op": (lower, end), "lte_op": (upper, end),
+            "gt_op": (start, upper), "gte_op": (start, lower),
+        }
+        if op == "eq_op":
+            return rows[start:lower] + rows[upper:end]
+        begin, finish = failing[op]
+        return rows[begin:finish]
+
+    def __len__(self):
+        return self._rows_count
+
+    def __iter__(self):
+        for row in range(self._rows_count):
+            yield self.key(row)
+
+    def __getitem__(self, key):
+        if self._keys is None:
+            self._keys = {k: row for row, k in enumerate(self)}
+        return self.record(self._keys[key])
+
+    def items(self):
+        for row in range(self._rows_count):
+            yield self.key(row), self.record(row)
+
+    def values(self):
+        for row in range(self._rows_count):
+            yield self.record(row)
+
+
+class _TagsView(Mapping):
+    """`tags` of the snapshot, tag -> records"""
+    def __init__(self, index: SnapshotIndex):
+        self.index = index
+
+    def __getitem__(self, tag):
+        rows = self.index.tag_rows(tag) if tag is not None else None
+        if not rows:
+            raise KeyError(tag)
+        return [self.index.record(row) for row in rows]
+
+    def __iter__(self):
+        return (tag for tag in self.index.entries("tags") if tag is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def _required_comparisons(tree):
+    """Yields (field, op, constant) of `metadata.<field> <op> <constant>` comparisons of
+    top-level fields that all matching rows pass (operands of the top-level AND)"""
+    if not isinstance(tree, Tree):
+        return
+    if tree.data in ("where_clause", "shared"):
+        yield from _required_comparisons(tree.children[-1])
+    elif tree.data == "and_op":
+        for child in tree.children:
+            yield from _required_comparisons(child)
+    elif tree.data in MIRRORED and tree.data != "neq_op":
+        left, right = tree.children
+        op = tree.data
+        if folded_constant(left) is not None:
+            left, right, op = right, left, MIRRORED[op]
+        name = indexed_identifier(left)
+        value = folded_constant(right)
+        if name and name.startswith("metadata.") and "." not in name[9:] and value is not None:
+            yield name[9:], op, value[0]
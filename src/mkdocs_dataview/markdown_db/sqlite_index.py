@@ -0,0 +1,533 @@
+"""
+This module implements an IndexBuilder that stores the index in SQLite.
+
+Records are stored as tagged JSON (see tagged_json.py) in the `files` table, so the
+index can live in a file on disk instead of memory. A database file is reused by the
+next build: files that didn't change since they were indexed (by mtime and size) are
+not read again, see `SQLiteIndex.start_build`. Metadata is also flattened into the
+indexed `fields` table (one row per value, list items are rows of their own) and
+WHERE/FROM clauses are translated into SQL to preselect candidate rows (see
+`SQLiteIndex.select`). Values are stored normalized as their sort keys (see
+query/values.py): a type rank and a number (numbers, dates as epoch days) or a
+string, so comparisons of values of any types are answered by the index the same
+way as by queries.
+
+The translated condition is never stricter than the query: it selects every row
+that may match. Parts of the query that can't be translated (function calls, math,
+`file.*` attributes other than `path` and `name`, ...) select all rows, and the
+renderer still evaluates the whole WHERE clause on the candidates in Python.
+
+Typical usage::
+    index = SQLiteIndex("index.sqlite3")
+    build_index(data, file_path, target_url, index)
+    ...
+    qs = QueryService(query)
+    qs.optimize(this_metadata)
+    for key, record in index.select(qs):
+        if qs.where(...):
+            ...
+"""
+from collections import Counter
+from collections.abc import Mapping
+import datetime
+import json
+import math
+import os
+import sqlite3
+
+from lark import Tree
+
+from ..query.accessors import dereference_position, parse_path
+from ..query.values import (
+    RANK_DATE, RANK_LIST, RANK_NULL, RANK_NUMBER, RANK_OBJECT, RANK_OTHER, RANK_STRING,
+    epoch_days,
+)
+from .. import __version__
+from .index import FileAttributes, IndexBuilder
+from .md_renderer import has_dataview_content
+from .projection import extract_queries
+from .tagged_json import from_json, to_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, key TEXT UNIQUE, path TEXT, name TEXT, record BLOB,
+    position INTEGER, mtime REAL, size INTEGER, queries BLOB
+);
+CREATE TABLE IF NOT EXISTS fields (
+    file_id INTEGER, name TEXT, item INTEGER, rank INTEGER, num REAL, str TEXT
+);
+CREATE TABLE IF NOT EXISTS tags (tag TEXT, file_id INTEGER);
+CREATE INDEX IF NOT EXISTS fields_num ON fields (name, rank, num);
+CREATE INDEX IF NOT EXISTS fields_str ON fields (name, rank, str);
+CREATE INDEX IF NOT EXISTS fields_file ON fields (file_id);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+CREATE INDEX IF NOT EXISTS tags_file ON tags (file_id);
+"""
+DROP_SCHEMA = """
+DROP TABLE IF EXISTS meta;
+DROP TABLE IF EXISTS files;
+DROP TABLE IF EXISTS fields;
+DROP TABLE IF EXISTS tags;
+"""
+# bump it when the tables or stored records change, databases of other versions are
+# recreated
+SCHEMA_VERSION = "3"
+
+# numbers beyond that are not exactly comparable as SQLite REAL
+MAX_EXACT_NUMBER = 2**53
+
+_TRUE = ("1", [])
+_FALSE = ("0", [])
+
+# comparison with swapped operands: `c < x` is `x > c`
+MIRRORED = {
+    "eq_op": "eq_op", "neq_op": "neq_op",
+    "lt_op": "gt_op", "gt_op": "lt_op", "lte_op": "gte_op", "gte_op": "lte_op",
+}
+_SQL_OPERATORS = {"eq_op": "=", "lt_op": "<", "gt_op": ">", "lte_op": "<=", "gte_op": ">="}
+
+
+def _flatten(name: str, value, rows: list, item: int = 0) -> None:
+    """Appends (name, item, rank, num, str) rows of a metadata value"""
+    # missing values and None are both seen as '' by queries (see ExpressionSolver)
+    if value is None or value == '':
+        rows.append((name, item, RANK_NULL, None, None))
+    elif isinstance(value, (bool, int, float)):
+        rows.append((name, item, RANK_NUMBER, _number_key(value), None))
+    elif isinstance(value, datetime.date):
+        rows.append((name, item, RANK_DATE, epoch_days(value), None))
+    elif isinstance(value, str):
+        rows.append((name, item, RANK_STRING, None, value))
+    elif isinstance(value, list):
+        rows.append((name, item, RANK_LIST, None, None))
+        if not item:
+            for v in value:
+                _flatten(name, v, rows, 1)
+    elif isinstance(value, dict):
+        rows.append((name, item, RANK_OBJECT, None, None))
+        if not item:
+            for k, v in value.items():
+                if isinstance(k, str):
+                    _flatten(f"{name}.{k}", v, rows)
+    else:
+        rows.append((name, item, RANK_OTHER, None, None))
+
+
+def _number_key(value) -> float:
+    """Returns the REAL column value of a number. Numbers outside `MAX_EXACT_NUMBER`
+    are compared only with constants inside it (see `_comparable`), so integers too
+    big for a float are stored as infinity, which keeps them in order."""
+    try:
+        return float(value)
+    except OverflowError:
+        return math.inf if value > 0 else -math.inf
+
+
+def _file_stamp(file_path: str) -> tuple:
+    """Returns (mtime, size) of a file, (None, None) if it doesn't exist"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None, None
+    return stat.st_mtime, stat.st_size
+
+
+def _load_record(data: str) -> dict:
+    """Decodes a stored record, its file attributes share the record's metadata again"""
+    record = from_json(data)
+    if isinstance(record['file'], FileAttributes):
+        record['file'].metadata = record['metadata']
+    return record
+
+
+def _comparable(value) -> tuple | None:
+    """Returns (rank, column, key) of a query constant that can be compared in SQL"""
+    if isinstance(value, bool):
+        return RANK_NUMBER, "num", float(value)
+    if isinstance(value, (int, float)) and -MAX_EXACT_NUMBER < value < MAX_EXACT_NUMBER:
+        return RANK_NUMBER, "num", value
+    if isinstance(value, datetime.date):
+        return RANK_DATE, "num", epoch_days(value)
+    if isinstance(value, str) and value:
+        return RANK_STRING, "str", value
+    return None
+
+
+def _or(*parts):
+    if _TRUE in parts:
+        return _TRUE
+    parts = [p for p in parts if p != _FALSE]
+    if not parts:
+        return _FALSE
+    if len(parts) == 1:
+        return parts[0]
+    return "(" + " OR ".join(p[0] for p in parts) + ")", [x for p in parts for x in p[1]]
+
+
+def _and(*parts):
+    if _FALSE in parts:
+        return _FALSE
+    parts = [p for p in parts if p != _TRUE]
+    if not parts:
+        return _TRUE
+    if len(parts) == 1:
+        return parts[0]
+    return "(" + " AND ".join(p[0] for p in parts) + ")", [x for p in parts for x in p[1]]
+
+
+def _field_exists(name: str, condition: str = "", params=()):
+    sql = "EXISTS (SELECT 1 FROM fields f WHERE f.file_id = files.id AND f.name = ?"
+    return sql + condition + ")", [name, *params]
+
+
+class WhereTranslator:  # pylint: disable=too-few-public-methods
+    """Translates optimized WHERE trees (see QueryService.optimize) into SQL conditions
+    on the `files` table that select a superset of matching rows.
+
+    `translate(tree)` returns (sql, params). NOT is pushed down to comparisons
+    (negation normal form), `translate(tree, negated=True)` selects a superset of
+    rows where the tree is false.
+    """
+    # pylint: disable=too-many-return-statements
+    def translate(self, tree, negated: bool = False):
+        """Returns (sql, params) condition"""
+        if not isinstance(tree, Tree):
+            return _TRUE
+
+        op = tree.data
+        if op in ("where_clause", "shared"):
+            return self.translate(tree.children[-1], negated)
+        if op == "constant":
+            return _FALSE if bool(tree.children[0]) == negated else _TRUE
+        if op == "not_op":
+            return self.translate(tree.children[0], not negated)
+        if op in ("and_op", "or_op"):
+            left = self.translate(tree.children[0], negated)
+            right = self.translate(tree.children[1], negated)
+            # De Morgan: NOT (a AND b) is (NOT a) OR (NOT b)
+            if (op == "and_op") != negated:
+                return _and(left, right)
+            return _or(left, right)
+        if op in MIRRORED:
+            return self._comparison(op, tree.children, negated)
+        if op in ("in_op", "contains_op"):
+            if negated:
+                return _TRUE
+            needle, haystack = tree.children
+            if op == "contains_op":
+                needle, haystack = haystack, needle
+            return self._membership(needle, haystack)
+        return _TRUE
+
+    def _comparison(self, op, children, negated):
+        left, right = children
+        if indexed_identifier(right) is not None and folded_constant(left) is not None:
+            op = MIRRORED[op]
+            left, right = right, left
+
+        name = indexed_identifier(left)
+        value = folded_constant(right)
+        if name is None or value is None:
+            return _TRUE
+        key = _comparable(value[0])
+        if key is None:
+            return _TRUE
+
+        # `x != c` is NOT `x == c`
+        if op == "neq_op":
+            op, negated = "eq_op", not negated
+        if negated:
+            # only string equality is exact enough to be negated
+            if op != "eq_op" or key[0] != RANK_STRING:
+                return _TRUE
+            sql, params = self._compare(name, op, key)
+            return f"NOT {sql}", params
+
+        return self._compare(name, op, key)
+
+    @staticmethod
+    def _compare(name, op, key):
+        rank, column, value = key
+        if name in ("file.path", "file.name"):
+            if rank != RANK_STRING:
+                # strings are never equal to values of other types, ordering is by rank
+                return _FALSE if op == "eq_op" else _TRUE
+            return f"files.{name[5:]} {_SQL_OPERATORS[op]} ?", [value]
+
+        same_rank = f"f.rank = ? AND f.{column} {_SQL_OPERATORS[op]} ?"
+        if op == "eq_op":
+            return _field_exists(name[9:], " AND f.item = 0 AND " + same_rank, (rank, value))
+
+        # values of other types are ordered by their rank (see query/values.py)
+        lower = op in ("lt_op", "lte_op")
+        other_rank = "f.rank < ?" if lower else "f.rank > ?"
+        sql = _field_exists(
+            name[9:], f" AND f.item = 0 AND ({other_rank} OR {same_rank})", (rank, rank, value)
+        )
+        if lower:
+            # missing values are null, which is less than any other value
+            missing, params = _field_exists(name[9:], " AND f.item = 0")
+            return _or(sql, ("NOT " + missing, params))
+        return sql
+
+    def _membership(self, needle, haystack):
+        """`needle IN haystack`"""
+        name = indexed_identifier(needle)
+        values = folded_constant(haystack)
+        if name is not None and values is not None and isinstance(values[0], list):
+            # x IN [a, b] is x == a OR x == b
+            return _or(*(self._comparison("eq_op", [needle, Tree("constant", [v])], False)
+                         for v in values[0]))
+
+        name = indexed_identifier(haystack)
+        value = folded_constant(needle)
+        if name is None or value is None or not name.startswith("metadata."):
+            return _TRUE
+        return membership_condition(name[9:], value[0])
+
+
+def membership_condition(name: str, value):
+    """SQL condition (superset) of `value in metadata.<name>`: an item of a list, a
+    substring of a string or a key of a dict"""
+    key = _comparable(value)
+    if key is None:
+        return _TRUE
+
+    rank, column, value = key
+    item = _field_exists(name, f" AND f.item = 1 AND f.rank = ? AND f.{column} = ?", (rank, value))
+    dict_key = _field_exists(name, " AND f.item = 0 AND f.rank = ?", (RANK_OBJECT,))
+    if rank != RANK_STRING:
+        return _or(item, dict_key)
+    substring = _field_exists(
+        name, " AND f.item = 0 AND f.rank = ? AND instr(f.str, ?) > 0", (RANK_STRING, value)
+    )
+    return _or(item, substring, dict_key)
+
+
+def indexed_identifier(tree) -> str | None:
+    """Returns name of `metadata.*`, `file.path` or `file.name` identifier"""
+    if isinstance(tree, Tree) and tree.data == "shared":
+        tree = tree.children[1]
+    if not isinstance(tree, Tree) or tree.data != "identifier":
+        return None
+    name = tree.children[0].value
+    if name.startswith('`'):
+        name = name[1:-1]
+    if name in ("file.path", "file.name"):
+        return name
+    # list indices (`metadata.a[0]`) and links to other notes are not translated
+    if name.startswith("metadata.") and "[" not in name \
+            and dereference_position(parse_path(name)) is None:
+        return name
+    return None
+
+
+def folded_constant(tree) -> tuple | None:
+    """Returns (value,) of a folded constant"""
+    if isinstance(tree, Tree) and tree.data == "constant":
+        return (tree.children[0],)
+    return None
+
+
+def sources_condition(sources: list):
+    """SQL condition of FROM clause sources, the same as md_renderer.match_sources"""
+    parts = []
+    for source in sources:
+        if source["type"] == "tag":
+            parts.append(membership_condition("tags", source["value"]))
+        elif source["type"] == "path":
+            parts.append(("substr(files.path, 1, ?) = ?", [len(source["value"]), source["value"]]))
+    return _and(*parts)
+
+
+class SQLiteIndex(IndexBuilder, Mapping):
+    """Index stored in SQLite (a file or ":memory:").
+
+    It's a read-only mapping of records like `sources` of SimpleMemoryIndex. Records
+    are decoded on every access, so changes of them are not stored. Records are
+    ordered as they were added, or as the keys given to `start_build`.
+    """
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        version = f"{SCHEMA_VERSION}:{__version__}"
+        try:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row is None or row[0] != version:
+            self.db.executescript(DROP_SCHEMA)
+        self.db.executescript(SCHEMA)
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+        self.field_stats = Counter()
+        self.tags = _SQLiteTags(self)
+        self._file_ids = {}
+        self._positions = {}
+        self._next_position = 0
+
+    def start_build(self, files, reuse: bool = True) -> dict:
+        """Prepares the database for indexing `files`, a list of (file_path, target_url,
+        src_uri) (see `build_index`): removes records of other files and orders records
+        as the list.
+
+        Returns {file_path: queries} of the files that are stored with the same mtime,
+        size and target url, their records are reused and they need no indexing (with
+        `reuse`). `queries` are dataview queries of the file, see `add_content`.
+        """
+        stored = {
+            key: (file_id, path, mtime, size)
+            for file_id, key, path, mtime, size in self.db.execute(
+                "SELECT id, key, path, mtime, size FROM files"
+            )
+        }
+        keys = {file_path for file_path, _, _ in files}
+        removed = [(file_id,) for key, (file_id, *_) in stored.items() if key not in keys]
+        for table, column in (("files", "id"), ("fields", "file_id"), ("tags", "file_id")):
+            self.db.executemany(f"DELETE FROM {table} WHERE {column} = ?", removed)
+
+        self._positions = {file_path: i for i, (file_path, _, _) in enumerate(files)}
+        self._next_position = len(files)
+        self.db.executemany(
+            "UPDATE files SET position = ? WHERE key = ?",
+            ((i, key) for key, i in self._positions.items() if key in stored),
+        )
+
+        reused = {}
+        for file_path, target_url, _ in files:
+            if not reuse or file_path not in stored:
+                continue
+            file_id, path, mtime, size = stored[file_path]
+            if path == target_url and (mtime, size) == _file_stamp(file_path):
+                reused[file_path] = file_id
+        return self._reuse(reused)
+
+    def _reuse(self, file_ids: dict) -> dict:
+        result = {}
+        for key, file_id in file_ids.items():
+            record, queries = self.db.execute(
+                "SELECT record, queries FROM files WHERE id = ?", (file_id,)
+            ).fetchone()
+            self.field_stats.update(from_json(record)['metadata'].keys())
+            result[key] = from_json(queries) if queries is not None else []
+        return result
+
+    def commit(self) -> None:
+        """Writes added records to the database file"""
+        self.db.commit()
+
+    def close(self) -> None:
+        """Commits and closes the database"""
+        self.db.commit()
+        self.db.close()
+
+    def add_file(self, file_path: str, metadata: dict) -> None:
+        record = metadata
+        row = self.db.execute("SELECT id FROM files WHERE key = ?", (file_path,)).fetchone()
+        position = self._positions.get(file_path)
+        if position is None:
+            position = self._next_position
+            self._next_position += 1
+        values = (
+            record['file'].get('path'), record['file'].get('name'),
+            json.dumps(to_json(record)), position, *_file_stamp(file_path),
+        )
+        if row is None:
+            file_id = self.db.execute(
+                "INSERT INTO files (key, path, name, record, position, mtime, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_path, *values),
+            ).lastrowid
+        else:
+            file_id = row[0]
+            self.db.execute(
+                "UPDATE files SET path = ?, name = ?, record = ?, position = ?, mtime = ?, "
+                "size = ?, queries = NULL WHERE id = ?",
+                (*values, file_id),
+            )
+            self.db.execute("DELETE FROM fields WHERE file_id = ?", (file_id,))
+            self.db.execute("DELETE FROM tags WHERE file_id = ?", (file_id,))
+
+        rows = []
+        for name, value in record['metadata'].items():
+            if isinstance(name, str):
+                _flatten(name, value, rows)
+        self.db.executemany(
+            "INSERT INTO fields (file_id, name, item, rank, num, str) VALUES (?, ?, ?, ?, ?, ?)",
+            ((file_id, *row) for row in rows),
+        )
+        self.field_stats.update(record['metadata'].keys())
+        self._file_ids[id(record)] = file_id
+
+    def add_content(self, file_path: str, content: str) -> None:
+        if has_dataview_content(content):
+            self.set_queries(file_path, extract_queries(content)[0])
+
+    def set_queries(self, file_path: str, queries: list) -> None:
+        """Stores dataview queries of a file, they are returned by `start_build` when the
+        file is reused"""
+        self.db.execute(
+            "UPDATE files SET queries = ? WHERE key = ?", (json.dumps(to_json(queries)), file_path)
+        )
+
+    def add_tag(self, tag: str, metadata: dict) -> None:
+        file_id = self._file_ids.get(id(metadata))
+        if file_id is not None:
+            self.db.execute("INSERT INTO tags (tag, file_id) VALUES (?, ?)", (str(tag), file_id))
+
+    def select(self, qs, use_from: bool = True):
+        """Returns (key, record) of rows that may match the optimized query `qs`
+        (see QueryService.optimize), in the order they were added"""
+        # WHERE may reference values bound by FLATTEN, such rows are selected by FROM only
+        condition = _TRUE if qs.flatten_clauses else WhereTranslator().translate(qs.where_tree)
+        if use_from:
+            condition = _and(sources_condition(qs.get_sources()), condition)
+        return self._records(f"WHERE {condition[0]}", condition[1])
+
+    def _records(self, where: str = "", params=()):
+        cursor = self.db.execute(
+            f"SELECT key, record FROM files {where} ORDER BY position, id", params
+        )
+        for key, record in cursor:
+            yield key, _load_record(record)
+
+    def __getitem__(self, key):
+        row = self.db.execute("SELECT record FROM files WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return _load_record(row[0])
+
+    def __iter__(self):
+        for (key,) in self.db.execute("SELECT key FROM files ORDER BY position, id"):
+            yield key
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM files").fetchone()[0]
+
+    def items(self):
+        return self._records()
+
+    def values(self):
+        for _, record in self._records():
+            yield record
+
+
+class _SQLiteTags(Mapping):
+    """`tags` of SQLiteIndex, tag -> records"""
+    def __init__(self, index: SQLiteIndex):
+        self.index = index
+
+    def __getitem__(self, tag):
+        records = [record for _, record in self.index._records(  # pylint: disable=protected-access
+            "WHERE id IN (SELECT file_id FROM tags WHERE tag = ?)", (str(tag),)
+        )]
+        if not records:
+            raise KeyError(tag)
+        return records
+
+    def __iter__(self):
+        for (tag,) in self.index.db.execute("SELECT DISTINCT tag FROM tags ORDER BY tag"):
+            yield tag
+
+    def __len__(self):
+        return self.index.db.execute("SELECT count(DISTINCT tag) FROM tags").fetchone()[0]
@@ -0,0 +1,81 @@
+"""
+Tagged JSON encoding of metadata values, records and parsed files.
+
+JSON has no dates, tuples, sets, bytes, dicts with keys other than strings or
+classes, so such values are encoded as objects with a single tag key, e.g.
+`{"$date": "2020-01-02"}` (dicts whose keys start with "$" are tagged too, so
+tags are never ambiguous). Unlike pickle, decoding data from an untrusted source
+(a daemon socket, a shared index database) never runs code.
+
+Typical usage::
+    data = json.dumps(to_json(record))
+    record = from_json(data)
+"""
+import base64
+import datetime
+import json
+
+import frontmatter
+
+from .index import FileAttributes
+
+
+# tags of values that JSON can't represent, see to_json
+_DECODERS = {
+    "$dict": dict,
+    "$tuple": tuple,
+    "$set": set,
+    "$date": datetime.date.fromisoformat,
+    "$datetime": datetime.datetime.fromisoformat,
+    "$bytes": base64.b64decode,
+    "$post": lambda parts: _post(*parts),
+    "$file": lambda parts: FileAttributes(*parts),
+}
+
+
+def _post(metadata: dict, content: str) -> frontmatter.Post:
+    post = frontmatter.Post(content)
+    post.metadata.update(metadata)
+    return post
+
+
+def to_json(value):  # pylint: disable=too-many-return-statements
+    """Returns a JSON-compatible form of a value, other types than JSON has are tagged
+    objects like {"$date": "2020-01-02"} (decoded by `from_json`)"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [to_json(item) for item in value]
+    if isinstance(value, FileAttributes):
+        # memoized lazy attributes are not sent, `metadata` is linked by the reader
+        return {"$file": [value.src_path, value['path'], value.src_uri]}
+    if isinstance(value, dict):
+        if all(isinstance(key, str) and not key.startswith("$") for key in value):
+            return {key: to_json(item) for key, item in value.items()}
+        return {"$dict": [[to_json(key), to_json(item)] for key, item in value.items()]}
+    if isinstance(value, tuple):
+        return {"$tuple": [to_json(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {"$set": [to_json(item) for item in value]}
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, bytes):
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, frontmatter.Post):
+        return {"$post": [to_json(value.metadata), value.content]}
+    raise TypeError(f"can't encode values of type {type(value).__name__}")
+
+
+def _decode_object(obj: dict):
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        if tag in _DECODERS:
+            return _DECODERS[tag](value)
+    return obj
+
+
+def from_json(data: bytes):
+    """Decodes a value encoded by `to_json` and serialized as JSON"""
+    return json.loads(data, object_hook=_decode_object)
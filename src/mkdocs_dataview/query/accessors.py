@@ -0,0 +1,110 @@
+"""
+Compiled accessors of identifier paths like `metadata.authors[0].name`.
+
+A path is parsed once into steps (dict keys and list indices) and compiled into a
+function that is reused for every row, so resolving identifiers doesn't split
+strings in the hot loop. Missing values resolve to None: a missing key, an index
+out of range or a step into a value that has no such key or index (e.g. a key of
+a string).
+
+A string value followed by more steps can be a link to another note (e.g.
+`metadata.series.metadata.title` with `series: library/series_a.md`): accessors
+get an optional `resolve` function that returns the record of the linked note,
+so the rest of the path is resolved in that record.
+"""
+import functools
+import re
+
+# compiled accessors are cached by path, the cache is dropped when it gets that big
+MAX_COMPILED_PATHS = 4096
+
+_INDEX_RE = re.compile(r"\[(-?\d+)\]")
+_COMPILED = {}
+
+# keys of records, a step with one of them after a field may dereference a link
+RECORD_KEYS = ("metadata", "file")
+
+
+def parse_path(path: str) -> tuple:
+    """Returns steps of the path: str keys and int list indices
+
+    Example: parse_path("metadata.authors[0].name") == ("metadata", "authors", 0, "name")
+    """
+    if path.startswith('`'):
+        path = path[1:-1]
+
+    steps = []
+    for part in path.split("."):
+        key, *indices = _INDEX_RE.split(part)
+        if key:
+            steps.append(key)
+        # re.split gives [key, index, '', index, '', ...]
+        steps.extend(int(index) for index in indices[::2])
+    return tuple(steps)
+
+
+def dereference_position(steps) -> int | None:
+    """Returns the position of the first step that may dereference a link to a note or
+    None, e.g. 2 for ("metadata", "series", "metadata", "title")"""
+    for position in range(2, len(steps)):
+        if steps[position] in RECORD_KEYS:
+            return position
+    return None
+
+
+def _dereference(data, key, resolve):
+    # strings are dereferenced only on a miss, other rows don't pay for it
+    if resolve is None or not isinstance(data, str):
+        return None
+    record = resolve(data)
+    return record.get(key) if record is not None else None
+
+
+def _get_keys(keys, data, resolve=None):
+    for key in keys:
+        try:
+            data = data.get(key)
+        except AttributeError:
+            data = _dereference(data, key, resolve)
+        if data is None:
+            return None
+    return data
+
+
+def _get_steps(steps, data, resolve=None):
+    for step in steps:
+        if isinstance(step, int):
+            if not isinstance(data, (list, tuple)) or not -len(data) <= step < len(data):
+                return None
+            data = data[step]
+        else:
+            try:
+                data = data.get(step)
+            except AttributeError:
+                data = _dereference(data, step, resolve)
+        if data is None:
+            return None
+    return data
+
+
+def compile_path(path: str):
+    """Returns a function that resolves the path in a dict (or None if it's missing),
+    it takes an optional `resolve` function of links (see module docs)
+
+    Typical usage::
+        author = compile_path("metadata.authors[0]")
+        for record in records:
+            author(record)
+    """
+    accessor = _COMPILED.get(path)
+    if accessor is None:
+        steps = parse_path(path)
+        if all(isinstance(step, str) for step in steps):
+            accessor = functools.partial(_get_keys, steps)
+        else:
+            accessor = functools.partial(_get_steps, steps)
+
+        if len(_COMPILED) >= MAX_COMPILED_PATHS:
+            _COMPILED.clear()
+        _COMPILED[path] = accessor
+    return accessor
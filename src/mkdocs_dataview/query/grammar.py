@@ -15,12 +15,18 @@ This module defines the LARK grammar for the dataview query language.
 
 LARK_GRAMMAR = r"""
 // Entry points
-full_clause : view_type select_clause [from_clause] [where_clause]
+full_clause : view_type [view_format] [distinct] select_clause [from_clause] flatten_clause* [where_clause]
 
 view_type : CNAME
+// output of tables: TABLE HTML file.link, ...
+view_format : VIEW_FORMAT
+// rows with the same values of all columns are rendered once
+distinct : DISTINCT
 
 from_clause : "FROM"i from_expression
 where_clause : "WHERE"i expression
+// a row per item of a list: FLATTEN metadata.awards AS award
+flatten_clause : _FLATTEN expression ["AS"i CNAME]
 select_clause : select_alias_expression ("," select_alias_expression)*
 
 ?select_alias_expression : select_expression
@@ -112,6 +118,9 @@ literal : STRING_CONSTANT
         | NULL
 
 // Terminals
+VIEW_FORMAT : /(html|json|markdown)(?=\s)/i
+DISTINCT : /distinct(?=\s)/i
+_FLATTEN : /flatten(?=\s)/i
 BOOLEAN_TRUE : "true"i
 BOOLEAN_FALSE : "false"i
 NULL : "null"i
@@ -119,10 +128,13 @@ NULL : "null"i
 STRING_CONSTANT : ESCAPED_STRING
 FUNCTION_NAME : CNAME | CNAME ("." CNAME)*
 DICT_KEY : CNAME
-IDENTIFIER : "`" CNAME ("." CNAME)* "`" | CNAME ("." CNAME)*
+IDENTIFIER : "`" IDENTIFIER_PATH "`" | IDENTIFIER_PATH
+// nested keys and list indices: metadata.authors[0].name
+IDENTIFIER_PATH : CNAME ("." CNAME | "[" ["-"] INT "]")*
 
 %import common.CNAME
 %import common.ESCAPED_STRING
+%import common.INT
 %import common.SIGNED_FLOAT
 %import common.SIGNED_INT
 %import common.WS
@@ -2,9 +2,34 @@
 Contains solvers that used for where and expression lists
 """
 
+import logging
+import operator
+import threading
+
 from lark import Transformer, Lark
-from lark.visitors import Interpreter
+from lark.visitors import Interpreter, Visitor
 from .grammar import LARK_GRAMMAR
+from .accessors import compile_path, parse_path
+from .functions import get_function
+from .optimizer import optimize_query
+from .values import compare
+
+log = logging.getLogger(__name__)
+
+# building a parser takes much longer than parsing a query, so parsers are built once
+# per start rule and thread (a parser is not shared between threads)
+_PARSERS = threading.local()
+
+
+def get_parser(start: str) -> Lark:
+    """Returns the parser of the dataview grammar for the `start` rule"""
+    parsers = getattr(_PARSERS, "parsers", None)
+    if parsers is None:
+        parsers = _PARSERS.parsers = {}
+    parser = parsers.get(start)
+    if parser is None:
+        parser = parsers[start] = Lark(LARK_GRAMMAR, start=start)
+    return parser
 
 
 class QueryError(Exception):
@@ -19,7 +44,7 @@ class TransformationError(QueryError):
     """Error raised during lark tree transformation."""
 
 
-class QueryService():
+class QueryService():  # pylint: disable=too-many-instance-attributes
     """Service for parsing and executing dataview queries.
 
     Typical usage::
@@ -48,23 +73,74 @@ class QueryService():
     """
     def __init__(self, query):
         self.query = query
-        self.lark = Lark(LARK_GRAMMAR, start='full_clause')
+        self.lark = get_parser('full_clause')
         self.tree = self.lark.parse(query)
         parsed_data = FullClauseInterpreter().visit(self.tree)
         self.data = {}
+        # [(expression tree, path of the bound name), ...], see `flatten`
+        self.flatten_clauses = []
 
         for v in parsed_data:
             if v is None:
                 # @TODO: it must be optional "from_clause" or where_clause??
                 continue
+            if v["type"] == "flatten_clause":
+                self.flatten_clauses.append(v["value"])
+                continue
             self.data[v["type"]] = None
             if "value" in v:
                 self.data[v["type"]] = v["value"]
 
+        # trees that are executed, see `optimize`
+        self.where_tree = self.data.get("where_clause")
+        self.select_tree = self.data["select_clause"]
+        self.optimized = False
+        # returns the record of a linked note, see accessors.py
+        self.resolve = None
+
+    def optimize(self, this_metadata=None, resolve=None):
+        """Optimizes the query for execution on a page described by `this_metadata`.
+
+        Folds constants (`this.*` identifiers too), drops trivially true WHERE clause,
+        reorders AND/OR operands by cost and shares common subexpressions between
+        SELECT and WHERE. After that `where` and `render_columns` evaluate expressions
+        with short-circuit AND/OR. `resolve` dereferences links to other notes, e.g.
+        `metadata.series.metadata.title` (see accessors.py).
+        """
+        self.resolve = resolve
+        self.where_tree, self.select_tree = optimize_query(
+            self.data.get("where_clause"),
+            self.data["select_clause"],
+            ExpressionSolver({"this": this_metadata}, resolve),
+        )
+        self.optimized = True
+
     def get_render_type(self):
         """Returns the view type of the query (e.g., TABLE, LIST)."""
         return self.data["view_type"]
 
+    def get_view_format(self):
+        """Returns the output format of the query (HTML, JSON or MARKDOWN), None if it's
+        not set."""
+        return self.data.get("view_format")
+
+    def is_distinct(self):
+        """Returns True if rows with the same rendered values are rendered once (DISTINCT)."""
+        return "distinct" in self.data
+
+    def flatten(self, identifiers):
+        """Returns identifiers of the rows of a file after FLATTEN clauses.
+
+        Every clause evaluates its expression for each row and yields a row per item of
+        a list (none for an empty list) or a single row for other values. The item is
+        bound to the name after AS, or replaces the flattened identifier. Rows are
+        generated lazily, one by one.
+        """
+        rows = (identifiers,)
+        for expression, steps in self.flatten_clauses:
+            rows = _flatten_rows(rows, expression, steps, self.resolve)
+        return rows
+
     def get_sources(self):
         """Returns the sources defined in the FROM clause.
 
@@ -98,9 +174,12 @@ class QueryService():
         """
         return SelectClauseColumnNamesTransformer().visit(self.data["select_clause"])
 
-    def render_columns(self, identifiers):
+    def render_columns(self, identifiers, shared=None):
         """Renders the column values for a given set of identifiers.
 
+        `shared` is a dict with values of subexpressions common with the WHERE clause,
+        pass the same dict to `where` and `render_columns` for the same row.
+
         Expect the following format:
         [
             <rendered value1>,
@@ -108,7 +187,40 @@ class QueryService():
             ...
         ]
         """
-        return ExpressionSolver(identifiers).transform(self.data["select_clause"])
+        if self.optimized:
+            return ExpressionEvaluator(identifiers, shared, self.resolve).visit(self.select_tree)
+
+        return ExpressionSolver(identifiers, self.resolve).transform(self.select_tree)
+
+    def get_identifiers(self):
+        """Returns the set of identifiers referenced in SELECT and WHERE clauses.
+
+        Backticks are stripped, e.g. {"file.link", "metadata.a", "this.metadata.b"}.
+        """
+        collector = IdentifiersCollector()
+        for clause in ("select_clause", "where_clause"):
+            if self.data.get(clause):
+                collector.visit(self.data[clause])
+        for expression, _ in self.flatten_clauses:
+            collector.visit(expression)
+
+        return collector.identifiers
+
+    def get_file_attributes(self):
+        """Returns names of `file.*` attributes of the queried files that are referenced.
+
+        A reference to the whole `file` object is reported as "*".
+
+        Example: {"link", "mtime"}
+        """
+        result = set()
+        for identifier in self.get_identifiers():
+            if identifier == "file":
+                result.add("*")
+            elif identifier.startswith("file."):
+                result.add(identifier.split(".")[1])
+
+        return result
 
     def get_where_expression(self):
         """Returns a internal tree representation of the WHERE clause.
@@ -120,19 +232,41 @@ class QueryService():
 
         return ""
 
-    def where(self, identifiers):
+    def where(self, identifiers, shared=None):
         """Evaluates the WHERE clause for a given set of identifiers.
 
         Args:
             identifiers (dict): A dictionary of identifiers to be used in the WHERE clause.
+            shared (dict): Values of subexpressions common with SELECT clause (see `optimize`).
 
         Returns:
             bool: True if the WHERE clause evaluates to True, False otherwise.
         """
-        if self.data.get("where_clause"):
-            return ExpressionSolver(identifiers).transform(self.data["where_clause"])
+        if self.where_tree is None:
+            return True
+
+        if self.optimized:
+            return ExpressionEvaluator(identifiers, shared, self.resolve).visit(self.where_tree)
+
+        return ExpressionSolver(identifiers, self.resolve).transform(self.where_tree)
+
+
+def _flatten_rows(rows, expression, steps, resolve=None):
+    for identifiers in rows:
+        value = ExpressionSolver(identifiers, resolve).transform(expression)
+        for item in value if isinstance(value, (list, tuple)) else (value,):
+            yield _bind_path(identifiers, steps, item)
 
-        return True
+
+def _bind_path(data, steps, value):
+    """Returns a copy of dicts on the path with the value set at its end"""
+    if type(data) is not dict:  # pylint: disable=unidiomatic-typecheck
+        # e.g. file attributes, which are computed lazily
+        raise TransformationError(f"can't FLATTEN `{'.'.join(steps)}` in place, use AS name")
+    head = steps[0]
+    if len(steps) > 1:
+        value = _bind_path(data.get(head, {}), steps[1:], value)
+    return {**data, head: value}
 
 
 # pylint: disable=missing-function-docstring
@@ -173,6 +307,24 @@ class FullClauseInterpreter(Interpreter):
     def view_type(self, tree):
         return {'type': 'view_type', 'value': tree.children[0].value}
 
+    def distinct(self, _):
+        return {'type': 'distinct'}
+
+    def flatten_clause(self, tree):
+        expression, name = tree.children
+        if name is None:
+            if expression.data != "identifier":
+                raise TransformationError("FLATTEN of an expression needs AS name")
+            steps = parse_path(expression.children[0].value)
+            if not all(isinstance(step, str) for step in steps):
+                raise TransformationError("FLATTEN of a list item needs AS name")
+        else:
+            steps = (name.value,)
+        return {'type': 'flatten_clause', 'value': (expression, steps)}
+
+    def view_format(self, tree):
+        return {'type': 'view_format', 'value': tree.children[0].value.upper()}
+
     def select_clause(self, tree):
         return {'type': 'select_clause', 'value': tree}
 
@@ -269,6 +421,28 @@ class SelectClauseColumnNamesTransformer(Interpreter):
         return "not " + v[0]
 
 
+class IdentifiersCollector(Visitor):
+    """
+    Visitor that collects all identifiers of an expression tree.
+
+    Example usage:
+
+    collector = IdentifiersCollector()
+    collector.visit(tree)
+    collector.identifiers  # {"metadata.a", "file.link"}
+    """
+    def __init__(self):
+        super().__init__()
+        self.identifiers = set()
+
+    def identifier(self, tree):
+        """Processes an identifier."""
+        name = tree.children[0].value
+        if name.startswith('`'):
+            name = name[1:-1]
+        self.identifiers.add(name)
+
+
 # pylint: disable=missing-function-docstring
 class SourcesInterpreter(Interpreter):
     """
@@ -315,83 +489,34 @@ class SourcesInterpreter(Interpreter):
         return self.visit_children(tree)
 
 
-def lookup_value_in_dict(data, key):
+def lookup_value_in_dict(data, key, resolve=None):
     """Get value from dict by path in key.
 
     Parameters:
         data: dict
-        key: str like "key.inner_key.and_other_key"
+        key: str like "key.inner_key.and_other_key" or "key.list_key[0]"
+        resolve: function that dereferences links to notes (see accessors.py)
 
-    Returns None if there is no such key.
+    Returns None if there is no such key (see accessors.compile_path).
     """
-    lookup_value = data
-
-    for k in key.split('.'):
-        lookup_value = lookup_value.get(k)
-        if lookup_value is None:
-            break
-
-    return lookup_value
-
-
-def dataview_sum(*args) -> tuple[str, int]:
-    """Sum function for dataview queries"""
-    return "SIGNED_INT", sum(args)
-
-
-def dataview_econtains(data, value) -> tuple[str, bool]:
-    """econtain function for dataview queries"""
-    return "BOOLEAN", value in data
-
-
-def dataview_length(value) -> tuple[str, int]:
-    """length function"""
-    if value is None:
-        return "SIGNED_INT", 0
-    return "SIGNED_INT", len(value)
-
-
-def dataview_date(value) -> tuple[str, str]:
-    """date function (simplified, just returns string for now)"""
-    # In a real implementation, this would parse date strings
-    return "STRING_CONSTANT", str(value)
-
-
-def dataview_link(path, display=None) -> tuple[str, str]:
-    """link function"""
-    if display:
-        return "STRING_CONSTANT", f"[{display}]({path})"
-    return "STRING_CONSTANT", f"[{path}]({path})"
-
-
-def dataview_choice(condition, if_true, if_false) -> tuple[str, any]:
-    """choice function"""
-    if condition:
-        return "STRING_CONSTANT", if_true  # Type might vary, but simplifying
-    return "STRING_CONSTANT", if_false
-
-
-def dataview_default(value, default_val) -> tuple[str, any]:
-    """default function"""
-    if value is None or value == "null":
-        return "STRING_CONSTANT", default_val
-    return "STRING_CONSTANT", value
+    return compile_path(key)(data, resolve)
 
 
 # pylint: disable=too-few-public-methods
 class ExpressionSolverService():
     """Helper service for solving individual expressions with Lark."""
     def __init__(self, expression):
-        lark = Lark(LARK_GRAMMAR, start='expression')
+        lark = get_parser('expression')
         try:
             self.tree = lark.parse(expression)
         except:
-            print("Tryied to parse where expresion", expression)
+            log.debug("failed to parse expression: %s", expression)
             raise
 
-    def solve(self, identifiers=None):
-        """Solves the expression using the provided identifiers."""
-        return ExpressionSolver(identifiers).transform(self.tree)
+    def solve(self, identifiers=None, resolve=None):
+        """Solves the expression using the provided identifiers, `resolve` dereferences
+        links to notes (see accessors.py)."""
+        return ExpressionSolver(identifiers, resolve).transform(self.tree)
 
 
 # pylint: disable=too-many-public-methods
@@ -411,22 +536,17 @@ class ExpressionSolver(Transformer):
 
     """
 
-    def __init__(self, identifiers):
+    def __init__(self, identifiers, resolve=None):
         super().__init__()
         self.__identifiers = identifiers
-        self.funcs = {
-            "sum": dataview_sum,
-            "econtains": dataview_econtains,
-            "length": dataview_length,
-            "date": dataview_date,
-            "link": dataview_link,
-            "choice": dataview_choice,
-            "default": dataview_default,
-        }
+        self.__resolve = resolve
 
     def select_clause(self, toks):
         return toks
 
+    def constant(self, toks):
+        return toks[0]
+
     def where_clause(self, toks):
         if len(toks) != 1:
             raise TransformationError("unexpected where tokens size")
@@ -441,11 +561,8 @@ class ExpressionSolver(Transformer):
 
     def identifier(self, toks):
         """resolves identifiers to their values"""
-        tok = toks[0]
-        if tok.value[0] == '`':
-            tok = tok.update(value=tok.value[1:-1])
-
-        v = lookup_value_in_dict(self.__identifiers, tok.value)
+        # accessors are compiled once per identifier, backticks are stripped by them
+        v = compile_path(toks[0].value)(self.__identifiers, self.__resolve)
 
         if v is None:
             v = ''
@@ -492,17 +609,18 @@ class ExpressionSolver(Transformer):
     def neq_op(self, toks):
         return toks[0] != toks[1]
 
+    # values of different types are ordered by type, see values.py
     def lt_op(self, toks):
-        return toks[0] < toks[1]
+        return compare(operator.lt, toks[0], toks[1])
 
     def gt_op(self, toks):
-        return toks[0] > toks[1]
+        return compare(operator.gt, toks[0], toks[1])
 
     def lte_op(self, toks):
-        return toks[0] <= toks[1]
+        return compare(operator.le, toks[0], toks[1])
 
     def gte_op(self, toks):
-        return toks[0] >= toks[1]
+        return compare(operator.ge, toks[0], toks[1])
 
     def in_op(self, toks):
         return toks[0] in toks[1]
@@ -526,9 +644,44 @@ class ExpressionSolver(Transformer):
         func_token = toks[0]
         args = toks[1:]
 
-        if func_token.value not in self.funcs:
+        # functions are registered in functions.py
+        function = get_function(func_token.value)
+        if function is None:
             raise FuncitonCallError("Unknown function", name = func_token.value)
 
-        _, new_value = self.funcs[func_token.value](*args)
-        # We return just the value now, as the transformer seems to expect values
-        return new_value
+        return function(*args)
+
+
+# pylint: disable=missing-function-docstring
+class ExpressionEvaluator(Interpreter):
+    """
+    Evaluates optimized query trees (see `QueryService.optimize`) top-down.
+
+    Unlike ExpressionSolver it stops evaluating AND/OR as soon as the result is known
+    and computes `shared` subexpressions once per row. All other nodes are delegated
+    to ExpressionSolver.
+
+    Example:
+            ExpressionEvaluator({"a": 1}, shared={}).visit(tree)
+    """
+    def __init__(self, identifiers, shared=None, resolve=None):
+        self.solver = ExpressionSolver(identifiers, resolve)
+        self.shared_values = shared if shared is not None else {}
+
+    def __default__(self, tree):
+        return getattr(self.solver, tree.data)(self.visit_children(tree))
+
+    def constant(self, tree):
+        return tree.children[0]
+
+    def and_op(self, tree):
+        return bool(self.visit(tree.children[0]) and self.visit(tree.children[1]))
+
+    def or_op(self, tree):
+        return bool(self.visit(tree.children[0]) or self.visit(tree.children[1]))
+
+    def shared(self, tree):
+        slot, subtree = tree.children
+        if slot not in self.shared_values:
+            self.shared_values[slot] = self.visit(subtree)
+        return self.shared_values[slot]
@@ -0,0 +1,97 @@
+"""
+Normalization of metadata values into comparable keys.
+
+YAML gives numbers, strings, dates, datetimes, lists and dicts, and missing values
+are seen as '' by queries. Python can't order values of different types, so they
+are ordered by a type rank first and by a key of the same type next:
+
+    null ('' and None) < numbers (and booleans) < dates < strings < lists < objects < other
+
+Dates and datetimes are keyed by days since the unix epoch, so they are comparable
+with each other. Indexes can store `sort_key` of values (see SQLiteIndex) instead
+of computing it for every comparison.
+"""
+import datetime
+
+RANK_NULL = 0
+RANK_NUMBER = 1
+RANK_DATE = 2
+RANK_STRING = 3
+RANK_LIST = 4
+RANK_OBJECT = 5
+RANK_OTHER = 6
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+SECONDS_PER_DAY = 86400
+
+
+def epoch_days(value: datetime.date) -> float:
+    """Returns days since 1970-01-01 of a date or datetime (aware datetimes in UTC)"""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return (value - EPOCH).total_seconds() / SECONDS_PER_DAY
+    return float(value.toordinal() - EPOCH_ORDINAL)
+
+
+# pylint: disable=too-many-return-statements
+def type_rank(value) -> int:
+    """Returns one of RANK_* constants of the value"""
+    if value is None or (isinstance(value, str) and not value):
+        return RANK_NULL
+    if isinstance(value, (bool, int, float)):
+        return RANK_NUMBER
+    if isinstance(value, datetime.date):
+        return RANK_DATE
+    if isinstance(value, str):
+        return RANK_STRING
+    if isinstance(value, (list, tuple)):
+        return RANK_LIST
+    if isinstance(value, dict):
+        return RANK_OBJECT
+    return RANK_OTHER
+
+
+def sort_key(value) -> tuple:
+    """Returns a key of the value that is comparable with keys of any other value"""
+    rank = type_rank(value)
+    if rank == RANK_NULL:
+        return (rank,)
+    if rank in (RANK_NUMBER, RANK_STRING):
+        return (rank, value)
+    if rank == RANK_DATE:
+        return (rank, epoch_days(value))
+    if rank == RANK_LIST:
+        return (rank, tuple(sort_key(v) for v in value))
+    if rank == RANK_OBJECT:
+        return (rank, tuple(sorted((str(k), sort_key(v)) for k, v in value.items())))
+    return (rank, type(value).__name__, str(value))
+
+
+def compare(op, left, right) -> bool:
+    """Compares values of the same type natively and other values by their sort keys
+
+    `op` is a comparison like operator.lt.
+    """
+    try:
+        return op(left, right)
+    except TypeError:
+        return op(sort_key(left), sort_key(right))
+
+
+def parse_date(value):
+    """Returns a date or datetime of an ISO 8601 string, dates are returned as is and
+    anything else as None"""
+    if isinstance(value, datetime.date):
+        return value
+    if not isinstance(value, str):
+        return None
+
+    value = value.strip()
+    try:
+        if len(value) == 10:
+            return datetime.date.fromisoformat(value)
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
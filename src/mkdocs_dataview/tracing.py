@@ -0,0 +1,72 @@
+"""
+Debug tracing of index building and query execution.
+
+Tracing is enabled per page (glob patterns of source paths) or per query (substrings
+of the query text). A disabled trace only costs a call, hot loops check `trace.enabled`
+first. Messages use lazy %-formatting of `logging`, expensive arguments can be wrapped
+into `Lazy`, so they are computed only when the message is emitted.
+
+Typical usage::
+    tracer = Tracer(pages=["examples/library/*"], queries=["Edgar Award"])
+
+    trace = tracer.page("examples/library/index.md")
+    trace("load file %s", path)
+
+    query_trace = tracer.query(query, trace)
+    if query_trace.enabled:
+        query_trace("where: %s", Lazy(qs.get_where_expression))
+"""
+import fnmatch
+
+from mkdocs.plugins import get_plugin_logger
+
+log = get_plugin_logger("mkdocs_dataview.trace")
+
+
+class Lazy:  # pylint: disable=too-few-public-methods
+    """Defers a call until the message that uses it is formatted"""
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+class Trace:  # pylint: disable=too-few-public-methods
+    """Emits trace messages if enabled"""
+    __slots__ = ("enabled", "prefix")
+
+    def __init__(self, enabled: bool = False, prefix: str = ""):
+        self.enabled = enabled
+        self.prefix = prefix
+
+    def __call__(self, msg: str, *args) -> None:
+        if self.enabled:
+            log.info(self.prefix + msg, *args)
+
+
+NO_TRACE = Trace()
+
+
+class Tracer:
+    """Decides which pages and queries are traced"""
+    def __init__(self, pages=(), queries=()):
+        self.pages = list(pages)
+        self.queries = list(queries)
+
+    def page(self, page: str) -> Trace:
+        """Returns trace for a page, `page` is a path of the page source"""
+        if any(fnmatch.fnmatch(page, pattern) for pattern in self.pages):
+            return Trace(True, f"[{page}] ")
+        return NO_TRACE
+
+    def query(self, query: str, page_trace: Trace = NO_TRACE) -> Trace:
+        """Returns trace for a query, all queries of a traced page are traced"""
+        if page_trace.enabled:
+            return page_trace
+        if any(pattern in query for pattern in self.queries):
+            return Trace(True, f"[{' '.join(query.split())[:40]}] ")
+        return NO_TRACE
@@ -0,0 +1,44 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import pytest
+
+from mkdocs_dataview.query.accessors import compile_path, parse_path
+from mkdocs_dataview.query.solvers import ExpressionSolverService
+
+METADATA = {
+    "title": "Book",
+    "authors": [{"name": "Ann", "born": 1970}, {"name": "Bob"}],
+    "matrix": [[1, 2], [3, 4]],
+    "series": {"name": "Saga", "part": 2},
+}
+
+
+def test_parse_path():
+    assert parse_path("metadata.authors[0].name") == ("metadata", "authors", 0, "name")
+    assert parse_path("`metadata.matrix[1][-1]`") == ("metadata", "matrix", 1, -1)
+    assert parse_path("file.link") == ("file", "link")
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("metadata.title", "Book"),
+    ("metadata.series.name", "Saga"),
+    ("metadata.authors[0].name", "Ann"),
+    ("metadata.authors[-1].name", "Bob"),
+    ("metadata.matrix[1][0]", 3),
+    # missing values
+    ("metadata.authors[1].born", None),
+    ("metadata.authors[2].name", None),
+    ("metadata.title.name", None),
+    ("metadata.title[0]", None),
+    ("metadata.series[0]", None),
+    ("metadata.missing.name", None),
+])
+def test_compile_path(path, expected):
+    assert compile_path(path)({"metadata": METADATA}) == expected
+    assert compile_path(path) is compile_path(path)
+
+
+def test_identifiers_with_indices():
+    identifiers = {"metadata": METADATA}
+    assert ExpressionSolverService('metadata.authors[0].name == "Ann"').solve(identifiers)
+    assert ExpressionSolverService("`metadata.matrix[0][1]` + 1").solve(identifiers) == 3
+    assert ExpressionSolverService("metadata.authors[5].name").solve(identifiers) == ''
@@ -0,0 +1,70 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import pytest
+
+from mkdocs_dataview.query import functions
+from mkdocs_dataview.query.solvers import ExpressionSolverService, QueryService
+
+
+@pytest.fixture(name="calls")
+def fixture_calls():
+    calls = []
+
+    @functions.dataview_function(pure=True, cache_size=2)
+    def double(value):
+        calls.append(value)
+        return value * 2
+
+    def row_number(value):
+        calls.append(value)
+        return len(calls)
+
+    functions.register_function("double", double)
+    functions.register_function("row_number", row_number)
+    yield calls
+    del functions.FUNCTIONS["double"]
+    del functions.FUNCTIONS["row_number"]
+
+
+def test_pure_functions_are_memoized(calls):
+    for value in [1, 2, 1, 1, 2]:
+        assert ExpressionSolverService(f"double({value})").solve({}) == value * 2
+    assert calls == [1, 2]
+
+    # unhashable arguments are not memoized
+    assert ExpressionSolverService("double([1])").solve({}) == [1, 1]
+    assert ExpressionSolverService("double([1])").solve({}) == [1, 1]
+    assert calls == [1, 2, [1], [1]]
+
+    # the cache is bounded
+    ExpressionSolverService("double(3)").solve({})
+    ExpressionSolverService("double(1)").solve({})
+    assert calls[-2:] == [3, 1]
+
+    functions.clear_caches()
+    ExpressionSolverService("double(3)").solve({})
+    assert calls[-1] == 3
+
+
+def test_impure_functions_are_not_folded(calls):
+    qs = QueryService("TABLE row_number(1), double(2) WHERE row_number(0) > 0")
+    qs.optimize({})
+    for _ in range(3):
+        assert qs.where({"metadata": {}})
+    assert calls == [2, 0, 0, 0]
+    assert qs.render_columns({"metadata": {}}) == [5, 4]
+
+
+def test_reset_functions():
+    functions.register_functions({"join": "os.path:join", "length": "os.path:basename"})
+    assert functions.get_function("length").func is __import__("os").path.basename
+
+    functions.reset_functions()
+    assert functions.get_function("join") is None
+    assert functions.get_function("length").func is functions.dataview_length
+    assert set(functions.FUNCTIONS) >= set(functions.BUILTIN_FUNCTIONS)
+
+
+def test_import_function():
+    assert functions.import_function("os.path:join") is __import__("os").path.join
+    with pytest.raises(ValueError):
+        functions.import_function("os.path.join")
@@ -0,0 +1,73 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+from lark import Tree
+
+from mkdocs_dataview.query.solvers import QueryService
+
+
+THIS = {"metadata": {"awards": ["Edgar Award"], "year": 1950}}
+
+ROWS = [
+    {"metadata": {"a": 1, "b": 2, "awards": ["Edgar Award"], "year": 1947}},
+    {"metadata": {"a": 5, "b": 0, "awards": [], "year": 1950}},
+    {"metadata": {"a": 10, "b": 10, "awards": ["Edgar Award", "Other"], "year": 1960}},
+]
+
+QUERIES = [
+    'TABLE metadata.a WHERE 1',
+    'TABLE metadata.a WHERE metadata.a > 1 + 2',
+    'TABLE metadata.a + metadata.b WHERE metadata.a + metadata.b > 3',
+    'TABLE metadata.a WHERE this.metadata.awards CONTAINS "Edgar Award" AND metadata.b',
+    'TABLE metadata.a WHERE metadata.year < this.metadata.year OR length(metadata.awards) > 1',
+    'TABLE this.metadata.year WHERE NOT metadata.a IN [1, 2, 3] AND 2 > 1',
+    'TABLE metadata.a WHERE 1 > 2 OR metadata.b == 0 AND True',
+]
+
+
+def test_optimized_results_are_the_same(subtests):
+    for query in QUERIES:
+        with subtests.test(msg=query):
+            original = QueryService(query)
+            optimized = QueryService(query)
+            optimized.optimize(THIS)
+
+            for row in ROWS:
+                identifiers = {**row, "this": THIS}
+                shared = {}
+                assert bool(original.where(identifiers)) == optimized.where(identifiers, shared)
+                assert original.render_columns(identifiers) == \
+                    optimized.render_columns(identifiers, shared)
+
+
+def test_trivially_true_where_is_dropped():
+    qs = QueryService("TABLE this.metadata.awards WHERE 1")
+    qs.optimize(THIS)
+
+    assert qs.where_tree is None
+    assert qs.select_tree.children[0].children[0] == Tree("constant", [["Edgar Award"]])
+
+
+def test_constant_folding():
+    qs = QueryService("TABLE metadata.a WHERE metadata.x > 1 + 2")
+    qs.optimize(THIS)
+
+    assert qs.where_tree.children[0].children[1] == Tree("constant", [3])
+
+
+def test_cheap_operands_go_first():
+    qs = QueryService('TABLE metadata.a WHERE length(metadata.awards) > 1 AND metadata.b')
+    qs.optimize(THIS)
+
+    assert qs.where_tree.children[0].children[0].data == "identifier"
+
+
+def test_common_subexpressions_are_computed_once():
+    qs = QueryService("TABLE metadata.a + metadata.b WHERE metadata.a + metadata.b > 3")
+    qs.optimize(THIS)
+
+    shared = {}
+    identifiers = {"metadata": {"a": 1, "b": 5}}
+    assert qs.where(identifiers, shared)
+    assert list(shared.values()) == [6]
+
+    shared = {slot: 100 for slot in shared}
+    assert qs.render_columns(identifiers, shared) == [100]
@@ -0,0 +1,60 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import datetime
+
+import pytest
+
+from mkdocs_dataview.query.solvers import ExpressionSolverService
+from mkdocs_dataview.query.values import epoch_days, parse_date, sort_key
+
+
+def test_sort_keys_order_values_of_any_types():
+    values = [
+        {"a": 1},
+        ["b"],
+        "a",
+        datetime.datetime(2024, 1, 1, 12, 0),
+        datetime.date(2024, 1, 1),
+        2.5,
+        True,
+        None,
+    ]
+    assert sorted(values, key=sort_key) == [
+        None, True, 2.5, datetime.date(2024, 1, 1), datetime.datetime(2024, 1, 1, 12, 0),
+        "a", ["b"], {"a": 1},
+    ]
+    assert sort_key("") == sort_key(None)
+
+
+def test_epoch_days():
+    assert epoch_days(datetime.date(1970, 1, 2)) == 1
+    assert epoch_days(datetime.datetime(1970, 1, 1, 6)) == 0.25
+    utc_plus_one = datetime.timezone(datetime.timedelta(hours=1))
+    assert epoch_days(datetime.datetime(1970, 1, 1, 7, tzinfo=utc_plus_one)) == 0.25
+
+
+def test_parse_date():
+    assert parse_date("2024-03-01") == datetime.date(2024, 3, 1)
+    assert parse_date("2024-03-01T10:30") == datetime.datetime(2024, 3, 1, 10, 30)
+    assert parse_date(datetime.date(2024, 3, 1)) == datetime.date(2024, 3, 1)
+    assert parse_date("March") is None
+    assert parse_date(5) is None
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ('metadata.d > date("2024-01-01")', True),
+    ('metadata.d < metadata.dt', True),
+    ('metadata.n < "1"', True),
+    ('metadata.missing < 0', True),
+    ('metadata.s >= metadata.d', True),
+    ('metadata.list > metadata.s', True),
+    ('date("not a date")', "not a date"),
+])
+def test_mixed_types_are_compared_by_type(expression, expected):
+    identifiers = {"metadata": {
+        "d": datetime.date(2024, 6, 1),
+        "dt": datetime.datetime(2024, 6, 1, 8, 0),
+        "n": 10,
+        "s": "text",
+        "list": [1],
+    }}
+    assert ExpressionSolverService(expression).solve(identifiers) == expected
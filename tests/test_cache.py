@@ -0,0 +1,116 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+from mkdocs_dataview.markdown_db import cache as cache_module
+from mkdocs_dataview.markdown_db.cache import RenderCache
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex
+from mkdocs_dataview.markdown_db.lazy import LazySources
+from mkdocs_dataview.query import functions
+
+
+PAGE_MD = """
+```dataview
+TABLE file.link, metadata.author
+FROM "library"
+WHERE metadata.genre == "Detective"
+```
+"""
+
+
+def make_sources():
+    return {
+        "docs/library/a.md": {
+            "file": {"path": "library/a/", "name": "a.md"},
+            "metadata": {"title": "A", "author": "X", "genre": "Detective", "pages": 10},
+        },
+        "docs/other/b.md": {
+            "file": {"path": "other/b/", "name": "b.md"},
+            "metadata": {"title": "B", "author": "Y", "genre": "Detective"},
+        },
+    }
+
+
+def test_key_depends_on_queried_data_only(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    sources = make_sources()
+    key = cache.key(PAGE_MD, None, "index/", sources)
+
+    sources["docs/library/a.md"]["metadata"]["pages"] = 20
+    sources["docs/other/b.md"]["metadata"]["author"] = "Z"
+    cache.start_build()
+    assert cache.key(PAGE_MD, None, "index/", sources) == key
+
+    sources["docs/library/a.md"]["metadata"]["author"] = "Z"
+    # fingerprints are memoized until the next build
+    assert cache.key(PAGE_MD, None, "index/", sources) == key
+    cache.start_build()
+    assert cache.key(PAGE_MD, None, "index/", sources) != key
+
+    assert cache.key(PAGE_MD + "text", None, "index/", make_sources()) != key
+    assert cache.key(PAGE_MD, {"metadata": {}}, "index/", make_sources()) != key
+    assert cache.key(PAGE_MD, None, "other/", make_sources()) != key
+
+    # configured functions can change the output of any page
+    functions_cache = RenderCache(str(tmp_path), {"f": "package.module:f"})
+    assert functions_cache.key(PAGE_MD, None, "index/", make_sources()) != key
+
+
+def test_lazy_sources_are_fingerprinted_by_from(tmp_path):
+    index = SimpleMemoryIndex()
+    records = make_sources()
+
+    def load(file_path, target_url, src_uri):  # pylint: disable=unused-argument
+        index.add_file(file_path, records[file_path])
+
+    files = [(key, record["file"]["path"], key) for key, record in records.items()]
+    sources = LazySources(files, load, index)
+    key = RenderCache(str(tmp_path)).key(PAGE_MD, None, "index/", sources)
+    assert list(index.sources) == ["docs/library/a.md"]
+    assert key == RenderCache(str(tmp_path)).key(PAGE_MD, None, "index/", make_sources())
+
+
+def test_records_and_queries_are_hashed_once(tmp_path, monkeypatch):
+    sources = make_sources()
+    record_dumps = []
+    original_dumps = cache_module._dumps
+
+    def counting_dumps(value):
+        if any(value is record for record in sources.values()):
+            record_dumps.append(value)
+        return original_dumps(value)
+
+    monkeypatch.setattr(cache_module, "_dumps", counting_dumps)
+    cache = RenderCache(str(tmp_path))
+    page = "```dataview\nTABLE metadata\n```\n"
+    first = cache.key(page, None, "index/", sources)
+    assert len(record_dumps) == 2
+    assert cache.key(page, None, "other/", sources) != first
+    assert len(record_dumps) == 2
+
+    # records are hashed once per build even for different queries
+    cache.key(page + page.replace("metadata", "metadata, file"), None, "index/", sources)
+    assert len(record_dumps) == 2
+    cache.start_build()
+    assert cache.key(page, None, "index/", sources) == first
+    assert len(record_dumps) == 4
+
+
+def test_impure_functions_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setitem(functions.FUNCTIONS, "now", functions.DataviewFunction("now", object))
+    cache = RenderCache(str(tmp_path))
+    sources = make_sources()
+    assert cache.key("```dataview\nLIST now()\n```\n", None, "index/", sources) is None
+    assert cache.key("`= now()`", None, "index/", sources) is None
+    assert cache.key("```dataview\nLIST length(file.name)\n```\n", None, "index/", sources)
+
+
+def test_get_set_prune(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    cache.set("aa01", "rendered 1")
+    cache.set("bb02", "rendered 2")
+
+    cache = RenderCache(str(tmp_path))
+    assert cache.get("aa01") == "rendered 1"
+    assert cache.get("cc03") is None
+
+    cache.prune()
+    assert RenderCache(str(tmp_path)).get("aa01") == "rendered 1"
+    assert RenderCache(str(tmp_path)).get("bb02") is None
@@ -0,0 +1,93 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+
+import pytest
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.content_index import ContentIndex
+from mkdocs_dataview.markdown_db.sharding import build_sharded_index
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex
+from mkdocs_dataview.markdown_db.report import BuildReport
+from mkdocs_dataview.query.solvers import QueryService
+
+TEXTS = [
+    "This API is deprecated, use the new one.",
+    "Nothing to see here.",
+    "Deprecated with a capital letter.",
+    "The old API was removed, it was deprecated long ago.",
+]
+
+
+def _where(query):
+    qs = QueryService(query)
+    qs.optimize({})
+    return qs.where_tree
+
+
+@pytest.fixture(name="files")
+def fixture_files(tmp_path):
+    files = []
+    for i, text in enumerate(TEXTS):
+        path = tmp_path / f"{i}.md"
+        path.write_text(f"---\nn: {i}\n---\n{text}\n")
+        files.append((str(path), f"{i}/", f"{i}.md"))
+    return files
+
+
+def test_search():
+    index = ContentIndex()
+    for i, text in enumerate(TEXTS):
+        index.add(str(i), text)
+
+    assert index.search("deprecated") == {"0", "3"}
+    assert index.search("API") == {"0", "3"}
+    assert index.search("missing") == set()
+    assert index.search("is") is None
+
+
+def test_merge():
+    first, second, whole = ContentIndex(), ContentIndex(), ContentIndex()
+    for i, text in enumerate(TEXTS):
+        (first if i < 2 else second).add(str(i), text)
+        whole.add(str(i), text)
+
+    first.merge(second)
+    assert first.keys == whole.keys
+    assert first.postings == whole.postings
+
+
+def test_candidates_use_only_required_conditions():
+    index = ContentIndex()
+    for i, text in enumerate(TEXTS):
+        index.add(str(i), text)
+
+    where = 'TABLE file.name WHERE file.content CONTAINS "deprecated" AND "API" in file.content'
+    assert index.candidates(_where(where)) == {"0", "3"}
+    assert index.candidates(_where(
+        'TABLE file.name WHERE file.content CONTAINS "removed" AND metadata.n > 1'
+    )) == {"3"}
+    assert index.candidates(_where(
+        'TABLE file.name WHERE file.content CONTAINS "removed" OR metadata.n > 1'
+    )) is None
+    assert index.candidates(_where(
+        'TABLE file.name WHERE NOT file.content CONTAINS "removed"'
+    )) is None
+
+
+def test_rendering_with_content_index(files):
+    index = SimpleMemoryIndex(content=True)
+    build_sharded_index(index, files, workers=2, content=True)
+    assert index.content_index.keys == [file_path for file_path, _, _ in files]
+
+    query = 'TABLE metadata.n WHERE file.content CONTAINS "deprecated"'
+    out = io.StringIO()
+    RendererWithContext(index.sources).render_query(query, {}, out)
+
+    renderer = RendererWithContext(index.sources, report=BuildReport())
+    renderer.content_index = index.content_index
+    indexed = io.StringIO()
+    renderer.render_query(query, {}, indexed)
+
+    assert indexed.getvalue() == out.getvalue()
+    assert indexed.getvalue().endswith("|0|\n|3|\n")
+    assert renderer.report.queries[0].candidate_rows == 2
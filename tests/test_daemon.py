@@ -0,0 +1,200 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import datetime
+import io
+import json
+import os
+import stat
+import threading
+
+import pytest
+
+from mkdocs_dataview.daemon import (
+    DaemonClient, DaemonError, DaemonServer, IndexDaemon, check_owner, from_json, to_json,
+)
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.file_renderer import FilePlugin
+from mkdocs_dataview.query import functions
+
+QUERIES = [
+    "TABLE metadata.n WHERE metadata.n > this.metadata.n",
+    "TABLE file.link WHERE metadata.n < 2",
+    "TABLE metadata.n WHERE unknown_function(metadata.n)",
+]
+
+
+@pytest.fixture(name="docs")
+def fixture_docs(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(4):
+        (docs / f"{i}.md").write_text(f"---\nn: {i}\ntitle: Note {i}\n---\n# Note {i}\n")
+    return str(docs)
+
+
+@pytest.fixture(name="client")
+def fixture_client(tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    server = DaemonServer(socket_path, IndexDaemon(watch=False))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield DaemonClient.connect(socket_path)
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _files(docs):
+    return [(os.path.join(docs, f"{i}.md"), f"{i}/", f"{i}.md") for i in range(4)]
+
+
+def test_load_reparses_modified_files(client, docs):
+    path = os.path.join(docs, "0.md")
+    posts = client.load(docs, [path])
+    assert posts[path].metadata == {"n": 0, "title": "Note 0"}
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("---\nn: 10\ntitle: Changed note\n---\n")
+    posts = client.load(docs, [path])
+    assert posts[path].metadata == {"n": 10, "title": "Changed note"}
+
+
+def test_execute_matches_local_rendering(client, docs):
+    files = _files(docs)
+    pages = [(out_path, file_path, QUERIES) for file_path, out_path, _ in files]
+    results = client.execute(docs, files, pages)
+    # failed queries are left for the local rendering
+    assert len(results) == 4 * 2
+
+    local = FilePlugin()
+    for file_path, target_url, src_uri in files:
+        local._on_file(file_path, target_url, src_uri)
+    renderer = RendererWithContext(local.sources)
+    for out_path, file_path, queries in pages:
+        for query in queries[:2]:
+            expected = io.StringIO()
+            renderer.render_query(query, local.sources[file_path], expected, out_path)
+            assert results[(out_path, query)] == expected.getvalue()
+
+
+def test_execute_reruns_queries_after_changes(client, docs):
+    files = _files(docs)
+    pages = [(out_path, file_path, QUERIES) for file_path, out_path, _ in files]
+    results = client.execute(docs, files, pages)
+
+    # cached results are served until a file changes
+    assert client.execute(docs, files, pages) == results
+    with open(files[3][0], "w", encoding="utf-8") as file:
+        file.write("---\nn: -1\n---\n")
+    changed = client.execute(docs, files, pages)
+    assert changed[("0/", QUERIES[0])] != results[("0/", QUERIES[0])]
+
+
+def test_file_plugin_loads_files_by_daemon(client, docs):
+    plugin = FilePlugin(daemon=client)
+    plugin.collect_data(docs)
+    assert len(plugin.sources) == 4
+    assert len(plugin._preloaded) == 4
+    assert plugin.sources[os.path.join(docs, "2.md")]["metadata"]["n"] == 2
+
+
+class PoppedDict(dict):
+    """counts precomputed results that were used"""
+    popped = 0
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self.popped += result is not None
+        return result
+
+
+def test_file_plugin_executes_queries_by_daemon(client, docs):
+    template = os.path.join(docs, "list.mdtmpl")
+    with open(template, "w", encoding="utf-8") as file:
+        file.write("---\ntitle: List\n---\n"
+                   "```dataview\nTABLE metadata.n WHERE metadata.n > 1\n```\n")
+    rendered = {}
+    for daemon in (client, None):
+        plugin = FilePlugin(daemon=daemon)
+        plugin.collect_data(docs)
+        plugin.renderer.precomputed = executed = PoppedDict()
+        plugin.render_all_templates(docs)
+        with open(os.path.join(docs, "list.md"), encoding="utf-8-sig") as file:
+            rendered[daemon is None] = file.read()
+        assert executed.popped == (1 if daemon else 0)
+
+    assert rendered[False] == rendered[True]
+    assert "|2|" in rendered[False]
+
+
+def test_connect_without_daemon(tmp_path):
+    assert DaemonClient.connect(str(tmp_path / "missing.sock")) is None
+
+
+def test_execute_uses_client_settings(docs):
+    with open(os.path.join(docs, "0.md"), "a", encoding="utf-8") as file:
+        file.write("See [note 1](1.md).\n")
+    files = _files(docs)
+    link_query = "TABLE file.inlinks WHERE metadata.n == 1"
+    function_query = "TABLE dirname(file.path) WHERE metadata.n == 1"
+    pages = [("0/", files[0][0], [link_query, function_query])]
+    daemon = IndexDaemon(watch=False)
+
+    results = daemon.execute(files, pages)
+    assert "0/" not in results[("0/", link_query)]
+    assert ("0/", function_query) not in results
+    assert "dirname" not in functions.FUNCTIONS
+
+    settings = {
+        "link_graph": True, "content_index": True, "prune_metadata": True,
+        "functions": {"dirname": "posixpath:dirname"},
+    }
+    results = daemon.execute(files, pages, settings=settings)
+    assert "0/" in results[("0/", link_query)]
+    assert results[("0/", function_query)].endswith("|1|\n")
+
+    # indexes are built and cached per settings
+    assert len(daemon.indexes) == 2
+    cached = daemon.index(files, settings, [("n",)])
+    assert cached.index.content_index is not None
+    assert cached.index.sources[files[2][0]]["metadata"] == {"n": 2}
+
+    # functions of a client are not left for the next one
+    assert ("0/", function_query) not in daemon.execute(files, pages)
+    assert "dirname" not in functions.FUNCTIONS
+
+
+def test_json_round_trip():
+    value = {
+        ("0/", "TABLE x"): "|x|",
+        "metadata": {1: datetime.date(2020, 1, 2), "$tag": {"a", "b"}},
+        "when": [datetime.datetime(2020, 1, 2, 3, 4), b"\0", None, 1.5, 2**70],
+    }
+    assert from_json(json.dumps(to_json(value)).encode()) == value
+    with pytest.raises(TypeError):
+        to_json(object())
+
+
+def test_socket_is_private(client, tmp_path):
+    mode = os.stat(client.socket_path).st_mode
+    assert stat.S_ISSOCK(mode)
+    assert not mode & 0o077
+    check_owner(str(tmp_path), directory=True)
+
+    # sockets in directories accessible by others are not used
+    os.chmod(tmp_path, 0o755)
+    try:
+        with pytest.raises(DaemonError):
+            client.request({"op": "ping"})
+        assert DaemonClient.connect(client.socket_path) is None
+    finally:
+        os.chmod(tmp_path, 0o700)
+    assert client.request({"op": "ping"})
+
+
+def test_server_refuses_shared_directory(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    with pytest.raises(DaemonError):
+        DaemonServer(str(shared / "daemon.sock"), IndexDaemon(watch=False))
+    assert not (shared / "daemon.sock").exists()
@@ -0,0 +1,68 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+import json
+import os
+
+import pytest
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.datasets import (
+    DATASET_URL, PAGER_SCRIPT, publish_datasets, referenced_datasets,
+)
+from mkdocs_dataview.markdown_db.md_renderer import RenderError
+
+SOURCES = {
+    f"docs/{i}.md": {
+        "file": {"path": f"notes/{i}/", "name": f"{i}.md"},
+        "metadata": {"n": i, "title": f"Note <{i}>"},
+    }
+    for i in range(3)
+}
+
+QUERY = "TABLE JSON file.link, metadata.n WHERE metadata.n > 0"
+
+
+def _render(renderer, query, out_path="catalog/"):
+    out = io.StringIO()
+    renderer.render_query(query, {}, out, out_path)
+    return out.getvalue()
+
+
+def test_dataset_table(tmp_path):
+    renderer = RendererWithContext(SOURCES)
+    renderer.dataset_dir = str(tmp_path / "store")
+
+    html = _render(renderer, QUERY)
+    names = referenced_datasets(html)
+    assert len(names) == 1
+    name = names.pop()
+    assert f'data-dataset="../{DATASET_URL}/{name}.json" data-rows="2"' in html
+    assert "<th>file.link</th><th>metadata.n</th>" in html
+    assert "<tbody></tbody>" in html
+
+    with open(tmp_path / "store" / f"{name}.json", encoding="utf-8") as file:
+        assert json.load(file) == [
+            ['<a href="../notes/1">Note &lt;1&gt;</a>', "1"],
+            ['<a href="../notes/2">Note &lt;2&gt;</a>', "2"],
+        ]
+
+    # pages with the same results share the dataset
+    assert referenced_datasets(_render(renderer, QUERY.replace("> 0", ">= 1"))) == {name}
+    assert len(os.listdir(tmp_path / "store")) == 1
+
+
+def test_dataset_table_needs_store():
+    with pytest.raises(RenderError):
+        _render(RendererWithContext(SOURCES), QUERY)
+
+
+def test_publish_datasets(tmp_path):
+    renderer = RendererWithContext(SOURCES)
+    renderer.dataset_dir = str(tmp_path / "store")
+    names = referenced_datasets(_render(renderer, QUERY))
+
+    site_dir = tmp_path / "site"
+    assert publish_datasets(renderer.dataset_dir, names | {"0" * 64}, str(site_dir)) == ["0" * 64]
+    assert sorted(os.listdir(site_dir / DATASET_URL)) == sorted(
+        [PAGER_SCRIPT] + [f"{name}.json" for name in names]
+    )
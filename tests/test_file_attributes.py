@@ -0,0 +1,104 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+
+import frontmatter
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.index import FileAttributes, SimpleMemoryIndex, build_index
+from mkdocs_dataview.query.solvers import QueryService
+
+
+BOOK_MD_FILE = """---
+title: Book
+---
+
+content
+"""
+
+
+def test_lazy_attributes(tmp_path, monkeypatch):
+    file_path = tmp_path / "library" / "book.md"
+    file_path.parent.mkdir()
+    file_path.write_text(BOOK_MD_FILE, encoding="utf-8")
+
+    stat_calls = []
+    original_stat = FileAttributes._load_stats
+
+    def counting_stat(self):
+        stat_calls.append(self.src_path)
+        return original_stat(self)
+
+    monkeypatch.setattr(FileAttributes, "_load_stats", counting_stat)
+
+    index = SimpleMemoryIndex()
+    build_index(
+        frontmatter.loads(BOOK_MD_FILE), str(file_path), "library/book/", index, "library/book.md"
+    )
+    attributes = index.sources[str(file_path)]["file"]
+
+    assert attributes == {"path": "library/book/", "name": "book.md"}
+    assert not stat_calls
+
+    # values are memoized by the record, outside of its items
+    assert attributes["folder"] == "library"
+    assert attributes["ext"] == ".md"
+    assert attributes["size"] == len(BOOK_MD_FILE)
+    assert attributes.get("mtime") is not None
+    assert attributes.get("ctime") is not None
+    assert attributes.get("unknown") is None
+    page_attributes = attributes.for_page("library")
+    assert page_attributes["mtime"] == attributes["mtime"]
+    assert page_attributes.get("unknown") is None
+    assert len(stat_calls) == 1
+    assert attributes == {"path": "library/book/", "name": "book.md"}
+
+    assert page_attributes["link"] == "[Book](book)" == attributes.link("library")
+    assert attributes.link("library") is attributes.link("library")
+    assert attributes.link("") == "[Book](library/book)"
+
+
+def test_content_is_not_kept(tmp_path, monkeypatch):
+    file_path = tmp_path / "book.md"
+    file_path.write_text(BOOK_MD_FILE, encoding="utf-8")
+    attributes = FileAttributes(str(file_path), "book/")
+
+    reads = []
+    original_read = FileAttributes.read_content
+
+    def counting_read(self):
+        reads.append(self.src_path)
+        return original_read(self)
+
+    monkeypatch.setattr(FileAttributes, "read_content", counting_read)
+
+    page_attributes = attributes.for_page("")
+    assert page_attributes["content"] == page_attributes["content"] == "content"
+    assert len(reads) == 1
+    # the record doesn't keep the content
+    assert attributes["content"] == "content"
+    assert len(reads) == 2
+    assert not attributes._lazy
+
+
+def test_query_file_attributes():
+    qs = QueryService('TABLE file.link, file.mtime FROM "a" WHERE this.file.size > file.size')
+    assert qs.get_file_attributes() == {"link", "mtime", "size"}
+
+    qs = QueryService('TABLE metadata.a WHERE `file` != ""')
+    assert qs.get_file_attributes() == {"*"}
+
+
+def test_render_does_not_modify_index():
+    index = SimpleMemoryIndex()
+    for i in range(2):
+        build_index(
+            frontmatter.loads(BOOK_MD_FILE), f"docs/book_{i}.md", f"library/book_{i}/", index
+        )
+
+    out = io.StringIO()
+    renderer = RendererWithContext(index.sources)
+    renderer.render_query('TABLE file.link FROM "library"', None, out, "library/")
+
+    assert out.getvalue().splitlines()[2:] == ["|[Book](book_0)|", "|[Book](book_1)|"]
+    for v in index.sources.values():
+        assert "link" not in v["file"]
@@ -0,0 +1,83 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+
+import pytest
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.index import FileAttributes
+from mkdocs_dataview.markdown_db.md_renderer import RenderError
+from mkdocs_dataview.markdown_db.report import BuildReport
+from mkdocs_dataview.query.solvers import QueryService, TransformationError
+
+SOURCES = {
+    "docs/a.md": {
+        "file": {"path": "a/", "name": "a.md"},
+        "metadata": {"title": "A", "genre": "fantasy", "awards": [
+            {"name": "Hugo", "year": 2001}, {"name": "Nebula", "year": 2003},
+        ]},
+    },
+    "docs/b.md": {
+        "file": {"path": "b/", "name": "b.md"},
+        "metadata": {"title": "B", "genre": "fantasy", "awards": [{"name": "Hugo", "year": 2010}]},
+    },
+    "docs/c.md": {
+        "file": {"path": "c/", "name": "c.md"},
+        "metadata": {"title": "C", "genre": "detective", "awards": []},
+    },
+}
+
+
+def _render(query, report=None):
+    out = io.StringIO()
+    RendererWithContext(SOURCES, report).render_query(query, {}, out, "index/")
+    return out.getvalue().split("\n", 2)[-1] if query.startswith("TABLE") else out.getvalue()
+
+
+def test_flatten_rows():
+    qs = QueryService("TABLE award.name FLATTEN metadata.awards AS award FLATTEN metadata.genre")
+    rows = list(qs.flatten(SOURCES["docs/a.md"]))
+    assert [row["award"]["name"] for row in rows] == ["Hugo", "Nebula"]
+    assert rows[0]["metadata"]["genre"] == "fantasy"
+    assert not list(qs.flatten(SOURCES["docs/c.md"]))
+    # the record is not changed
+    assert "award" not in SOURCES["docs/a.md"]
+
+    assert {"metadata.awards", "award.name", "metadata.genre"} <= qs.get_identifiers()
+
+    with pytest.raises(TransformationError):
+        QueryService("TABLE x FLATTEN metadata.a + 1")
+
+
+def test_flatten_and_distinct():
+    assert _render(
+        'TABLE file.name, award.name FLATTEN metadata.awards AS award WHERE award.year > 2002'
+    ) == "|a.md|Nebula|\n|b.md|Hugo|\n"
+    assert _render(
+        "TABLE metadata.awards.name FLATTEN metadata.awards"
+    ) == "|Hugo|\n|Nebula|\n|Hugo|\n"
+    assert _render(
+        "TABLE DISTINCT metadata.awards.name FLATTEN metadata.awards"
+    ) == "|Hugo|\n|Nebula|\n"
+    assert _render("LIST DISTINCT metadata.genre") == "- fantasy\n- detective\n"
+
+
+def test_flatten_and_distinct_counts():
+    report = BuildReport()
+    _render("TABLE award.name FLATTEN metadata.awards AS award", report)
+    _render("TABLE DISTINCT award.name FLATTEN metadata.awards AS award", report)
+    _render("TABLE award.name FLATTEN metadata.awards AS award WHERE award.year > 2002", report)
+    _render("LIST DISTINCT metadata.genre", report)
+    assert [
+        (stats.candidate_rows, stats.matched_rows, stats.rendered_rows) for stats in report.queries
+    ] == [(3, 3, 3), (3, 3, 2), (3, 2, 2), (3, 3, 2)]
+
+
+def test_flatten_file_attributes_needs_alias():
+    sources = {"docs/a.md": {"file": FileAttributes("docs/a.md", "a/", "a.md"), "metadata": {}}}
+    renderer = RendererWithContext(sources)
+    with pytest.raises(RenderError):
+        renderer.render_query("TABLE file.link FLATTEN file.name", {}, io.StringIO())
+
+    out = io.StringIO()
+    renderer.render_query("TABLE name FLATTEN file.name AS name", {}, out)
+    assert out.getvalue().endswith("|a.md|\n")
@@ -0,0 +1,62 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+
+import markdown
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.parallel import pre_execute
+from mkdocs_dataview.query.solvers import QueryService
+from mkdocs_dataview.tracing import NO_TRACE
+
+SOURCES = {
+    "docs/a.md": {
+        "file": {"path": "notes/a/", "name": "a.md"},
+        "metadata": {"title": "A | B", "tag": "<b>&</b>"},
+    },
+    "docs/b.md": {
+        "file": {"path": "notes/b/", "name": "b.md"},
+        "metadata": {"title": "Plain", "tag": "x"},
+    },
+}
+
+
+def _render(query, renderer=None):
+    out = io.StringIO()
+    (renderer or RendererWithContext(SOURCES)).render_query(query, {}, out, "index/")
+    return out.getvalue()
+
+
+def test_view_format():
+    assert QueryService("TABLE HTML file.link").get_view_format() == "HTML"
+    assert QueryService("TABLE markdown file.link").get_view_format() == "MARKDOWN"
+    assert QueryService("TABLE file.link").get_view_format() is None
+    assert QueryService("TABLE html").columns() == ["html"]
+    assert QueryService("TABLE HTMLX").columns() == ["HTMLX"]
+
+
+def test_html_table():
+    assert _render('TABLE HTML file.link, metadata.tag AS "Tag <1>"') == (
+        "<table>\n<thead>\n<tr><th>file.link</th><th>Tag &lt;1&gt;</th></tr>\n</thead>\n"
+        "<tbody>\n"
+        '<tr><td><a href="../notes/a">A | B</a></td><td>&lt;b&gt;&amp;&lt;/b&gt;</td></tr>\n'
+        '<tr><td><a href="../notes/b">Plain</a></td><td>x</td></tr>\n'
+        "</tbody>\n</table>\n"
+    )
+
+
+def test_markdown_passes_html_table_through():
+    table = _render("TABLE HTML metadata.title")
+    html = markdown.markdown(f"Text\n\n{table}\nMore text", extensions=["tables"])
+    assert table.strip() in html
+    assert "<td>A | B</td>" in html
+
+
+def test_default_table_format():
+    renderer = RendererWithContext(SOURCES)
+    renderer.table_format = "html"
+    assert _render("TABLE metadata.title", renderer) == _render("TABLE HTML metadata.title")
+    assert _render("TABLE MARKDOWN metadata.title", renderer) == _render("TABLE metadata.title")
+
+    pages = [("index/", "docs/a.md", NO_TRACE, ["TABLE metadata.title"])]
+    results, _ = pre_execute(SOURCES, pages, workers=2, table_format="html")
+    assert results[("index/", "TABLE metadata.title")] == _render("TABLE HTML metadata.title")
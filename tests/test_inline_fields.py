@@ -0,0 +1,82 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+
+import frontmatter
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex, build_index
+from mkdocs_dataview.markdown_db.inline_fields import extract_inline_fields
+
+BOOK_MD_FILE = """---
+title: Book
+rating: 3
+---
+
+rating:: 5
+- author:: Jane
+- author:: John
+Read it in one go [pages:: 320], (finished:: true).
+
+```
+ignored:: 1
+```
+
+~~~~
+```
+ignored:: 2
+~~~~
+
+`code:: 3` price:: 9.5
+file:: reserved
+
+    ignored:: 3
+
+\tignored:: 4
+- list:: item
+
+    nested:: field
+tags:: inline
+"""
+
+
+def test_extract_inline_fields():
+    assert extract_inline_fields(frontmatter.loads(BOOK_MD_FILE).content) == {
+        "rating": 5,
+        "author": ["Jane", "John"],
+        "pages": 320,
+        "finished": True,
+        "price": 9.5,
+        "nested": "field",
+        "list": "item",
+        "tags": "inline",
+    }
+    assert not extract_inline_fields("no fields: here\n")
+
+
+def test_fields_are_merged_into_metadata():
+    index = SimpleMemoryIndex()
+    post = frontmatter.loads(BOOK_MD_FILE)
+    build_index(post, "docs/book.md", "book/", index, "book.md")
+
+    metadata = index.sources["docs/book.md"]["metadata"]
+    assert metadata["title"] == "Book"
+    assert metadata["rating"] == 3
+    assert metadata["pages"] == 320
+    assert "pages" not in post.metadata
+    assert index.field_stats["author"] == 1
+
+    out = io.StringIO()
+    RendererWithContext(index.sources).render_query(
+        'TABLE metadata.author[1] AS "Author" WHERE metadata.pages > 300', {}, out
+    )
+    assert out.getvalue().endswith("|John|\n")
+
+
+def test_inline_tags_are_indexed():
+    index = SimpleMemoryIndex()
+    build_index(frontmatter.loads("---\ntags: [a]\n---\n"), "docs/a.md", "a/", index)
+    build_index(frontmatter.loads(BOOK_MD_FILE), "docs/book.md", "book/", index)
+    build_index(frontmatter.loads("tags:: b\ntags:: c\n"), "docs/bc.md", "bc/", index)
+    assert {tag: len(records) for tag, records in index.tags.items()} == {
+        "a": 1, "inline": 1, "b": 1, "c": 1,
+    }
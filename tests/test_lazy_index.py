@@ -0,0 +1,56 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+
+import frontmatter
+
+from mkdocs_dataview.markdown_db import RendererWithContext, build_index
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex
+from mkdocs_dataview.markdown_db.lazy import LazySources
+
+FILES = [
+    (f"docs/{folder}/{i}.md", f"{folder}/{i}/", f"{folder}/{i}.md")
+    for folder in ("notes", "posts")
+    for i in range(3)
+]
+
+
+def _lazy_sources():
+    index = SimpleMemoryIndex()
+    loaded = []
+
+    def load(file_path, target_url, src_uri):
+        loaded.append(file_path)
+        n = len(loaded)
+        ignored = src_uri == "posts/2.md"
+        post = frontmatter.Post("", n=n, title=f"Note {n}", generated_ignore=ignored)
+        build_index(post, file_path, target_url, index, src_uri)
+
+    return LazySources(FILES, load, index), loaded
+
+
+def test_this_lookup_loads_a_single_file():
+    sources, loaded = _lazy_sources()
+    assert sources["docs/posts/1.md"]["metadata"]["n"] == 1
+    assert loaded == ["docs/posts/1.md"]
+    assert sources.loaded == 1
+
+
+def test_from_path_loads_matching_files_only():
+    sources, loaded = _lazy_sources()
+    renderer = RendererWithContext(sources)
+    out = io.StringIO()
+    renderer.render_query('TABLE metadata.n FROM "notes"', {}, out)
+
+    assert sorted(loaded) == ["docs/notes/0.md", "docs/notes/1.md", "docs/notes/2.md"]
+    assert out.getvalue().count("\n") == 2 + 3
+
+
+def test_iteration_loads_all_files_in_order():
+    sources, loaded = _lazy_sources()
+    sources["docs/posts/0.md"]  # pylint: disable=pointless-statement
+
+    # ignored files are not indexed
+    assert list(sources) == [file_path for file_path, _, _ in FILES[:-1]]
+    assert len(sources) == 5
+    assert len(loaded) == 6
+    assert sources.loaded == 6
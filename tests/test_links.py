@@ -0,0 +1,94 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+import os
+
+import pytest
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex
+from mkdocs_dataview.markdown_db.links import LinkGraph, extract_links
+from mkdocs_dataview.markdown_db.sharding import build_sharded_index
+
+PAGES = {
+    "index.md": "[A](notes/a.md) and [B](notes/b.md#section)",
+    "notes/a.md": "See [b](b.md \"title\").\n\n[index]: ../index.md\n",
+    "notes/b.md": "Nothing links from here, `[code](a.md)`.",
+}
+
+
+@pytest.fixture(name="files")
+def fixture_files(tmp_path):
+    files = []
+    for src_uri, text in PAGES.items():
+        path = tmp_path / src_uri
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"---\ntitle: {src_uri}\n---\n{text}\n")
+        files.append((os.path.normpath(path), os.path.splitext(src_uri)[0] + "/", src_uri))
+    return files
+
+
+def test_extract_links():
+    content = """
+[a](a.md) [again](./a.md#top) ![image](b.md) [site](https://example.com/c.md)
+[anchor](#top) [absolute](/d.md) [other](e.txt) [parent](<../f.md>)
+
+```
+[fenced](g.md)
+```
+
+[ref]: sub/h.md
+"""
+    assert extract_links(content, "docs/page.md") == (
+        "docs/a.md", "f.md", "docs/sub/h.md",
+    )
+
+
+def test_set_links_is_incremental():
+    graph = LinkGraph()
+    for key in ("a.md", "b.md", "c.md"):
+        graph.add_page(key, key[0] + "/")
+    graph.set_links("a.md", ("b.md", "c.md"))
+    graph.set_links("b.md", ("c.md",))
+
+    assert graph.get("outlinks", "a.md") == ["b/", "c/"]
+    assert graph.get("inlinks", "c.md") == ["a/", "b/"]
+
+    fingerprint = graph.fingerprint()
+    graph.set_links("a.md", ("b.md",))
+    assert graph.get("inlinks", "c.md") == ["b/"]
+    assert graph.fingerprint() != fingerprint
+
+    graph.retain(["a.md", "c.md"])
+    assert graph.get("outlinks", "a.md") == []
+    assert graph.get("inlinks", "c.md") == []
+
+
+def test_merge(files):
+    index = SimpleMemoryIndex(links=True)
+    build_sharded_index(index, files, workers=2, links=True)
+
+    whole = SimpleMemoryIndex(links=True)
+    build_sharded_index(whole, files, workers=1, links=True)
+
+    assert index.link_graph.outlinks == whole.link_graph.outlinks
+    assert index.link_graph.get("inlinks", files[2][0]) == ["index/", "notes/a/"]
+
+
+def test_backlinks_query(files):
+    index = SimpleMemoryIndex(links=True)
+    build_sharded_index(index, files, workers=1, links=True)
+    renderer = RendererWithContext(index.sources)
+    renderer.link_graph = index.link_graph
+    this = index.sources[files[2][0]]
+
+    out = io.StringIO()
+    renderer.render_query(
+        'LIST file.name WHERE file.path IN this.file.inlinks', this, out, "notes/b/"
+    )
+    assert out.getvalue() == "- index.md\n- a.md\n"
+
+    out = io.StringIO()
+    renderer.render_query(
+        'TABLE length(file.outlinks) AS "links" WHERE file.name == "index.md"', this, out
+    )
+    assert out.getvalue().endswith("|2|\n")
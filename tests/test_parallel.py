@@ -0,0 +1,134 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+import io
+import multiprocessing
+import pickle
+
+import frontmatter
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex, build_index
+from mkdocs_dataview.markdown_db import parallel
+from mkdocs_dataview.markdown_db.parallel import pre_execute
+from mkdocs_dataview.query import functions
+from mkdocs_dataview.tracing import NO_TRACE
+
+
+SOURCES = {
+    f"docs/{i}.md": {
+        "file": {"path": f"{i}/", "name": f"{i}.md"},
+        "metadata": {"n": i, "title": f"Note {i}"},
+    }
+    for i in range(6)
+}
+
+QUERIES = [
+    "TABLE metadata.n WHERE metadata.n > this.metadata.n",
+    "TABLE file.link WHERE metadata.n < 2",
+    "TABLE metadata.n WHERE unknown_function(metadata.n)",
+]
+
+
+def test_pre_execute_matches_serial_rendering():
+    pages = [(f"{i}/", f"docs/{i}.md", NO_TRACE, QUERIES) for i in range(3)]
+    results, stats = pre_execute(SOURCES, pages, workers=2, report=True)
+
+    # failed queries are left for the serial rendering
+    assert len(results) == 3 * 2
+    assert len(stats) == 3 * 2
+
+    renderer = RendererWithContext(SOURCES)
+    for out_path, source_key, _, queries in pages:
+        for query in queries[:2]:
+            expected = io.StringIO()
+            renderer.render_query(query, SOURCES[source_key], expected, out_path)
+            assert results[(out_path, query)] == expected.getvalue()
+
+    renderer.precomputed.update(results)
+    out = io.StringIO()
+    renderer.render_query(QUERIES[1], SOURCES["docs/0.md"], out, "0/")
+    assert out.getvalue() == results[("0/", QUERIES[1])]
+    assert ("0/", QUERIES[1]) not in renderer.precomputed
+
+
+def test_spawned_workers_register_functions(monkeypatch):
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor", functools.partial(
+        ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")
+    ))
+    monkeypatch.setitem(functions.FUNCTIONS, "dirname", functions.DataviewFunction(
+        "dirname", functions.import_function("posixpath:dirname")
+    ))
+    query = "TABLE dirname(file.path) WHERE metadata.n < 2"
+    pages = [(f"{i}/", f"docs/{i}.md", NO_TRACE, [query]) for i in range(2)]
+
+    results, _ = pre_execute(
+        SOURCES, pages, workers=2, function_specs={"dirname": "posixpath:dirname"}
+    )
+    assert results[("0/", query)].endswith("|0|\n|1|\n")
+    assert len(results) == 2
+
+    # without the specs spawned workers don't know the function, the query is left
+    # for the serial rendering
+    results, _ = pre_execute(SOURCES, pages, workers=2)
+    assert not results
+
+
+def _index_pages(tmp_path, count):
+    index = SimpleMemoryIndex()
+    for i in range(count):
+        path = tmp_path / f"dir{i % 7}" / f"{i}.md"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"---\ntitle: Note {i}\nn: {i}\n---\n")
+        build_index(
+            frontmatter.load(path), str(path), f"dir{i % 7}/{i}/", index, f"dir{i % 7}/{i}.md"
+        )
+    return index
+
+
+def test_concurrent_rendering_stress(tmp_path):
+    index = _index_pages(tmp_path, 30)
+    queries = [
+        "TABLE file.link, file.size WHERE metadata.n < this.metadata.n + 3",
+        "LIST file.name WHERE metadata.n > this.metadata.n + 20",
+        'TABLE HTML file.link, file.folder FROM "dir3"',
+    ]
+    pages = [
+        (record["file"]["path"], key, NO_TRACE, queries)
+        for key, record in index.sources.items()
+    ]
+
+    def visible(record):
+        # memoized lazy attributes and links are not part of the record's data
+        return pickle.dumps((record["metadata"], dict(record["file"]), record["file"].src_path))
+
+    before = [visible(record) for record in index.sources.values()]
+
+    serial, _ = pre_execute(index.sources, pages, workers=1, threads=True)
+    results, stats = pre_execute(index.sources, pages, workers=8, report=True, threads=True)
+    assert results == serial
+    assert len(results) == len(pages) * len(queries)
+    assert len(stats) == len(results)
+
+    # one renderer shared by many threads
+    renderer = RendererWithContext(index.sources)
+
+    def render(page):
+        out_path, key, _, page_queries = page
+        out = io.StringIO()
+        for query in page_queries:
+            renderer.render_query(query, index.sources[key], out, out_path)
+        return out.getvalue()
+
+    with ThreadPoolExecutor(8) as executor:
+        rendered = list(executor.map(render, pages * 2))
+    assert rendered == [
+        "".join(serial[(page[0], query)] for query in queries) for page in pages * 2
+    ]
+
+    # rendering doesn't change the records, memoized values are published once
+    assert [visible(record) for record in index.sources.values()] == before
+    for record in index.sources.values():
+        assert set(record["file"]) == {"path", "name"}
+        assert "stats" in record["file"]._lazy
+        assert record["file"]["size"] == record["file"]._lazy["stats"]["size"]
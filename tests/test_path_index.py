@@ -0,0 +1,136 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.cache import RenderCache
+from mkdocs_dataview.markdown_db.path_index import PathIndex, normalize_path
+from mkdocs_dataview.markdown_db.projection import collect_field_paths
+from mkdocs_dataview.markdown_db.sqlite_index import WhereTranslator
+from mkdocs_dataview.query.accessors import compile_path
+from mkdocs_dataview.query.solvers import QueryService
+
+
+def make_sources():
+    return {
+        "docs/library/series_a.md": {
+            "file": {"path": "library/series_a/", "name": "series_a.md"},
+            "metadata": {"title": "Series A", "author": {"name": "X"}},
+        },
+        "docs/library/book_1.md": {
+            "file": {"path": "library/book_1/", "name": "book_1.md"},
+            "metadata": {"title": "Book 1", "series": "library/series_a.md"},
+        },
+        "docs/library/book_2.md": {
+            "file": {"path": "library/book_2/", "name": "book_2.md"},
+            "metadata": {
+                "title": "Book 2", "series": "/library/series_a/", "prequel": ["library/book_1"],
+            },
+        },
+        "docs/library/book_3.md": {
+            "file": {"path": "library/book_3/", "name": "book_3.md"},
+            "metadata": {"title": "Book 3", "series": "library/missing.md"},
+        },
+    }
+
+
+def make_renderer(sources):
+    renderer = RendererWithContext(sources)
+    renderer.path_index = PathIndex(
+        (key, record["file"]["path"], key[5:]) for key, record in sources.items()
+    )
+    return renderer
+
+
+def test_normalize_path():
+    for path in ("library/a.md", "./library/a.md", "/library/a/", "library/a/index.html",
+                 "library/b/../a.html", "library/a.md#section"):
+        assert normalize_path(path) == "library/a"
+    assert normalize_path("index.md") == normalize_path("/") == ""
+
+
+def test_path_index():
+    paths = PathIndex([("docs/a/index.md", "a/", "a/index.md"), ("docs/b.md", "b.html", "b.md")])
+    assert paths.get("a") == paths.get("a/index.md") == "docs/a/index.md"
+    assert paths.get("/b.html") == paths.get("b.md") == "docs/b.md"
+    assert paths.get("c.md") is None
+    assert paths.get("") is None
+    assert paths.get(1) is None
+
+
+def test_accessor_dereferences_strings_only_on_miss():
+    resolved = []
+
+    def resolve(path):
+        resolved.append(path)
+        return {"metadata": {"title": path.upper()}}
+
+    record = {"metadata": {"series": "a.md", "list": ["b.md"], "title": "T"}}
+    assert compile_path("metadata.series.metadata.title")(record, resolve) == "A.MD"
+    assert compile_path("metadata.list[0].metadata.title")(record, resolve) == "B.MD"
+    assert compile_path("metadata.title")(record, resolve) == "T"
+    assert compile_path("metadata.series.metadata.title")(record) is None
+    assert resolved == ["a.md", "b.md"]
+
+
+def test_render_dereferenced_fields():
+    renderer = make_renderer(make_sources())
+    out = io.StringIO()
+    renderer.render_query(
+        'TABLE metadata.title, metadata.series.metadata.title, metadata.series.file.link '
+        'WHERE metadata.series.metadata.author.name == "X"',
+        {}, out, "index/",
+    )
+    assert out.getvalue().split("\n", 2)[-1] == (
+        "|Book 1|Series A|[Series A](../library/series_a)|\n"
+        "|Book 2|Series A|[Series A](../library/series_a)|\n"
+    )
+
+    out = io.StringIO()
+    renderer.render_query("LIST metadata.prequel[0].metadata.title", {}, out, "index/")
+    assert out.getvalue() == "- \n- \n- Book 1\n- \n"
+
+    this = make_sources()["docs/library/book_3.md"]
+    assert renderer.render_markdown(
+        "`= this.metadata.series.metadata.title`.", this, "library/book_3/"
+    ) == "."
+
+
+def test_sqlite_leaves_dereferences_to_python():
+    qs = QueryService('TABLE file.link WHERE metadata.series.metadata.title == "Series A"')
+    qs.optimize({})
+    assert WhereTranslator().translate(qs.where_tree) == ("1", [])
+
+    qs = QueryService('TABLE file.link WHERE metadata.series.title == "Series A"')
+    qs.optimize({})
+    assert WhereTranslator().translate(qs.where_tree) != ("1", [])
+
+
+def test_projection_keeps_fields_of_linked_notes():
+    paths = collect_field_paths(
+        ["TABLE metadata.series.metadata.author.name"], ["this.metadata.series.metadata.pages"]
+    )
+    assert {("series", "metadata", "author", "name"), ("author", "name"), ("pages",)} <= set(paths)
+
+
+def test_cache_key_depends_on_linked_notes(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    page = (
+        "```dataview\nTABLE metadata.series.metadata.title FROM \"library\"\n```\n"
+        "`= this.metadata.series.metadata.author.name`\n"
+    )
+    sources = make_sources()
+    this = sources["docs/library/book_1.md"]
+
+    def key():
+        cache.start_build()
+        resolve = make_renderer(sources).resolve_link
+        return cache.key(page, this, "index/", sources, "", resolve)
+
+    first = key()
+    sources["docs/library/series_a.md"]["metadata"]["pages"] = 1
+    assert key() == first
+    sources["docs/library/series_a.md"]["metadata"]["title"] = "Series B"
+    second = key()
+    assert second != first
+    sources["docs/library/series_a.md"]["metadata"]["author"]["name"] = "Y"
+    assert key() != second
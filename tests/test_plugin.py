@@ -88,3 +88,27 @@ def test_split_inline_query():
 
     for query, expected_result in data:
         assert list(split_inline_query(query)) == expected_result
+
+
+def test_render_markdown():
+    """test single-pass rendering of fences and inline queries"""
+    renderer = mkdocs_dataview.markdown_db.RendererWithContext({})
+
+    prose = "# Title\n\nplain text with `code` and\n```python\nprint(1)\n```\n"
+    assert renderer.render_markdown(prose, {}, "page/") is prose
+
+    markdown = (
+        "a `= 1 + 2` b `code`\n"
+        "```dataview\n"
+        "TABLE file.link\n"
+        "```\n"
+        "tail `= this.metadata.title`"
+    )
+    this_metadata = {"metadata": {"title": "Page"}}
+
+    assert renderer.render_markdown(markdown, this_metadata, "page/") == (
+        "a 3 b `code`\n"
+        "|file.link|\n"
+        "|--|\n"
+        "tail Page"
+    )
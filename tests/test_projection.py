@@ -0,0 +1,58 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+from mkdocs_dataview.markdown_db.projection import (
+    apply_projection, collect_field_paths, extract_queries
+)
+
+
+PAGE_MD = """
+# Page
+
+Author: `= this.metadata.author`, not a query: `code`
+
+```dataview
+TABLE file.link, metadata.cprop.nestedA
+WHERE metadata.genre == "Detective"
+```
+"""
+
+
+def test_extract_queries():
+    queries, expressions = extract_queries(PAGE_MD)
+
+    assert queries == [
+        'TABLE file.link, metadata.cprop.nestedA\nWHERE metadata.genre == "Detective"\n'
+    ]
+    assert expressions == ["this.metadata.author"]
+
+
+def test_collect_field_paths():
+    paths = collect_field_paths(*extract_queries(PAGE_MD))
+
+    assert sorted(paths) == [
+        ("author",), ("cprop", "nestedA"), ("genre",), ("tags",), ("title",)
+    ]
+    assert collect_field_paths(["TABLE metadata"], []) is None
+    assert collect_field_paths(["TABLE a WHERE ("], []) is None
+    assert ("authors",) in collect_field_paths(["TABLE metadata.authors[0].name"], [])
+
+
+def test_apply_projection():
+    sources = {
+        "a.md": {
+            "file": {"path": "a/", "name": "a.md"},
+            "metadata": {
+                "title": "A",
+                "genre": "Detective",
+                "cprop": {"nestedA": 1, "nestedB": 2},
+                "table": [{"huge": "data"}] * 10,
+            },
+        },
+    }
+
+    apply_projection(sources, [("title",), ("genre",), ("cprop", "nestedA"), ("genre", "x")])
+
+    assert sources["a.md"]["metadata"] == {
+        "title": "A",
+        "genre": "Detective",
+        "cprop": {"nestedA": 1},
+    }
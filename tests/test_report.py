@@ -0,0 +1,38 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+import json
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.report import BuildReport
+
+
+SOURCES = {
+    f"docs/{folder}/{i}.md": {
+        "file": {"path": f"{folder}/{i}/", "name": f"{i}.md"},
+        "metadata": {"n": i},
+    }
+    for folder in ("a", "b")
+    for i in range(5)
+}
+
+
+def test_query_stats(tmp_path):
+    report = BuildReport()
+    renderer = RendererWithContext(SOURCES, report)
+
+    query = 'TABLE metadata.n FROM "a" WHERE metadata.n > 2'
+    renderer.render_query(query, None, io.StringIO(), "a")
+    renderer.render_query('LIST file.name WHERE metadata.n > 3', None, io.StringIO(), "b/")
+
+    first, second = report.queries[0], report.queries[1]
+    assert (first.page, first.candidate_rows, first.matched_rows, first.rendered_rows) == \
+        ("a", 5, 2, 2)
+    assert (second.page, second.candidate_rows, second.matched_rows, second.rendered_rows) == \
+        ("b/", 10, 2, 2)
+    assert first.wall_time >= first.parse_time > 0
+
+    assert "executed 2 queries" in report.summary(1)
+
+    report.write(str(tmp_path / "site" / "report.json"))
+    data = json.loads((tmp_path / "site" / "report.json").read_text(encoding="utf-8"))
+    assert [q["rendered_rows"] for q in data["queries"]] == [2, 2]
@@ -0,0 +1,46 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import frontmatter
+
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex, build_index
+from mkdocs_dataview.markdown_db.sharding import build_sharded_index, split_shards
+
+
+def test_split_shards():
+    assert split_shards(list(range(7)), 3) == [[0, 1, 2], [3, 4], [5, 6]]
+    assert split_shards([1, 2], 4) == [[1], [2]]
+    assert not split_shards([], 4)
+
+
+def test_sharded_index_of_no_files():
+    index = SimpleMemoryIndex()
+    assert not build_sharded_index(index, [], workers=4)
+    assert not index.sources
+
+
+def test_sharded_index_is_same_as_serial(tmp_path):
+    files = []
+    for i in range(10):
+        path = tmp_path / f"{i}.md"
+        tags = "[odd]" if i % 2 else "[even, all]"
+        query = "\n```dataview\nTABLE metadata.n\n```\n" if i == 3 else ""
+        path.write_text(f"---\nn: {i}\ntags: {tags}\n---\ncontent{query}", encoding="utf-8")
+        files.append((str(path), f"{i}/", f"{i}.md"))
+
+    serial = SimpleMemoryIndex()
+    for file_path, target_url, src_uri in files:
+        build_index(frontmatter.load(file_path), file_path, target_url, serial, src_uri)
+
+    sharded = SimpleMemoryIndex()
+    page_queries = build_sharded_index(sharded, files, workers=3)
+
+    assert list(sharded.sources) == list(serial.sources)
+    assert [v["metadata"] for v in sharded.sources.values()] == \
+        [v["metadata"] for v in serial.sources.values()]
+    assert {tag: [v["metadata"]["n"] for v in records] for tag, records in sharded.tags.items()} \
+        == {tag: [v["metadata"]["n"] for v in records] for tag, records in serial.tags.items()}
+    assert sharded.field_stats == serial.field_stats == {"n": 10, "tags": 10}
+
+    # records in tag posting lists are the same objects as in sources
+    assert all(any(r is v for v in sharded.sources.values()) for r in sharded.tags["odd"])
+
+    assert page_queries == {files[3][0]: (["TABLE metadata.n\n"], [])}
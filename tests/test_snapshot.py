@@ -0,0 +1,117 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import datetime
+import decimal
+import io
+
+import pytest
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.index import FileAttributes, SimpleMemoryIndex
+from mkdocs_dataview.markdown_db.snapshot import SnapshotError, SnapshotIndex, write_snapshot
+from mkdocs_dataview.query.solvers import QueryService
+
+
+def make_index(tmp_path):
+    index = SimpleMemoryIndex()
+    values = [3, "b", 1.5, datetime.date(2020, 1, 2), None, True, "a", 2**70]
+    for i, value in enumerate(values):
+        src_path = str(tmp_path / f"{i}.md")
+        (tmp_path / f"{i}.md").write_text("x" * i, encoding="utf-8")
+        metadata = {
+            "value": value,
+            "nested": {"list": [i, "ü", {"deep": False}], 1: decimal.Decimal("1.5")},
+            "when": datetime.datetime(2020, 1, i + 1, 12, 30),
+            "tags": ["odd"] if i % 2 else ["even"],
+        }
+        file_attributes = FileAttributes(src_path, f"{i}/", f"{i}.md", metadata)
+        record = {"metadata": metadata, "file": file_attributes}
+        index.add_file(src_path, record)
+        index.add_tag(metadata["tags"][0], record)
+    index.add_file("plain", {"metadata": {}, "file": {"path": "plain/", "name": "plain.md"}})
+    return index
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = make_index(tmp_path)
+    path = tmp_path / "index.snapshot"
+    write_snapshot(path, index.sources)
+
+    with SnapshotIndex(path) as snapshot:
+        assert list(snapshot) == list(index.sources)
+        assert len(snapshot) == len(index.sources)
+        for key, record in index.sources.items():
+            decoded = snapshot[key]
+            assert decoded["metadata"] == record["metadata"]
+            assert dict(decoded["file"]) == dict(record["file"])
+            # records are not memoized
+            assert decoded is not snapshot[key]
+
+        decoded = snapshot[str(tmp_path / "2.md")]
+        assert decoded["file"]["size"] == 2
+        assert decoded["file"].link("a") == index.sources[str(tmp_path / "2.md")]["file"].link("a")
+        assert decoded["file"].metadata is decoded["metadata"]
+
+        assert sorted(snapshot.tags) == ["even", "odd"]
+        assert [r["metadata"]["value"] for r in snapshot.tags["odd"]] == \
+            ["b", datetime.date(2020, 1, 2), True, 2**70]
+        assert [snapshot.key(row) for row in snapshot.tag_rows("even")] == \
+            [str(tmp_path / f"{i}.md") for i in (0, 2, 4, 6)]
+
+        rows = snapshot.sorted_rows("value")
+        values = [snapshot.record(row)["metadata"]["value"] for row in rows]
+        assert values == [1.5, 3, 2**70, "a", "b", datetime.date(2020, 1, 2)]
+        assert not snapshot.sorted_rows("unknown")
+
+
+def test_select(tmp_path):
+    index = make_index(tmp_path)
+    index.add_file("loose", {
+        "metadata": {"tags": "odd even", "value": 10}, "file": {"path": "loose/", "name": "l.md"},
+    })
+    path = tmp_path / "index.snapshot"
+    write_snapshot(path, index.sources)
+    renderer = RendererWithContext(index.sources)
+
+    queries = [
+        'TABLE metadata.value FROM #odd',
+        'TABLE metadata.value FROM "loose"',
+        'TABLE metadata.value WHERE metadata.value > 2',
+        'TABLE metadata.value WHERE metadata.value <= 3 AND metadata.value >= "a"',
+        'TABLE metadata.value WHERE 3 == metadata.value',
+        'TABLE metadata.value FROM #even WHERE metadata.value < date("2021-01-01")',
+        'TABLE metadata.value WHERE metadata.value > 2 OR metadata.value == "a"',
+        'TABLE metadata.value WHERE NOT metadata.value > 2',
+        'TABLE metadata.value WHERE metadata.when > date("2020-01-04T00:00:00")',
+    ]
+    with SnapshotIndex(path) as snapshot:
+        selected = []
+        for query in queries:
+            qs = QueryService(query)
+            qs.optimize({})
+            selected.append([key for key, _ in snapshot.select(qs)])
+
+            # the same result as without preselection
+            expected, out = io.StringIO(), io.StringIO()
+            renderer.render_query(query, {}, expected)
+            RendererWithContext(snapshot).render_query(query, {}, out)
+            assert out.getvalue() == expected.getvalue()
+
+    def keys(*rows):
+        return [str(tmp_path / f"{i}.md") if isinstance(i, int) else i for i in rows]
+
+    # only values of the same type as the constant are dropped
+    assert selected[0] == keys(1, 3, 5, 7, "loose")
+    assert selected[1] == keys("loose")
+    assert selected[2] == keys(0, 1, 3, 4, 5, 6, 7, "plain", "loose")
+    assert selected[3] == keys(0, 1, 2, 3, 4, 5, 6, "plain")
+    assert selected[4] == keys(0, 1, 3, 4, 5, 6, "plain")
+    assert selected[5] == keys(0, 2, 4, 6, "loose")
+    # OR, NOT and datetimes are not preselected
+    assert selected[6] == selected[7] == selected[8] == list(index.sources)
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "index.snapshot"
+    path.write_bytes(b"\0" * 200)
+    with pytest.raises(SnapshotError):
+        SnapshotIndex(path)
@@ -0,0 +1,145 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import datetime
+import io
+import json
+
+import frontmatter
+import pytest
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.markdown_db.index import SimpleMemoryIndex, build_index
+from mkdocs_dataview.markdown_db.sqlite_index import SQLiteIndex
+from mkdocs_dataview.query.solvers import QueryService
+
+
+QUERIES = [
+    'TABLE file.name WHERE metadata.n > 2',
+    'TABLE file.name WHERE metadata.n >= 2 AND metadata.n < 5',
+    'TABLE file.name WHERE 3 <= metadata.n',
+    'TABLE file.name WHERE metadata.s == "b"',
+    'TABLE file.name WHERE metadata.s != "b"',
+    'TABLE file.name WHERE NOT metadata.s == "a" OR NOT metadata.n < 6',
+    'TABLE file.name WHERE NOT metadata.s == "b" AND NOT metadata.n > 3',
+    'TABLE file.name WHERE metadata.opt < "m"',
+    'TABLE file.name WHERE metadata.opt >= "m"',
+    'TABLE file.name WHERE "x" in metadata.tags',
+    'TABLE file.name WHERE metadata.tags contains "y" OR metadata.s contains "c"',
+    'TABLE file.name WHERE metadata.s in ["a", "c"]',
+    'TABLE file.name WHERE metadata.nested.k == 1',
+    'TABLE file.name WHERE metadata.flag == true',
+    'TABLE file.name WHERE metadata.n + 1 > 3',
+    'TABLE file.name WHERE file.name == "3.md" OR file.path < "2"',
+    'TABLE file.name WHERE metadata.n > this.metadata.n',
+    'TABLE file.name FROM #x WHERE metadata.n > 0',
+    'TABLE file.name FROM "p1"',
+    'LIST file.name WHERE metadata.s == "a"',
+    'TABLE file.name WHERE metadata.d > date("2024-01-04")',
+    'TABLE file.name WHERE metadata.d <= date("2024-01-04T12:00")',
+    'TABLE file.name WHERE metadata.mix < "m"',
+    'TABLE file.name WHERE metadata.mix > 3',
+    'TABLE file.name WHERE metadata.mix >= date("2000-01-01")',
+    'TABLE file.name WHERE metadata.tags[0] == "x" OR metadata.nested.k.deeper == 1',
+    'TABLE DISTINCT metadata.tags FLATTEN metadata.tags WHERE metadata.tags == "y"',
+    "TABLE file.name WHERE metadata.big > 3",
+    "TABLE file.name WHERE metadata.big <= 3",
+    "TABLE file.name WHERE metadata.big == 1",
+]
+
+MIXED = [None, 5, "text", [1], datetime.date(2024, 1, 1)]
+
+
+def records():
+    for i in range(8):
+        metadata = {
+            "n": i,
+            "s": "abc"[i % 3],
+            "tags": ["x", "y"][: i % 3],
+            "nested": {"k": i % 2},
+            "flag": i % 4 == 0,
+            "d": datetime.date(2024, 1, 1 + i) if i % 2 else datetime.datetime(2024, 1, 1 + i, 6),
+            "mix": MIXED[i % len(MIXED)],
+            # too big for a float
+            "big": 10**400 * (i - 5) if i in (4, 6) else i,
+        }
+        if i % 2:
+            metadata["opt"] = None if i == 3 else "nopqrs"[i % 6]
+        path = f"p{i % 2}/{i}/"
+        yield f"docs/{i}.md", {"metadata": metadata, "file": {"path": path, "name": f"{i}.md"}}
+
+
+def build(index):
+    for key, record in records():
+        index.add_file(key, record)
+        for tag in record["metadata"]["tags"]:
+            index.add_tag(tag, record)
+    return index
+
+
+def render(sources, query):
+    out = io.StringIO()
+    RendererWithContext(sources).render_query(query, sources["docs/2.md"], out, "")
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_same_results_as_memory_index(query):
+    memory = build(SimpleMemoryIndex())
+    sqlite = build(SQLiteIndex())
+
+    assert render(sqlite, query) == render(memory.sources, query)
+
+
+def test_where_is_pushed_down():
+    index = build(SQLiteIndex())
+    assert list(index) == [key for key, _ in records()]
+    assert sorted(index.tags) == ["x", "y"]
+    assert index.field_stats["opt"] == 4
+
+    def candidates(query):
+        qs = QueryService(query)
+        qs.optimize({})
+        return [record["metadata"]["n"] for _, record in index.select(qs)]
+
+    assert candidates('TABLE file.name WHERE metadata.s == "b" AND metadata.n > 3') == [4, 7]
+    assert candidates('TABLE file.name FROM #y') == [2, 5]
+    assert candidates('TABLE file.name WHERE length(metadata.s) > 0') == list(range(8))
+    assert candidates('TABLE file.name WHERE metadata.d >= date("2024-01-07")') == [6, 7]
+    assert candidates('TABLE file.name WHERE metadata.mix > "a"') == [2, 3, 7]
+
+
+def test_database_is_reused_between_builds(tmp_path):
+    files = []
+    for i in range(4):
+        path = tmp_path / f"{i}.md"
+        query = "```dataview\nLIST\n```\n" if i == 1 else ""
+        path.write_text(f"---\nn: {i}\ntags: [t{i}]\n---\n{query}", encoding="utf-8")
+        files.append((str(path), f"{i}/", f"{i}.md"))
+    db_path = str(tmp_path / "index.sqlite3")
+
+    def index_build(entries):
+        index = SQLiteIndex(db_path)
+        reused = index.start_build(entries)
+        for file_path, target_url, src_uri in entries:
+            if file_path not in reused:
+                build_index(frontmatter.load(file_path), file_path, target_url, index, src_uri)
+        index.close()
+        return reused
+
+    assert not index_build(files)
+    assert index_build(files) == {files[i][0]: ["LIST\n"] if i == 1 else [] for i in range(4)}
+
+    # changed, deleted, reordered and moved files
+    (tmp_path / "2.md").write_text("---\nn: 20\n---\nchanged", encoding="utf-8")
+    entries = [files[3], files[2], (files[1][0], "moved/", "1.md")]
+    assert set(index_build(entries)) == {files[3][0]}
+
+    index = SQLiteIndex(db_path)
+    assert list(index) == [file_path for file_path, _, _ in entries]
+    assert [record["metadata"]["n"] for record in index.values()] == [3, 20, 1]
+    assert index[files[1][0]]["file"]["path"] == "moved/"
+    assert sorted(index.tags) == ["t1", "t3"]
+    # records are stored as JSON, file attributes share the metadata of their record
+    record = index[files[1][0]]
+    assert record["file"].src_uri == "1.md" and record["file"].metadata is record["metadata"]
+    raw = index.db.execute("SELECT record FROM files WHERE key = ?", (files[1][0],)).fetchone()
+    assert json.loads(raw[0])["metadata"] == {"n": 1, "tags": ["t1"]}
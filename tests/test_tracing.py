@@ -0,0 +1,38 @@
+# pylint: disable=wildcard-import, method-hidden, missing-function-docstring, missing-module-docstring, protected-access
+import io
+import logging
+
+from mkdocs_dataview.markdown_db import RendererWithContext
+from mkdocs_dataview.tracing import NO_TRACE, Lazy, Tracer
+
+
+SOURCES = {
+    f"docs/{i}.md": {"file": {"path": f"{i}/", "name": f"{i}.md"}, "metadata": {"n": i}}
+    for i in range(3)
+}
+
+
+def test_disabled_trace_is_lazy():
+    calls = []
+    NO_TRACE("never %s", Lazy(calls.append, 1))
+    assert not calls
+
+    tracer = Tracer(pages=["a/*"], queries=["metadata.n"])
+    assert not tracer.page("b/index.md").enabled
+    assert tracer.page("a/index.md").enabled
+    assert tracer.query("TABLE metadata.n").enabled
+    assert not tracer.query("TABLE file.name").enabled
+    assert tracer.query("TABLE file.name", tracer.page("a/index.md")).enabled
+
+
+def test_trace_query(caplog):
+    renderer = RendererWithContext(SOURCES, tracer=Tracer(queries=["metadata.n > 0"]))
+
+    with caplog.at_level(logging.INFO, logger="mkdocs.plugins.mkdocs_dataview.trace"):
+        renderer.render_query("TABLE file.name WHERE metadata.n > 0", None, io.StringIO(), "p/")
+        traced = len(caplog.records)
+        renderer.render_query("TABLE file.name WHERE metadata.n > 1", None, io.StringIO(), "p/")
+
+    assert traced == 2 + len(SOURCES)
+    assert len(caplog.records) == traced
+    assert "optimized where" in caplog.text